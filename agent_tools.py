@@ -0,0 +1,211 @@
+"""
+Database tools exposed to the Gemini agent in app.py, plus their result caches.
+
+This lives outside app.py because Streamlit re-executes app.py on every interaction;
+module-level caches here survive reruns and are shared by every session of the
+process. Tool results are keyed by tool name, normalized arguments and the videos
+data version (bumped on every video write), so any write invalidates them; view
+count refreshes bump a separate stats version that only trending_videos is keyed on.
+The answer cache does the same for whole model answers, so an answer quoting view
+counts can be up to ANSWER_CACHE_TTL old.
+"""
+import hashlib
+import os
+from datetime import datetime, timedelta
+
+from utils import get_db_session
+from app_backend import search as video_search
+from app_backend import channels as channel_rollup
+from app_backend import semantic
+from app_backend import stats_history
+from app_backend import transcripts
+from app_backend.cache import TTLCache
+from app_backend.storage import get_data_version, STATS_DATASET
+
+TOOL_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", "300"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "600"))
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+tool_cache = TTLCache(maxsize=2048, ttl=TOOL_CACHE_TTL)
+answer_cache = TTLCache(maxsize=512, ttl=ANSWER_CACHE_TTL)
+
+def normalize_arg(value):
+    # 'CNN ', 'cnn' and 'Cnn' are the same question
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    return value
+
+def cached_tool_result(tool_name, compute, **kwargs):
+    """Returns compute() from cache, keyed by tool, normalized kwargs and data version."""
+    key = (tool_name, get_data_version(), tuple(sorted((k, normalize_arg(v)) for k, v in kwargs.items())))
+    return tool_cache.get_or_load(key, compute)
+
+def answer_cache_key(model_name, prompt, history):
+    """Key for a model answer: same model, same conversation so far, same data."""
+    digest = hashlib.sha256()
+    for message in history:
+        digest.update(f"{message['role']}\x00{normalize_arg(message['content'])}\x00".encode())
+    return (model_name, normalize_arg(prompt), digest.hexdigest(), get_data_version())
+
+def get_channel_list():
+    """Channel names for the agent's system prompt."""
+    def compute():
+        session = get_db_session()
+        try:
+            return channel_rollup.channel_titles(session)
+        finally:
+            session.close()
+    return cached_tool_result("channel_list", compute)
+
+# --- Tools ---
+def get_video_stats(channel_name: str = None):
+    """
+    Returns count of videos for a specific channel or all channels if not specified.
+    Use this tool when users ask 'how many videos' or 'total videos' for a channel.
+    """
+    print(f"Tool: get_video_stats called for channel={channel_name}")
+
+    def compute():
+        session = get_db_session()
+        try:
+            # Read from the channels rollup table instead of counting videos
+            return channel_rollup.count_channel_videos(session, channel_name)
+        finally:
+            session.close()
+
+    result = cached_tool_result("get_video_stats", compute, channel_name=channel_name)
+    return f"Total videos found for {channel_name if channel_name else 'all channels'}: {result}"
+
+def count_videos_last_24h(channel_name: str = None, keyword: str = None):
+    """
+    Counts videos published in last 24 hours. Optional filters: channel_name, keyword.
+    Use this for queries like 'recent videos about X', 'videos in last 24h'.
+    """
+    print(f"Tool: count_videos_last_24h called (channel={channel_name}, keyword={keyword})")
+    # Rounded to the hour (the rollup's granularity) so the result can be cached
+    since = channel_rollup.upload_bucket(datetime.utcnow() - timedelta(hours=24))
+
+    def compute():
+        session = get_db_session()
+        try:
+            if keyword:
+                # Keyword matching goes through the full-text index, over exactly 24 hours
+                exact_since = datetime.utcnow() - timedelta(hours=24)
+                return video_search.count_videos(session, keyword, since=exact_since, channel=channel_name)
+            # Hourly upload buckets from the channels rollup
+            return channel_rollup.count_recent_uploads(session, since, channel=channel_name)
+        finally:
+            session.close()
+
+    result = cached_tool_result("count_videos_last_24h", compute, channel_name=channel_name, keyword=keyword, since=since)
+    return f"Videos in last 24h" + (f" for channel '{channel_name}'" if channel_name else "") + (f" matching '{keyword}'" if keyword else "") + f": {result}"
+
+def search_videos(keyword: str, days: int = 7):
+    """
+    Searches for videos matching a keyword in title/description within the last X days (default 7).
+    Returns a list of titles and dates, most relevant first.
+    Use this when user asks to 'find videos about X' or 'what are the videos regarding Y'.
+    """
+    print(f"Tool: search_videos called (keyword={keyword})")
+    since = channel_rollup.upload_bucket(datetime.utcnow() - timedelta(days=days))
+
+    def compute():
+        session = get_db_session()
+        try:
+            result = video_search.search_videos(session, keyword, since=since, limit=5)
+            return [f"- {row[0]} ({row[1]}) on {row[2]}" for row in result]
+        finally:
+            session.close()
+
+    videos = cached_tool_result("search_videos", compute, keyword=keyword, since=since)
+    if not videos:
+        return "No videos found."
+    return "\n".join(videos)
+
+def semantic_search_videos(query: str, limit: int = 5):
+    """
+    Finds videos whose title/description is about the same topic as the query, even when
+    they use different words (e.g. 'rate hikes' finds 'Fed raises interest rates').
+    Use this when search_videos finds nothing or the user describes a topic rather than a keyword.
+    """
+    print(f"Tool: semantic_search_videos called (query={query})")
+    limit = max(1, min(int(limit), 20))
+
+    def compute():
+        session = get_db_session()
+        try:
+            return [
+                f"- {hit['title']} ({hit['channel_title']}) on {hit['upload_date']}"
+                for hit in semantic.semantic_search(session, query, k=limit)
+            ]
+        finally:
+            session.close()
+
+    videos = cached_tool_result("semantic_search_videos", compute, query=query, limit=limit)
+    if not videos:
+        return "No videos found."
+    return "\n".join(videos)
+
+def trending_videos(hours: int = 24, channel_name: str = None, limit: int = 5):
+    """
+    Returns the videos that gained the most views in the last X hours (default 24),
+    with views gained and growth rate. Optional filter: channel_name.
+    Use this when the user asks what is 'trending', 'going viral' or 'growing fastest'.
+    """
+    print(f"Tool: trending_videos called (hours={hours}, channel={channel_name})")
+    hours = max(1, min(int(hours), 24 * 90))
+    limit = max(1, min(int(limit), 20))
+
+    def compute():
+        session = get_db_session()
+        try:
+            return [
+                f"- {row['title']} ({row['channel_title']}): +{row['views_gained']} views"
+                + (f" (+{row['growth_pct']}%)" if row['growth_pct'] is not None else "")
+                + f", {row['views']} total"
+                for row in stats_history.trending_videos(session, hours=hours, limit=limit, channel=channel_name)
+                if row['views_gained'] > 0
+            ]
+        finally:
+            session.close()
+
+    # New samples come with count changes, which bump the stats version
+    videos = cached_tool_result("trending_videos", compute, hours=hours, channel_name=channel_name, limit=limit,
+                                stats_version=get_data_version(STATS_DATASET))
+    if not videos:
+        return "No view-count history in that window yet."
+    return "\n".join(videos)
+
+def search_transcripts(query: str, channel_name: str = None, limit: int = 5):
+    """
+    Searches what is said in the videos (their captions) and returns matching snippets
+    with the video title and the time in the video where each one starts.
+    Use this when the user asks who said something, or what a video said about a topic.
+    """
+    print(f"Tool: search_transcripts called (query={query}, channel={channel_name})")
+    limit = max(1, min(int(limit), 20))
+
+    def compute():
+        session = get_db_session()
+        try:
+            return [
+                f"- {hit['title']} ({hit['channel_title']}) at {int(hit['start_seconds']) // 60}:{int(hit['start_seconds']) % 60:02d}: "
+                f"\"{hit['snippet']}\" {hit['url']}"
+                for hit in transcripts.search_transcripts(session, query, channel=channel_name, limit=limit)
+            ]
+        finally:
+            session.close()
+
+    # Transcripts have their own data version, bumped whenever captions are stored
+    snippets = cached_tool_result("search_transcripts", compute, query=query, channel_name=channel_name, limit=limit,
+                                  transcripts_version=get_data_version(transcripts.TRANSCRIPTS_DATASET))
+    if not snippets:
+        return "No transcript matches found."
+    return "\n".join(snippets)
+
+# Tool Registry for Gemini
+tools_list = [get_video_stats, count_videos_last_24h, search_videos, semantic_search_videos, trending_videos,
+              search_transcripts]
+
+def cache_stats():
+    return {"tools": tool_cache.stats(), "answers": answer_cache.stats()}
@@ -5,15 +5,42 @@ load_dotenv()
 import google.generativeai as genai
 import os
 import time
-from utils import get_db_session
-from datetime import datetime, timedelta
+from utils import get_db_session, get_db_pool_stats
+from agent_tools import tools_list, get_channel_list, answer_cache, answer_cache_key, cache_stats, ANSWER_CACHE_ENABLED
 import pandas as pd
 from sqlalchemy import text
 
+# Gemini client setup. Streamlit reruns this script on every interaction, so the
+# model catalogue and GenerativeModel objects are cached across reruns.
+MODEL_LIST_TTL = int(os.getenv("MODEL_LIST_TTL", "3600"))
+
+@st.cache_resource(show_spinner=False)
+def _gemini_client_state():
+    return {"api_key": None}
+
+def configure_gemini(api_key):
+    # genai.configure is process-global; only re-run it when the key changes
+    state = _gemini_client_state()
+    if state["api_key"] != api_key:
+        genai.configure(api_key=api_key)
+        state["api_key"] = api_key
+
+@st.cache_data(ttl=MODEL_LIST_TTL, show_spinner=False)
+def list_generate_models(api_key):
+    """Models that support generateContent, cached per API key for MODEL_LIST_TTL seconds."""
+    configure_gemini(api_key)
+    return [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def get_generative_model(api_key, model_name, system_instruction):
+    """One GenerativeModel per key/model/system prompt; rebuilt only when the channel list changes."""
+    configure_gemini(api_key)
+    return genai.GenerativeModel(model_name, tools=tools_list, system_instruction=system_instruction)
+
 # Configure Gemini
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if GOOGLE_API_KEY:
-    genai.configure(api_key=GOOGLE_API_KEY)
+    configure_gemini(GOOGLE_API_KEY)
 
 st.set_page_config(page_title="YouTube Agentic AI", layout="wide")
 
@@ -25,10 +52,10 @@ api_key_input = st.sidebar.text_input("Google API Key", type="password", value=G
 
 selected_model = "gemini-1.5-flash"
 if api_key_input:
-    genai.configure(api_key=api_key_input)
+    configure_gemini(api_key_input)
     try:
-        # Fetch available models dynamically
-        model_list = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
+        # Fetch available models dynamically (cached, see list_generate_models)
+        model_list = list_generate_models(api_key_input)
         
         # Filter for stable/flash models which are usually best for free tier
         if model_list:
@@ -54,82 +81,26 @@ if api_key_input:
     except Exception as e:
          st.sidebar.error(f"Error fetching models: {e}")
 
+with st.sidebar.expander("Database pool"):
+    try:
+        st.json(get_db_pool_stats())
+    except Exception as e:
+        st.caption(f"Pool stats unavailable: {e}")
+
+use_answer_cache = st.sidebar.checkbox(
+    "Reuse cached answers",
+    value=ANSWER_CACHE_ENABLED,
+    help="Answer an identical question (same conversation, same data) from cache instead of calling Gemini again."
+)
+with st.sidebar.expander("Cache statistics"):
+    st.json(cache_stats())
+
 if api_key_input and not GOOGLE_API_KEY:
     st.session_state["api_key"] = api_key_input
 
 def get_db_connection():
     return get_db_session()
 
-# --- Tools ---
-def get_video_stats(channel_name: str = None):
-    """
-    Returns count of videos for a specific channel or all channels if not specified.
-    Use this tool when users ask 'how many videos' or 'total videos' for a channel.
-    """
-    print(f"Tool: get_video_stats called for channel={channel_name}")
-    session = get_db_session()
-    
-    if channel_name:
-        query_str = "SELECT COUNT(*) FROM videos WHERE channel_title LIKE :channel"
-        params = {"channel": f"%{channel_name}%"}
-    else:
-        query_str = "SELECT COUNT(*) FROM videos"
-        params = {}
-    
-    result = session.execute(text(query_str), params).scalar()
-    session.close()
-    return f"Total videos found for {channel_name if channel_name else 'all channels'}: {result}"
-
-def count_videos_last_24h(channel_name: str = None, keyword: str = None):
-    """
-    Counts videos published in last 24 hours. Optional filters: channel_name, keyword.
-    Use this for queries like 'recent videos about X', 'videos in last 24h'.
-    """
-    print(f"Tool: count_videos_last_24h called (channel={channel_name}, keyword={keyword})")
-    session = get_db_session()
-    since = (datetime.utcnow() - timedelta(hours=24))
-    
-    query_str = "SELECT COUNT(*) FROM videos WHERE upload_date >= :since"
-    params = {"since": since}
-    
-    if channel_name:
-        query_str += " AND channel_title LIKE :channel"
-        params["channel"] = f"%{channel_name}%"
-    
-    if keyword:
-        query_str += " AND (title LIKE :keyword OR description LIKE :keyword)"
-        params["keyword"] = f"%{keyword}%"
-        
-    result = session.execute(text(query_str), params).scalar()
-    session.close()
-    return f"Videos in last 24h" + (f" for channel '{channel_name}'" if channel_name else "") + (f" matching '{keyword}'" if keyword else "") + f": {result}"
-
-def search_videos(keyword: str, days: int = 7):
-    """
-    Searches for videos matching a keyword in title/description within the last X days (default 7).
-    Returns a list of titles and dates.
-    Use this when user asks to 'find videos about X' or 'what are the videos regarding Y'.
-    """
-    print(f"Tool: search_videos called (keyword={keyword})")
-    session = get_db_session()
-    since = (datetime.utcnow() - timedelta(days=days))
-    
-    query_str = "SELECT title, channel_title, upload_date FROM videos WHERE upload_date >= :since AND (title LIKE :keyword OR description LIKE :keyword) LIMIT 5"
-    params = {"keyword": f"%{keyword}%", "since": since}
-    
-    result = session.execute(text(query_str), params)
-    videos = []
-    for row in result:
-        videos.append(f"- {row[0]} ({row[1]}) on {row[2]}")
-    session.close()
-    
-    if not videos:
-        return "No videos found."
-    return "\n".join(videos)
-
-# Tool Registry for Gemini
-tools_list = [get_video_stats, count_videos_last_24h, search_videos]
-
 # --- UI Layout ---
 
 # Authentication Check
@@ -161,7 +132,9 @@ if check_password():
     if st.session_state.get("refresh", False):
         session = get_db_session()
         try:
-            result = session.execute(text("SELECT * FROM videos ORDER BY upload_date DESC LIMIT 10"))
+            # Without description/ai_summary/transcript: large, possibly compressed, and not shown
+            result = session.execute(text("SELECT video_id, title, channel_title, upload_date, view_count, like_count, url "
+                                          "FROM videos ORDER BY upload_date DESC LIMIT 10"))
             try:
                 recent = [dict(row._mapping) for row in result]
             except:
@@ -177,6 +150,7 @@ if check_password():
     - "How many videos from markets channel have we saved?"
     - "Count videos about USA in ANINEWSIndia channel in the last 24 hours?"
     - "Search for videos about inflation"
+    - "Find videos about central banks raising rates"
     """)
     
     if "messages" not in st.session_state:
@@ -197,36 +171,43 @@ if check_password():
             else:
                 with st.spinner('Agent is thinking...'):
                     # Context for the agent
-                    session = get_db_session()
                     try:
-                        channels = [row[0] for row in session.execute(text("SELECT DISTINCT channel_title FROM videos WHERE channel_title IS NOT NULL")).fetchall()]
+                        channels = get_channel_list()
                         channel_list_str = ", ".join(channels)
                     except Exception as e:
                         channel_list_str = "Error fetching channel list"
-                    finally:
-                        session.close()
 
                     system_instruction = f"You are a helpful YouTube Data Analyst. Use the provided tools to query the database and answer user questions. Always answer based on the tool outputs. The available channels in the database are: {channel_list_str}. If a user asks about a channel, map it to one of these exact names."
                     
-                    # Create model with tools
-                    model = genai.GenerativeModel(selected_model, tools=tools_list, system_instruction=system_instruction)
-                    
-                    # Build history for Gemini
-                    history = []
-                    # Skip the latest message which is the prompt we are about to send via send_message
-                    for msg in st.session_state.messages[:-1]: 
-                        role = "user" if msg["role"] == "user" else "model"
-                        history.append({"role": role, "parts": [msg["content"]]})
-                    
-                    # Start chat with history
-                    chat = model.start_chat(history=history, enable_automatic_function_calling=True)
-                    
-                    # Send message
-                    response = chat.send_message(prompt)
+                    # An identical question over the same conversation and data was already answered
+                    answer_key = answer_cache_key(selected_model, prompt, st.session_state.messages[:-1])
+                    cached_answer = answer_cache.get(answer_key) if use_answer_cache else None
+
+                    if cached_answer:
+                        answer_text = cached_answer
+                    else:
+                        # Create model with tools
+                        model = get_generative_model(api_key_input, selected_model, system_instruction)
+                        
+                        # Build history for Gemini
+                        history = []
+                        # Skip the latest message which is the prompt we are about to send via send_message
+                        for msg in st.session_state.messages[:-1]: 
+                            role = "user" if msg["role"] == "user" else "model"
+                            history.append({"role": role, "parts": [msg["content"]]})
+                        
+                        # Start chat with history
+                        chat = model.start_chat(history=history, enable_automatic_function_calling=True)
+                        
+                        # Send message
+                        response = chat.send_message(prompt)
+                        answer_text = response.text
+                        if answer_text:
+                            answer_cache.set(answer_key, answer_text)
                     
-                    if response.text:
-                        st.chat_message("assistant").markdown(response.text)
-                        st.session_state.messages.append({"role": "assistant", "content": response.text})
+                    if answer_text:
+                        st.chat_message("assistant").markdown(answer_text)
+                        st.session_state.messages.append({"role": "assistant", "content": answer_text})
                     else:
                         st.chat_message("assistant").markdown("I processed your request but have no text response.")
                         st.session_state.messages.append({"role": "assistant", "content": "I processed your request."})
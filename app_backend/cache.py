@@ -0,0 +1,131 @@
+"""
+Small in-process caches.
+
+TTLCache is a thread-safe LRU with per-entry expiry. get_or_load() adds single-flight
+behaviour: when several threads miss on the same key at once, only the first runs the
+loader and the others wait for its result (counted as 'coalesced'). Its `max_age`
+lets a caller that needs fresher data than `ttl` treat older entries as misses.
+"""
+import collections
+import threading
+import time
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class TTLCache:
+    """Thread-safe, size-bounded LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=300.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = collections.OrderedDict()  # key -> (stored_at, value)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._counters = collections.Counter()
+
+    def _lookup(self, key, max_age=None):
+        # Caller holds the lock
+        item = self._data.get(key)
+        if item is None:
+            return False, None
+        stored_at, value = item
+        age = self._clock() - stored_at
+        if age >= self.ttl:
+            del self._data[key]
+            self._counters["expirations"] += 1
+            return False, None
+        if max_age is not None and age >= max_age:
+            # Too old for this caller only; the reload replaces it
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def _store(self, key, value):
+        # Caller holds the lock
+        self._data[key] = (self._clock(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            found, value = self._lookup(key)
+            self._counters["hits" if found else "misses"] += 1
+            return value if found else default
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key, loader, cache_none=False, max_age=None):
+        """
+        Returns the cached value for `key` (if younger than `max_age` seconds, when given),
+        or calls `loader()` once for all concurrent callers and caches the result.
+        Exceptions from the loader reach every waiter and are not cached; neither is None
+        unless `cache_none` is set.
+        """
+        with self._lock:
+            found, value = self._lookup(key, max_age)
+            if found:
+                self._counters["hits"] += 1
+                return value
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                self._counters["misses"] += 1
+                flight = _Flight()
+                self._inflight[key] = flight
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None and (flight.value is not None or cache_none):
+                    self._store(key, flight.value)
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._data)
+        hits = counters.get("hits", 0)
+        lookups = hits + counters.get("misses", 0) + counters.get("coalesced", 0)
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": hits,
+            "misses": counters.get("misses", 0),
+            "coalesced": counters.get("coalesced", 0),
+            "evictions": counters.get("evictions", 0),
+            "expirations": counters.get("expirations", 0),
+            # Share of lookups that did not need their own load
+            "hit_ratio": round((lookups - counters.get("misses", 0)) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,394 @@
+"""
+Channel rollups: per-channel video counts and hourly upload buckets.
+
+storage.upsert_videos() applies the changes of every write through
+apply_channel_deltas() in the same transaction, so the agent's "how many videos" and
+"last 24 hours" questions and its channel list are answered from small tables instead
+of COUNT(*) scans over videos. rebuild_channel_rollup() recomputes everything from the
+videos table; ensure_channel_rollup() runs it at API startup and in scripts/migrate.py
+for a database whose rollup was never built, and it can be run by hand with
+scripts/rebuild_channel_rollup.py. Until then reads fall back to scanning videos.
+
+The same table is the registry of monitored channels (tracked rows), which the ingest
+script and the hub subscriptions read. register_channels() adds URLs;
+resolve_pending_channels() looks each new URL up once (channel ID and title) and merges
+it into the channel's rollup row, so later runs never repeat the lookup.
+"""
+import collections
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import select, update, delete, func, text, or_, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+try:
+    from .database import Channel, ChannelUploadBucket, DataVersion
+except ImportError:
+    from database import Channel, ChannelUploadBucket, DataVersion
+
+logger = logging.getLogger(__name__)
+
+# Concurrent yt-dlp lookups when resolving newly registered channels
+CHANNEL_RESOLVE_WORKERS = int(os.getenv("CHANNEL_RESOLVE_WORKERS", "8"))
+
+# Videos without a channel title are counted under this key
+UNKNOWN_CHANNEL = ""
+# DataVersion row marking that the rollup covers the whole videos table
+ROLLUP_MARKER = "channel_rollup"
+
+_ready = set()
+_ready_lock = threading.Lock()
+
+def upload_bucket(upload_date):
+    """The hour bucket a video falls in."""
+    if upload_date is None:
+        return None
+    return upload_date.replace(minute=0, second=0, microsecond=0)
+
+class ChannelDeltas:
+    """Accumulates count changes for a batch of video writes."""
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.buckets = collections.Counter()
+        self.channel_ids = {}
+
+    def add(self, channel_title, upload_date, channel_id=None, amount=1):
+        title = channel_title or UNKNOWN_CHANNEL
+        self.counts[title] += amount
+        bucket = upload_bucket(upload_date)
+        if bucket is not None:
+            self.buckets[(title, bucket)] += amount
+        if channel_id:
+            self.channel_ids[title] = channel_id
+
+    def move(self, old, new):
+        """Records a video whose channel or upload hour changed from `old` to `new` (dicts)."""
+        if (old["channel_title"] or UNKNOWN_CHANNEL) == (new["channel_title"] or UNKNOWN_CHANNEL) \
+                and upload_bucket(old["upload_date"]) == upload_bucket(new["upload_date"]):
+            if new.get("channel_id") and new["channel_id"] != old.get("channel_id"):
+                self.channel_ids[new["channel_title"] or UNKNOWN_CHANNEL] = new["channel_id"]
+            return
+        self.add(old["channel_title"], old["upload_date"], amount=-1)
+        self.add(new["channel_title"], new["upload_date"], channel_id=new.get("channel_id"))
+
+    def __bool__(self):
+        return any(self.counts.values()) or any(self.buckets.values()) or bool(self.channel_ids)
+
+def _dialect_insert(session, model):
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    return None
+
+def apply_channel_deltas(session, deltas):
+    """Adds the accumulated changes to channels / channel_upload_buckets. Does not commit."""
+    if not deltas:
+        return
+    now = datetime.utcnow()
+    titles = set(deltas.counts) | set(deltas.channel_ids)
+    channel_rows = [
+        {"title": t, "video_count": deltas.counts.get(t, 0), "channel_id": deltas.channel_ids.get(t), "updated_at": now}
+        for t in titles
+    ]
+    bucket_rows = [
+        {"channel_title": t, "bucket_start": b, "video_count": n}
+        for (t, b), n in deltas.buckets.items() if n
+    ]
+
+    stmt = _dialect_insert(session, Channel)
+    if stmt is not None:
+        table = Channel.__table__
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.title],
+            set_={
+                "video_count": table.c.video_count + stmt.excluded.video_count,
+                "channel_id": func.coalesce(stmt.excluded.channel_id, table.c.channel_id),
+                "updated_at": stmt.excluded.updated_at,
+            },
+        ), channel_rows)
+        if bucket_rows:
+            stmt = _dialect_insert(session, ChannelUploadBucket)
+            table = ChannelUploadBucket.__table__
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=[table.c.channel_title, table.c.bucket_start],
+                set_={"video_count": table.c.video_count + stmt.excluded.video_count},
+            ), bucket_rows)
+        return
+
+    # Other databases: read-modify-write through the ORM
+    for row in channel_rows:
+        channel = session.execute(select(Channel).where(Channel.title == row["title"])).scalar_one_or_none()
+        if channel is None:
+            session.add(Channel(**row))
+        else:
+            channel.video_count += row["video_count"]
+            channel.channel_id = row["channel_id"] or channel.channel_id
+            channel.updated_at = now
+    for row in bucket_rows:
+        bucket = session.get(ChannelUploadBucket, (row["channel_title"], row["bucket_start"]))
+        if bucket is None:
+            session.add(ChannelUploadBucket(**row))
+        else:
+            bucket.video_count += row["video_count"]
+
+def rollup_ready(session):
+    """True once the rollup has been built for this database."""
+    key = str(session.get_bind().url)
+    if key in _ready:
+        return True
+    if session.get(DataVersion, ROLLUP_MARKER) is not None:
+        # A rebuild still pending in this session is remembered only once it commits
+        if key not in session.info.get("built_rollups", ()):
+            _ready.add(key)
+        return True
+    return False
+
+@event.listens_for(Session, "after_commit")
+def _mark_rollups_ready(session):
+    keys = session.info.pop("built_rollups", None)
+    if keys:
+        _ready.update(keys)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rollups(session):
+    session.info.pop("built_rollups", None)
+
+def ensure_channel_rollup(session):
+    """
+    Builds the rollup inside the caller's transaction if this database never had one.
+    A full scan of videos: call it from startup or a migration, not from a write path.
+    """
+    with _ready_lock:
+        if not rollup_ready(session):
+            rebuild_channel_rollup(session, commit=False)
+
+def rebuild_channel_rollup(session, commit=True):
+    """Recomputes channel counts and upload buckets from the videos table."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        hour = "strftime('%Y-%m-%d %H:00:00', upload_date)"
+    elif dialect == "postgresql":
+        hour = "date_trunc('hour', upload_date)"
+    else:
+        hour = None
+
+    session.execute(update(Channel).values(video_count=0))
+    session.execute(delete(ChannelUploadBucket))
+
+    deltas = ChannelDeltas()
+    for title, channel_id, count in session.execute(text(
+        "SELECT COALESCE(channel_title, ''), MAX(channel_id), COUNT(*) FROM videos GROUP BY COALESCE(channel_title, '')"
+    )):
+        deltas.counts[title] = count
+        if channel_id:
+            deltas.channel_ids[title] = channel_id
+
+    if hour:
+        rows = session.execute(text(
+            f"SELECT COALESCE(channel_title, ''), {hour}, COUNT(*) FROM videos "
+            f"WHERE upload_date IS NOT NULL GROUP BY COALESCE(channel_title, ''), {hour}"
+        ))
+        for title, bucket, count in rows:
+            if isinstance(bucket, str):
+                bucket = datetime.strptime(bucket, "%Y-%m-%d %H:%M:%S")
+            deltas.buckets[(title, bucket)] = count
+    else:
+        for title, upload_date in session.execute(text("SELECT COALESCE(channel_title, ''), upload_date FROM videos")):
+            bucket = upload_bucket(upload_date)
+            if bucket is not None:
+                deltas.buckets[(title, bucket)] += 1
+
+    apply_channel_deltas(session, deltas)
+    if session.get(DataVersion, ROLLUP_MARKER) is None:
+        session.add(DataVersion(name=ROLLUP_MARKER, version=1))
+    # Remembered as built once this transaction commits (see _mark_rollups_ready)
+    session.info.setdefault("built_rollups", set()).add(str(session.get_bind().url))
+    if commit:
+        session.commit()
+    return len(deltas.counts)
+
+def channel_titles(session):
+    """Names of all channels with stored videos, for the agent's system prompt."""
+    if not rollup_ready(session):
+        return [row[0] for row in session.execute(text("SELECT DISTINCT channel_title FROM videos WHERE channel_title IS NOT NULL"))]
+    return list(session.execute(
+        select(Channel.title).where(Channel.title != UNKNOWN_CHANNEL, Channel.video_count > 0).order_by(Channel.title)
+    ).scalars())
+
+def count_channel_videos(session, channel=None):
+    """Total videos, optionally for channels whose title contains `channel`."""
+    if not rollup_ready(session):
+        query, params = "SELECT COUNT(*) FROM videos", {}
+        if channel:
+            query, params = query + " WHERE channel_title LIKE :channel", {"channel": f"%{channel}%"}
+        return session.execute(text(query), params).scalar() or 0
+
+    query = select(func.coalesce(func.sum(Channel.video_count), 0))
+    if channel:
+        query = query.where(Channel.title.like(f"%{channel}%"))
+    return session.execute(query).scalar()
+
+def count_recent_uploads(session, since, channel=None):
+    """
+    Videos uploaded since `since`, summed from hourly buckets. The window is widened to
+    the start of the hour containing `since`.
+    """
+    if not rollup_ready(session):
+        query, params = "SELECT COUNT(*) FROM videos WHERE upload_date >= :since", {"since": since}
+        if channel:
+            query += " AND channel_title LIKE :channel"
+            params["channel"] = f"%{channel}%"
+        return session.execute(text(query), params).scalar() or 0
+
+    query = select(func.coalesce(func.sum(ChannelUploadBucket.video_count), 0)) \
+        .where(ChannelUploadBucket.bucket_start >= upload_bucket(since))
+    if channel:
+        query = query.where(ChannelUploadBucket.channel_title.like(f"%{channel}%"))
+    return session.execute(query).scalar()
+
+# --- registry ---------------------------------------------------------------------
+
+def normalize_channel_url(url):
+    """Canonical form of a channel URL: https, www host, no tab suffix or trailing slash."""
+    url = url.strip()
+    if url.startswith("@"):
+        url = f"https://www.youtube.com/{url}"
+    url = re.sub(r"^(?:https?://)?(?:www\.|m\.)?youtube\.com", "https://www.youtube.com", url, flags=re.I)
+    url = url.split("?", 1)[0].rstrip("/")
+    return re.sub(r"/(?:videos|featured|streams|shorts)$", "", url)
+
+def url_handle(url):
+    match = re.search(r"youtube\.com/(@[\w.\-]+)", url)
+    return match.group(1) if match else None
+
+def register_channels(session, urls):
+    """
+    Adds channel URLs to the registry (or tracks them again). Does not look them up or
+    commit. Returns the registry rows, in order.
+    """
+    urls = list(dict.fromkeys(normalize_channel_url(u) for u in urls if u and u.strip()))
+    if not urls:
+        return []
+    existing = {c.url: c for c in session.execute(select(Channel).where(Channel.url.in_(urls))).scalars()}
+    now = datetime.utcnow()
+    channels = []
+    for url in urls:
+        channel = existing.get(url)
+        if channel is None:
+            channel = Channel(url=url, handle=url_handle(url), video_count=0, added_at=now)
+            session.add(channel)
+        channel.tracked = True
+        channels.append(channel)
+    session.flush()
+    return channels
+
+def untrack_channel(session, key):
+    """Stops monitoring the channel whose channel ID, URL or @handle is `key`. Returns it or None."""
+    channel = session.execute(select(Channel).where(
+        Channel.url.is_not(None),
+        or_(Channel.channel_id == key, Channel.url == normalize_channel_url(key), Channel.handle == key),
+    )).scalars().first()
+    if channel is not None:
+        channel.tracked = False
+    return channel
+
+def tracked_channels(session, resolved_only=False):
+    """Registry rows being monitored, oldest first."""
+    query = select(Channel).where(Channel.tracked.is_(True)).order_by(Channel.added_at, Channel.id)
+    if resolved_only:
+        query = query.where(Channel.channel_id.is_not(None))
+    return list(session.execute(query).scalars())
+
+def _apply_resolution(session, channel, resolved):
+    channel.channel_id = resolved["channel_id"]
+    channel.handle = resolved.get("handle") or channel.handle
+    channel.resolved_at = datetime.utcnow()
+    channel.resolve_error = None
+    session.flush()
+    duplicate = session.execute(select(Channel).where(
+        Channel.channel_id == channel.channel_id, Channel.url.is_not(None), Channel.id != channel.id)).scalars().first()
+    if duplicate is not None:
+        # The same channel registered under another URL (e.g. /channel/UC... and /@handle)
+        duplicate.tracked = True
+        session.delete(channel)
+        return duplicate
+    title = resolved.get("title")
+    if not title or title == channel.title:
+        return channel
+    # Videos of this channel may already have a rollup row; keep one row per channel
+    rollup = session.execute(select(Channel).where(Channel.title == title)).scalar_one_or_none()
+    if rollup is None:
+        channel.title = title
+        return channel
+    values = {column: getattr(channel, column)
+              for column in ("url", "channel_id", "handle", "tracked", "added_at", "resolved_at", "resolve_error")}
+    # Delete first: the url is unique
+    session.delete(channel)
+    session.flush()
+    for column, value in values.items():
+        setattr(rollup, column, value)
+    return rollup
+
+def resolve_pending_channels(session, workers=CHANNEL_RESOLVE_WORKERS, resolver=None):
+    """
+    Looks up tracked channels that were never resolved, `workers` at a time, and commits.
+    Failures are recorded in resolve_error and retried on the next call.
+    Returns (resolved, failed) counts.
+    """
+    pending = list(session.execute(
+        select(Channel).where(Channel.tracked.is_(True), Channel.resolved_at.is_(None))
+    ).scalars())
+    if not pending:
+        return 0, 0
+    if resolver is None:
+        try:
+            from .youtube import resolve_channel as resolver
+        except ImportError:
+            from youtube import resolve_channel as resolver
+
+    def lookup(url):
+        try:
+            return resolver(url), None
+        except Exception as e:
+            return None, str(e) or type(e).__name__
+
+    urls = [c.url for c in pending]
+    # Don't hold a transaction (on SQLite, the writer connection) during the network lookups
+    session.commit()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(lookup, urls))
+
+    resolved = failed = 0
+    for channel, (result, error) in zip(pending, results):
+        if result is not None and not result.get("channel_id"):
+            result, error = None, "no channel ID returned"
+        if result is None:
+            channel.resolve_error = error
+            failed += 1
+            logger.warning(f"Could not resolve channel {channel.url}: {error}")
+        else:
+            _apply_resolution(session, channel, result)
+            resolved += 1
+    session.commit()
+    return resolved, failed
+
+def channel_info(channel):
+    return {
+        "url": channel.url,
+        "channel_id": channel.channel_id,
+        "title": channel.title,
+        "handle": channel.handle,
+        "tracked": bool(channel.tracked),
+        "video_count": channel.video_count,
+        "added_at": channel.added_at.isoformat() if channel.added_at else None,
+        "resolved_at": channel.resolved_at.isoformat() if channel.resolved_at else None,
+        "resolve_error": channel.resolve_error,
+    }
@@ -0,0 +1,267 @@
+"""
+Durable job queue backed by the job_queue table, drained by a pool of worker threads.
+
+The webhook only records video IDs here and returns (enqueue_jobs() runs in a worker
+thread, on the single writer connection); the slow part (yt-dlp extraction and the database write) happens in
+WorkerPool threads, with exponential backoff between retries. Jobs survive restarts: a
+claim is a lease of lease_seconds from started_at, and a 'processing' job whose lease has
+expired (its worker crashed) is put back to 'pending' when a pool starts and while it is
+idle. Jobs still leased, e.g. by a worker in another process, are left alone.
+"""
+import collections
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, delete, func
+
+try:
+    from .database import SessionLocal, ReadSessionLocal, Job
+    from .metrics import jobs_finished, job_duration, job_queue_latency
+except ImportError:
+    from database import SessionLocal, ReadSessionLocal, Job
+    from metrics import jobs_finished, job_duration, job_queue_latency
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed job may run before another pool may assume its worker died.
+# Must exceed the slowest handler run, or that job runs twice.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "900"))
+
+def _pending_jobs_query(kind, video_ids):
+    return select(Job.video_id).where(Job.kind == kind, Job.status == "pending", Job.video_id.in_(video_ids))
+
+def _new_jobs(kind, video_ids, already_pending):
+    now = datetime.utcnow()
+    return [
+        Job(kind=kind, video_id=video_id, status="pending", attempts=0, enqueued_at=now, available_at=now)
+        for video_id in video_ids if video_id not in already_pending
+    ]
+
+def enqueue_jobs(kind, video_ids):
+    """
+    Adds a pending job per video ID, skipping IDs that already have a pending job of
+    the same kind (hub re-deliveries collapse into one job). Returns the number added.
+    """
+    video_ids = list(dict.fromkeys(v for v in video_ids if v))
+    if not video_ids:
+        return 0
+
+    session = SessionLocal()
+    try:
+        jobs = _new_jobs(kind, video_ids, set(session.execute(_pending_jobs_query(kind, video_ids)).scalars()))
+        session.add_all(jobs)
+        session.commit()
+        return len(jobs)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+class WorkerPool:
+    """
+    Runs `handler(video_id)` for every pending job of `kind` using `workers` threads.
+    A handler that raises is retried after base_delay * 2^(attempt-1) seconds (capped
+    at max_delay, with jitter) until max_attempts, then the job is marked 'failed'.
+    """
+
+    def __init__(self, kind, handler, workers=2, max_attempts=5, base_delay=5.0, max_delay=600.0,
+                 poll_interval=2.0, retention_hours=24, lease_seconds=JOB_LEASE_SECONDS):
+        self.kind = kind
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.retention = timedelta(hours=retention_hours)
+        self.lease = timedelta(seconds=lease_seconds)
+
+        self._threads = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._last_recovery = 0.0
+        self._counters = collections.Counter()
+        # Enqueue-to-finish latency of recently completed jobs, in seconds
+        self._latencies = collections.deque(maxlen=1000)
+
+    def start(self):
+        if self._threads:
+            return
+        self._recover_stale_jobs()
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.kind}-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.workers} workers for {self.kind} jobs")
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """Wakes idle workers immediately instead of waiting for the next poll."""
+        self._wakeup.set()
+
+    def _recover_stale_jobs(self):
+        """Re-queues 'processing' jobs whose lease has expired. Returns how many."""
+        self._last_recovery = time.time()
+        session = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            result = session.execute(
+                update(Job).where(Job.kind == self.kind, Job.status == "processing", Job.started_at < now - self.lease)
+                .values(status="pending", available_at=now)
+            )
+            session.commit()
+            if result.rowcount:
+                logger.info(f"Re-queued {result.rowcount} interrupted {self.kind} jobs")
+            return result.rowcount
+        finally:
+            session.close()
+
+    def _claim(self):
+        """Atomically moves the oldest due job to 'processing'. Returns it or None."""
+        session = SessionLocal()
+        try:
+            while True:
+                now = datetime.utcnow()
+                row = session.execute(
+                    select(Job.id, Job.video_id, Job.attempts, Job.enqueued_at)
+                    .where(Job.kind == self.kind, Job.status == "pending", Job.available_at <= now)
+                    .order_by(Job.available_at, Job.id)
+                    .limit(1)
+                ).first()
+                if row is None:
+                    session.commit()
+                    return None
+                claimed = session.execute(
+                    update(Job).where(Job.id == row.id, Job.status == "pending")
+                    .values(status="processing", attempts=Job.attempts + 1, started_at=now)
+                ).rowcount
+                session.commit()
+                if claimed:
+                    return {"id": row.id, "video_id": row.video_id, "attempt": row.attempts + 1,
+                            "enqueued_at": row.enqueued_at}
+                # Another worker got it first; try the next one
+        finally:
+            session.close()
+
+    def _finish(self, job, error=None):
+        session = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            if error is None:
+                values = {"status": "done", "finished_at": now, "last_error": None}
+            elif job["attempt"] >= self.max_attempts:
+                values = {"status": "failed", "finished_at": now, "last_error": error}
+            else:
+                delay = min(self.max_delay, self.base_delay * (2 ** (job["attempt"] - 1)))
+                delay *= random.uniform(0.8, 1.2)
+                values = {"status": "pending", "available_at": now + timedelta(seconds=delay), "last_error": error}
+            session.execute(update(Job).where(Job.id == job["id"]).values(**values))
+            session.commit()
+            return values["status"]
+        finally:
+            session.close()
+
+    def _process(self, job):
+        start = time.perf_counter()
+        error = None
+        try:
+            self.handler(job["video_id"])
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            logger.warning(f"{self.kind} job for {job['video_id']} failed (attempt {job['attempt']}): {error}")
+
+        handler_seconds = time.perf_counter() - start
+        status = self._finish(job, error)
+        outcome = "processed" if status == "done" else "retried" if status == "pending" else "failed"
+        jobs_finished.inc(kind=self.kind, outcome=outcome)
+        job_duration.observe(handler_seconds, kind=self.kind)
+        with self._lock:
+            self._counters[outcome] += 1
+            self._counters["handler_seconds_total"] += handler_seconds
+            if status in ("done", "failed"):
+                latency = (datetime.utcnow() - job["enqueued_at"]).total_seconds()
+                self._latencies.append(latency)
+                job_queue_latency.observe(latency, kind=self.kind)
+
+    def _purge_finished(self):
+        # Finished jobs are only kept for a while so the table stays small
+        if time.time() - self._last_purge < 3600:
+            return
+        self._last_purge = time.time()
+        session = SessionLocal()
+        try:
+            session.execute(delete(Job).where(
+                Job.kind == self.kind, Job.status.in_(["done", "failed"]),
+                Job.finished_at < datetime.utcnow() - self.retention))
+            session.commit()
+        finally:
+            session.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+                if job is None:
+                    self._purge_finished()
+                    if time.time() - self._last_recovery > 60:
+                        self._recover_stale_jobs()
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+                self._process(job)
+            except Exception as e:
+                # Database hiccup: back off and keep the worker alive
+                logger.error(f"{self.kind} worker error: {e}")
+                self._stop.wait(self.poll_interval)
+
+    def stats(self):
+        """Queue depth by status, age of the oldest due job, and processing latency."""
+        session = ReadSessionLocal()
+        try:
+            depth = dict(session.execute(
+                select(Job.status, func.count()).where(Job.kind == self.kind).group_by(Job.status)
+            ).all())
+            oldest = session.execute(
+                select(func.min(Job.enqueued_at)).where(Job.kind == self.kind, Job.status == "pending")
+            ).scalar()
+        finally:
+            session.close()
+
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counters = dict(self._counters)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+
+        return {
+            "workers": len(self._threads),
+            "pending": depth.get("pending", 0),
+            "processing": depth.get("processing", 0),
+            "done": depth.get("done", 0),
+            "failed": depth.get("failed", 0),
+            "oldest_pending_age_seconds": round((datetime.utcnow() - oldest).total_seconds(), 3) if oldest else 0,
+            "processed_total": counters.get("processed", 0),
+            "retried_total": counters.get("retried", 0),
+            "failed_total": counters.get("failed", 0),
+            "handler_seconds_total": round(counters.get("handler_seconds_total", 0.0), 3),
+            "latency_seconds_p50": percentile(0.50),
+            "latency_seconds_p95": percentile(0.95),
+            "latency_seconds_max": round(latencies[-1], 3) if latencies else None,
+        }
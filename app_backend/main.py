@@ -1,35 +1,42 @@
-from fastapi import FastAPI, Request, HTTPException, Security, Depends
+import time
+# Cold-start timings (app_startup_seconds in /metrics) are measured from here
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, Request, HTTPException, Security, Depends, Query
 from fastapi.security.api_key import APIKeyHeader, APIKey
 from starlette.status import HTTP_200_OK, HTTP_403_FORBIDDEN
-import xmltodict
 import logging
 from datetime import datetime
-import yt_dlp
 import sys
 import os
 
 # Fix import path to allow running from root or subdir
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from database import SessionLocal, Video
+from database import SessionLocal, ReadSessionLocal, Video, Channel, Subscription, get_pool_stats, init_db, \
+    get_async_session_factory, dispose_async_engines
+from storage import upsert_videos, get_data_version, cached_data_version, VIDEOS_DATASET, STATS_DATASET, STATS_FIELDS
+from search import upgrade_search_index
+from channels import ensure_channel_rollup, register_channels, untrack_channel, tracked_channels, resolve_pending_channels, channel_info
+from youtube import fetch_video_details, video_details_cache, VIDEO_NOTIFICATION_MAX_AGE
+from jobs import WorkerPool, enqueue_jobs
+from semantic import semantic_search, ensure_semantic_index
+from transcripts import process_transcript_job, TRANSCRIPTS_ENABLED, TRANSCRIPT_WORKERS, TRANSCRIPT_JOB_KIND
+import metrics
+from profiling import run_in_threadpool, RequestProfile, should_profile, query_stats
+from stats_refresh import StatsRefresher, STATS_REFRESH_ENABLED
+from subscriptions import subscribe_channels, record_verification, subscription_summary, LeaseRenewer, PUBSUB_CALLBACK_URL
+from fastapi.responses import JSONResponse, Response, PlainTextResponse
+from pydantic import BaseModel
+from sqlalchemy import select, or_, and_
+import base64
+import hashlib
+import threading
+import json
 import os
-import requests
 
 app = FastAPI(title="YouTube Monitor API")
 
-CHANNELS = [
-    "https://www.youtube.com/@markets",
-    "https://www.youtube.com/@ANINewsIndia"
-]
-
-CHANNELS_MAP = {
-    "https://www.youtube.com/@markets": "UCXZBbS8C2zqI5h1wQYtZ9vA", # Bloomberg Markets
-    "https://www.youtube.com/@ANINewsIndia": "UCtFqdWTX9b6a_I2N9qZ9a5g", # ANI News
-    "https://www.youtube.com/@CNN": "UCupvZG-5ko_eiXAupbDfxWw", # CNN
-    "https://www.youtube.com/@SkyNews": "UCoMdktPbSTixAyNGwb-UYkQ", # Sky News
-    "https://www.youtube.com/@AlJazeeraEnglish": "UCzbKQM2zLqkGRJE86tXw3hQ" # Al Jazeera English
-} # Note: In a real app these would be dynamically resolved or config based. Use Channel IDs for PubSubHubbub.
-
 @app.get("/")
 def home():
     return {"message": "Welcome to YouTube Monitor Link"}
@@ -38,6 +45,51 @@ def home():
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Schema creation is a startup step (or scripts/migrate.py), never an import side effect
+DB_INIT_ON_STARTUP = os.getenv("DB_INIT_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+# Worker pools, stats refresher, lease renewer and semantic index build. Off in
+# serverless_entrypoint.py: each cold start would otherwise start them all, and
+# queued jobs are drained by a long-running instance instead
+BACKGROUND_SERVICES_ENABLED = os.getenv("BACKGROUND_SERVICES_ENABLED", "true").lower() in ("1", "true", "yes")
+
+@app.on_event("startup")
+def init_database():
+    if DB_INIT_ON_STARTUP:
+        start = time.perf_counter()
+        init_db()
+        # One-time index and rollup builds; done here so they never run inside a webhook write
+        session = SessionLocal()
+        try:
+            upgrade_search_index(session)
+            ensure_channel_rollup(session)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        metrics.startup_timings.record("schema", time.perf_counter() - start)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        end = time.perf_counter()
+        # Route template (e.g. /videos/recent), not the raw path, to keep label values bounded
+        route = request.scope.get("route")
+        metrics.http_request_duration.observe(
+            end - start,
+            method=request.method, route=getattr(route, "path", "unmatched"), status=status,
+        )
+        if metrics.startup_timings.record("first_response", end - IMPORT_STARTED):
+            metrics.startup_timings.record("first_request", end - start)
+            logger.info(f"Cold start: {metrics.startup_timings.snapshot()}")
+
 # Security (Bonus)
 API_KEY_NAME = "X-API-Key"
 API_KEY = os.getenv("API_KEY", "secret-token")
@@ -51,75 +103,118 @@ async def get_api_key(api_key_header: str = Security(api_key_header)):
             status_code=HTTP_403_FORBIDDEN, detail="Could not validate credentials"
         )
 
-# Helper to fetch video details
-def fetch_video_details(video_id):
-    ydl_opts = {
-        'quiet': True,
-        'ignoreerrors': True
-    }
-    url = f"https://www.youtube.com/watch?v={video_id}"
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=False)
-        if info:
-            upload_date_str = info.get('upload_date')
-            if upload_date_str:
-                try:
-                    upload_date = datetime.strptime(upload_date_str, "%Y%m%d")
-                except ValueError:
-                    upload_date = datetime.utcnow()
-            else:
-                upload_date = datetime.utcnow()
-                
-            return {
-                "video_id": info.get('id'),
-                "title": info.get('title'),
-                "url": info.get('webpage_url'),
-                "upload_date": upload_date,
-                "view_count": info.get('view_count'),
-                "like_count": info.get('like_count'),
-                "description": info.get('description'),
-                "channel_id": info.get('channel_id'),
-                "channel_title": info.get('channel')
-            }
-    return None
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    # Opt-in (PROFILING_ENABLED): X-Profile: 1 plus a valid X-API-Key returns the profile as the body
+    mode = should_profile(request.headers, API_KEY)
+    if mode is None:
+        return await call_next(request)
+    with RequestProfile() as profile:
+        response = await call_next(request)
+    if not profile.active:
+        response.headers["X-Profile-Skipped"] = "another request is being profiled"
+        return response
+    report = profile.report(f"{request.method} {request.url.path} -> {response.status_code}")
+    if mode == "sample":
+        logger.info(f"Sampled request profile:\n{report}")
+        return response
+    return PlainTextResponse(report, headers={"X-Profiled-Status": str(response.status_code)})
 
 @app.get("/subscribe")
-async def subscribe_to_hub(callback_url: str):
+async def subscribe_to_hub(callback_url: str = None):
     """
-    Triggers subscription to YouTube PubSubHubbub for all configured channels.
-    callback_url: The public URL of this API's /webhook endpoint.
-                 (e.g. https://my-api.com/webhook)
+    Subscribes to YouTube PubSubHubbub for all tracked channels (see /channels), concurrently.
+    callback_url: The public URL of this API's /webhook endpoint
+                 (e.g. https://my-api.com/webhook); defaults to PUBSUB_CALLBACK_URL.
+    Leases are recorded when the hub verifies and renewed automatically before they expire.
     """
-    hub_url = "https://pubsubhubbub.appspot.com/subscribe"
-    results = []
-    
-    # We need Channel IDs, not URLs. 
-    # For this demo, let's assume we have them or extract them. 
-    # Example IDs mapped manually for robustness in this snippet:
-    # Bloomberg Markets: UCPWOxvqspG2ccz8lWF_FzOQ (Actually likely 'UCrM7B7SL_g1edFOnmj-SDKg' etc. Let's use the map defined at top)
-    
-    for url, channel_id in CHANNELS_MAP.items():
-        topic_url = f"https://www.youtube.com/xml/feeds/videos.xml?channel_id={channel_id}"
-        
-        data = {
-            "hub.mode": "subscribe",
-            "hub.topic": topic_url,
-            "hub.callback": callback_url,
-            "hub.verify": "async", # or 'sync'
-            # "hub.secret": "some_secret_key" # Recommended for security
-        }
-        
-        try:
-            response = requests.post(hub_url, data=data)
-            if response.status_code == 202:
-                results.append({"channel": url, "status": "subscription_requested", "code": 202})
-            else:
-                results.append({"channel": url, "status": "failed", "code": response.status_code, "error": response.text})
-        except Exception as e:
-            results.append({"channel": url, "status": "error", "detail": str(e)})
+    callback_url = callback_url or PUBSUB_CALLBACK_URL
+    if not callback_url:
+        raise HTTPException(status_code=400, detail="callback_url is required (or set PUBSUB_CALLBACK_URL)")
 
+    channels = await run_in_threadpool(load_subscribable_channels)
+    results = await subscribe_channels(lease_renewer.client, list(channels), callback_url)
+    for result in results:
+        result["channel"] = channels[result["channel_id"]]
     return {"results": results}
 
+def load_subscribable_channels():
+    """channel_id -> URL of tracked channels, resolving newly added ones first."""
+    session = SessionLocal()
+    try:
+        resolve_pending_channels(session)
+        return {c.channel_id: c.url for c in tracked_channels(session, resolved_only=True)}
+    finally:
+        session.close()
+
+# Channel registry (admin)
+class ChannelUrls(BaseModel):
+    urls: list[str]
+    subscribe: bool = True  # subscribe new channels to the hub if PUBSUB_CALLBACK_URL is set
+
+def add_channels(urls):
+    session = SessionLocal()
+    try:
+        registered = register_channels(session, urls)
+        urls = [c.url for c in registered]
+        session.commit()
+        resolve_pending_channels(session)
+        channels = list(session.execute(select(Channel).where(Channel.url.in_(urls))).scalars())
+        return [channel_info(c) for c in sorted(channels, key=lambda c: urls.index(c.url))]
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def remove_channel(key):
+    session = SessionLocal()
+    try:
+        channel = untrack_channel(session, key)
+        if channel is None:
+            return None, None
+        session.commit()
+        subscription = session.get(Subscription, channel.channel_id) if channel.channel_id else None
+        callback_url = subscription.callback_url if subscription is not None and subscription.status != "unsubscribed" else None
+        return channel_info(channel), callback_url
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def list_channels():
+    session = ReadSessionLocal()
+    try:
+        return [channel_info(c) for c in tracked_channels(session)]
+    finally:
+        session.close()
+
+@app.get("/channels", dependencies=[Depends(get_api_key)])
+async def get_channels():
+    return {"channels": await run_in_threadpool(list_channels)}
+
+@app.post("/channels", dependencies=[Depends(get_api_key)])
+async def post_channels(body: ChannelUrls):
+    """Registers channel URLs (e.g. https://www.youtube.com/@CNN); each is looked up once and stored."""
+    channels = await run_in_threadpool(add_channels, body.urls)
+    subscriptions = []
+    if body.subscribe and PUBSUB_CALLBACK_URL:
+        channel_ids = [c["channel_id"] for c in channels if c["channel_id"]]
+        subscriptions = await subscribe_channels(lease_renewer.client, channel_ids, PUBSUB_CALLBACK_URL)
+    return {"channels": channels, "subscriptions": subscriptions}
+
+@app.delete("/channels/{key:path}", dependencies=[Depends(get_api_key)])
+async def delete_channel(key: str):
+    """Stops monitoring a channel (by channel ID, URL or @handle) and unsubscribes it from the hub."""
+    channel, callback_url = await run_in_threadpool(remove_channel, key)
+    if channel is None:
+        raise HTTPException(status_code=404, detail="Unknown channel")
+    unsubscribed = []
+    if callback_url:
+        unsubscribed = await subscribe_channels(lease_renewer.client, [channel["channel_id"]], callback_url, mode="unsubscribe")
+    return {"channel": channel, "unsubscribe": unsubscribed}
+
 @app.get("/request-feed")
 async def verify_subscription(request: Request):
     # Handle PubSubHubbub verification
@@ -133,66 +228,375 @@ async def verify_subscription(request: Request):
 
 from fastapi.responses import PlainTextResponse
 @app.get("/webhook", response_class=PlainTextResponse)
-async def webhook_verify(hub_mode: str = None, hub_challenge: str = None, hub_verify_token: str = None):
+async def webhook_verify(
+    hub_mode: str = Query(None, alias="hub.mode"),
+    hub_topic: str = Query(None, alias="hub.topic"),
+    hub_challenge: str = Query(None, alias="hub.challenge"),
+    hub_lease_seconds: str = Query(None, alias="hub.lease_seconds"),
+    hub_reason: str = Query(None, alias="hub.reason"),
+):
     # Standard YouTube PubSubHubbub verification
-    # YouTube sends: hub.mode=subscribe, hub.topic=..., hub.challenge=...
-    # We just need to echo hub.challenge
-    if hub_challenge:
-        return hub_challenge
-    return "Missing challenge"
+    # YouTube sends: hub.mode=subscribe, hub.topic=..., hub.challenge=..., hub.lease_seconds=...
+    # We echo hub.challenge for topics we asked for and record the lease
+    if hub_mode == "denied":
+        await run_in_threadpool(record_verification, hub_mode, hub_topic, reason=hub_reason)
+        return "ok"
+    if not hub_challenge:
+        return "Missing challenge"
+    if not await run_in_threadpool(record_verification, hub_mode, hub_topic, hub_lease_seconds):
+        logger.warning(f"Refusing {hub_mode} verification for unknown topic {hub_topic}")
+        raise HTTPException(status_code=404, detail="Unknown subscription")
+    return hub_challenge
+
+# Webhook processing: notifications are queued and handled by background workers
+WEBHOOK_JOB_KIND = "video_notification"
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_RETRY_BASE_SECONDS = float(os.getenv("WEBHOOK_RETRY_BASE_SECONDS", "5"))
+WEBHOOK_RETRY_MAX_SECONDS = float(os.getenv("WEBHOOK_RETRY_MAX_SECONDS", "600"))
+
+def process_video_notification(video_id):
+    """Fetches full details for a notified video and stores them. Raises so the job is retried."""
+    # Deliveries close together share one extraction; a later re-delivery may be an edit
+    # of the title or description, so anything older than VIDEO_NOTIFICATION_MAX_AGE is re-extracted
+    video_details = fetch_video_details(video_id, max_age=VIDEO_NOTIFICATION_MAX_AGE)
+    if not video_details:
+        raise RuntimeError(f"No details returned for {video_id}")
+
+    session = SessionLocal()
+    try:
+        stats = upsert_videos(session, [video_details])[0]
+        session.commit()
+        logger.info(f"Stored video: {video_details['title']} ({'inserted' if stats['inserted'] else 'updated' if stats['updated'] else 'unchanged'})")
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+    if stats["inserted"] and TRANSCRIPTS_ENABLED:
+        # Captions are fetched by the transcript workers; a failure here must not retry the video
+        try:
+            enqueue_jobs(TRANSCRIPT_JOB_KIND, [video_id])
+            transcript_workers.notify()
+        except Exception as e:
+            logger.warning(f"Could not queue transcript for {video_id}: {e}")
+
+webhook_workers = WorkerPool(
+    WEBHOOK_JOB_KIND,
+    process_video_notification,
+    workers=WEBHOOK_WORKERS,
+    max_attempts=WEBHOOK_MAX_ATTEMPTS,
+    base_delay=WEBHOOK_RETRY_BASE_SECONDS,
+    max_delay=WEBHOOK_RETRY_MAX_SECONDS,
+)
+
+@app.on_event("startup")
+def start_webhook_workers():
+    if BACKGROUND_SERVICES_ENABLED:
+        webhook_workers.start()
+
+@app.on_event("shutdown")
+def stop_webhook_workers():
+    webhook_workers.stop()
+
+# Separate pool: caption downloads never occupy a webhook worker
+transcript_workers = WorkerPool(
+    TRANSCRIPT_JOB_KIND,
+    process_transcript_job,
+    workers=TRANSCRIPT_WORKERS,
+    max_attempts=3,
+    base_delay=60.0,
+    max_delay=3600.0,
+)
+
+@app.on_event("startup")
+def start_transcript_workers():
+    if BACKGROUND_SERVICES_ENABLED and TRANSCRIPTS_ENABLED:
+        transcript_workers.start()
+
+@app.on_event("shutdown")
+def stop_transcript_workers():
+    transcript_workers.stop()
+
+stats_refresher = StatsRefresher()
+
+@app.on_event("startup")
+def start_stats_refresher():
+    if BACKGROUND_SERVICES_ENABLED and STATS_REFRESH_ENABLED:
+        stats_refresher.start()
+
+@app.on_event("shutdown")
+def stop_stats_refresher():
+    stats_refresher.stop()
+
+lease_renewer = LeaseRenewer()
+
+@app.on_event("startup")
+async def start_lease_renewer():
+    if BACKGROUND_SERVICES_ENABLED:
+        lease_renewer.start()
+
+@app.on_event("shutdown")
+async def stop_lease_renewer():
+    await lease_renewer.stop()
+
+@app.on_event("startup")
+def build_semantic_index():
+    # Fits the semantic index in the background the first time the API runs against a database
+    if BACKGROUND_SERVICES_ENABLED:
+        threading.Thread(target=ensure_semantic_index, name="semantic-index", daemon=True).start()
+
+def parse_notification_video_ids(body):
+    """Extracts the yt:videoId of every entry in a PubSubHubbub Atom payload."""
+    # Imported here, not at the top, to keep it off the cold-start path
+    import xmltodict
+    data = xmltodict.parse(body)
+    feed = data.get('feed') or {}
+    entry = feed.get('entry', None)
+    if not entry:
+        return []
+    # Entry can be a list if multiple updates, but usually one for real-time
+    entries = entry if isinstance(entry, list) else [entry]
+    return [e.get('yt:videoId') for e in entries if e.get('yt:videoId')]
 
 @app.post("/webhook")
 async def webhook_receive(request: Request):
-    # Parse Atom Feed XML
+    # Parse Atom Feed XML and queue the videos; the workers fetch and store them
     body = await request.body()
     try:
-        data = xmltodict.parse(body)
-        feed = data.get('feed', {})
-        entry = feed.get('entry', None)
-        
-        if entry:
-            # Entry can be a list if multiple updates, but usually one for real-time
-            if isinstance(entry, list):
-                entries = entry
-            else:
-                entries = [entry]
-                
-            for e in entries:
-                video_id = e.get('yt:videoId')
-                if video_id:
-                    logger.info(f"New video notification: {video_id}")
-                    # Fetch full details and store
-                    video_details = fetch_video_details(video_id)
-                    if video_details:
-                        session = SessionLocal()
-                        try:
-                            # Check if exists
-                            existing = session.query(Video).filter(Video.video_id == video_id).first()
-                            if existing:
-                                for key, value in video_details.items():
-                                    setattr(existing, key, value)
-                            else:
-                                new_video = Video(**video_details)
-                                session.add(new_video)
-                            session.commit()
-                            logger.info(f"Stored video: {video_details['title']}")
-                        except Exception as e:
-                            logger.error(f"DB Error: {e}")
-                            session.rollback()
-                        finally:
-                            session.close()
-    
+        video_ids = parse_notification_video_ids(body)
+    except Exception as e:
+        logger.error(f"Webhook parse error: {e}")
+        return {"status": "received"}
+
+    if video_ids:
+        metrics.webhook_notifications_received.inc(len(video_ids))
+        logger.info(f"New video notification: {', '.join(video_ids)}")
+        try:
+            # Through the single sync writer, off the event loop while it waits for the connection
+            queued = await run_in_threadpool(enqueue_jobs, WEBHOOK_JOB_KIND, video_ids)
+        except Exception as e:
+            # Let the hub re-deliver rather than dropping the notification
+            logger.error(f"Could not queue notification: {e}")
+            raise HTTPException(status_code=503, detail="Queue unavailable")
+        webhook_workers.notify()
+        return {"status": "received", "queued": queued}
+
     return {"status": "received"}
 
+# /videos/recent paging
+RECENT_MAX_PAGE_SIZE = int(os.getenv("RECENT_MAX_PAGE_SIZE", "100"))
+# Fields a client may request; 'transcript' is deliberately not served here
+RECENT_FIELDS = ["video_id", "title", "url", "upload_date", "view_count", "like_count",
+                 "description", "channel_id", "channel_title", "ai_summary", "tags"]
+
+def encode_cursor(upload_date, video_id):
+    raw = json.dumps([upload_date.isoformat(), video_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        upload_date, video_id = json.loads(raw)
+        return datetime.fromisoformat(upload_date), str(video_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_fields(fields):
+    if not fields:
+        return list(RECENT_FIELDS)
+    requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in RECENT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(RECENT_FIELDS)}")
+    return requested
+
+def recent_videos_query(limit, fields, after=None):
+    """
+    One page of videos (plus one row to detect a next page), newest first, ordered by
+    (upload_date, video_id) so the keyset cursor is stable. Only the requested columns
+    are selected.
+    """
+    columns = [getattr(Video, f) for f in fields]
+    # The sort key is always selected so the next cursor can be built
+    query = select(*columns, Video.upload_date.label("_upload_date"), Video.video_id.label("_video_id")) \
+        .where(Video.upload_date.isnot(None)) \
+        .order_by(Video.upload_date.desc(), Video.video_id.desc()) \
+        .limit(limit + 1)
+    if after:
+        upload_date, video_id = after
+        query = query.where(or_(
+            Video.upload_date < upload_date,
+            and_(Video.upload_date == upload_date, Video.video_id < video_id),
+        ))
+    return query
+
+def recent_videos_page(rows, limit, fields):
+    """Rows of recent_videos_query() -> (videos, next_cursor)."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]._upload_date, rows[-1]._video_id)
+
+    videos = []
+    for row in rows:
+        item = {}
+        for f in fields:
+            value = row._mapping[f]
+            item[f] = value.isoformat() if isinstance(value, datetime) else value
+        videos.append(item)
+    return videos, next_cursor
+
+def query_recent_videos(limit, fields, after=None):
+    """Sync version of query_recent_videos_async(), used when no async driver is installed."""
+    session = ReadSessionLocal()
+    try:
+        rows = session.execute(recent_videos_query(limit, fields, after)).all()
+    finally:
+        session.close()
+    return recent_videos_page(rows, limit, fields)
+
+async def query_recent_videos_async(limit, fields, after=None):
+    """One page of recent videos as (videos, next_cursor), without blocking the event loop."""
+    session_factory = get_async_session_factory()
+    if session_factory is None:
+        return await run_in_threadpool(query_recent_videos, limit, fields, after)
+    async with session_factory() as session:
+        rows = (await session.execute(recent_videos_query(limit, fields, after))).all()
+    return recent_videos_page(rows, limit, fields)
+
+async def data_version(name=VIDEOS_DATASET):
+    """get_data_version() for a handler: the cached value inline, a database read in a worker thread."""
+    version = cached_data_version(name)
+    if version is None:
+        version = await run_in_threadpool(get_data_version, name)
+    return version
+
 @app.get("/videos/recent", dependencies=[Depends(get_api_key)])
-async def get_recent_videos(limit: int = 10):
-    session = SessionLocal()
+async def get_recent_videos(request: Request, limit: int = 10, cursor: str = None, fields: str = None):
+    """
+    Most recent videos, newest first.
+    limit: page size (capped at RECENT_MAX_PAGE_SIZE).
+    cursor: value of the X-Next-Cursor header from the previous page.
+    fields: comma-separated subset of RECENT_FIELDS, e.g. fields=video_id,title,upload_date.
+    Responses carry an ETag; polling with If-None-Match returns 304 while nothing changed.
+    """
+    limit = max(1, min(limit, RECENT_MAX_PAGE_SIZE))
+    selected = parse_fields(fields)
+    after = decode_cursor(cursor) if cursor else None
+
+    # The data version is cached in-process, so an unchanged poll never hits the database.
+    # Count-only refreshes bump a separate version, which only matters if counts are returned.
+    version = await data_version()
+    if any(f in STATS_FIELDS for f in selected):
+        version = f"{version}.{await data_version(STATS_DATASET)}"
+    tag = hashlib.sha1(f"{version}|{limit}|{cursor}|{','.join(selected)}".encode()).hexdigest()
+    etag = f'W/"{tag}"'
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers={"ETag": etag})
+
+    videos, next_cursor = await query_recent_videos_async(limit, selected, after)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return JSONResponse(content=videos, headers=headers)
+
+SEMANTIC_MAX_K = 50
+SEMANTIC_MAX_QUERIES = 16
+
+def run_semantic_search(queries, k):
+    session = ReadSessionLocal()
     try:
-        videos = session.query(Video).order_by(Video.upload_date.desc()).limit(limit).all()
-        return [v.to_dict() for v in videos]
+        results = semantic_search(session, queries, k=k)
     finally:
         session.close()
+    for hits in results:
+        for hit in hits:
+            if isinstance(hit["upload_date"], datetime):
+                hit["upload_date"] = hit["upload_date"].isoformat()
+    return results
+
+@app.get("/videos/semantic-search", dependencies=[Depends(get_api_key)])
+async def semantic_search_videos(q: list[str] = Query(...), k: int = 10):
+    """
+    Videos about the same topic as each query, best first.
+    q: query text; repeat the parameter (q=...&q=...) to run several queries in one pass.
+    k: results per query (capped at SEMANTIC_MAX_K).
+    """
+    queries = [text for text in q if text.strip()][:SEMANTIC_MAX_QUERIES]
+    if not queries:
+        raise HTTPException(status_code=400, detail="q must not be empty")
+    k = max(1, min(k, SEMANTIC_MAX_K))
+    try:
+        results = await run_in_threadpool(run_semantic_search, queries, k)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return [{"query": text, "results": hits} for text, hits in zip(queries, results)]
+
+@app.get("/stats", dependencies=[Depends(get_api_key)])
+async def get_stats():
+    # Runtime statistics used to size the DB pool (DB_POOL_SIZE / DB_POOL_MAX_OVERFLOW)
+    return {
+        "db_pool": get_pool_stats(),
+        "webhook_queue": await run_in_threadpool(webhook_workers.stats),
+        "transcript_queue": await run_in_threadpool(transcript_workers.stats),
+        "video_details_cache": video_details_cache.stats(),
+        "subscriptions": await run_in_threadpool(subscription_summary),
+        "stats_refresh": await run_in_threadpool(stats_refresher.stats),
+        "sql": query_stats(),
+        "startup": metrics.startup_timings.snapshot(),
+    }
+
+METRICS_REQUIRE_API_KEY = os.getenv("METRICS_REQUIRE_API_KEY", "true").lower() in ("1", "true", "yes")
+
+def _pool_samples():
+    return [
+        ((url, key), value)
+        for url, stats in get_pool_stats().items()
+        for key, value in stats.items() if key in ("size", "checked_out", "overflow")
+    ]
+
+def _queue_samples():
+    samples = []
+    for pool in (webhook_workers, transcript_workers):
+        stats = pool.stats()
+        samples += [((pool.kind, status), stats[status]) for status in ("pending", "processing", "done", "failed")]
+    return samples
+
+def _cache_samples():
+    stats = video_details_cache.stats()
+    return [((key,), stats[key]) for key in ("size", "hits", "misses", "coalesced")]
+
+metrics.register_collector("db_pool_connections", "Database pool usage by engine.", _pool_samples, ("engine", "state"))
+metrics.register_collector("job_queue_jobs", "Jobs in the queue table by status.", _queue_samples, ("kind", "status"))
+metrics.register_collector("fetch_video_details_cache", "Video details cache size and lookups.", _cache_samples, ("stat",))
+metrics.register_collector("videos_data_version", "Current version of the videos dataset.", get_data_version)
+metrics.register_collector("stats_refresh_due", "Videos whose view/like counts are due for a refresh.",
+                           lambda: stats_refresher.stats()["due"])
+
+async def metrics_auth(request: Request):
+    if METRICS_REQUIRE_API_KEY:
+        await get_api_key(request.headers.get(API_KEY_NAME))
+
+@app.get("/metrics", dependencies=[Depends(metrics_auth)])
+async def get_metrics():
+    # Collectors hit the database (queue depth), so render off the event loop
+    body = await run_in_threadpool(metrics.render)
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/")
 async def root():
     return {"message": "YouTube Monitor API is running"}
+
+@app.on_event("shutdown")
+async def close_async_engines():
+    await dispose_async_engines()
+
+# Registered last, so it runs after every other startup hook
+@app.on_event("startup")
+def record_ready():
+    metrics.startup_timings.record("ready", time.perf_counter() - IMPORT_STARTED)
+
+metrics.startup_timings.record("import", time.perf_counter() - IMPORT_STARTED)
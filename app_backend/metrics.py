@@ -0,0 +1,239 @@
+"""
+In-process Prometheus-style metrics, rendered by GET /metrics.
+
+Counters and histograms live in a module-level registry and are updated directly by
+the code paths they describe (request middleware in main.py, the webhook workers,
+fetch_video_details, upsert_videos, database sessions). render() produces the
+Prometheus text exposition format, so any Prometheus-compatible scraper can collect
+it; nothing is sent anywhere. Gauges that reflect current state (pool usage, queue
+depth, cache size) are read at scrape time through register_collector().
+"""
+import bisect
+import math
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Seconds; covers fast DB reads up to slow yt-dlp extractions
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ""
+    escaped = [(k, str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for k, v in pairs]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class Counter:
+    """Monotonic counter, optionally split by label values."""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(n, "") for n in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+class Histogram:
+    """Cumulative-bucket histogram with sum and count, optionally split by label values."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, **labels):
+        """Context manager that observes the duration of its block."""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': _format_value(bound)})} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': '+Inf'})} {series[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}"
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+_metrics = []
+_collectors = []
+_registry_lock = threading.Lock()
+
+def counter(name, documentation, labelnames=()):
+    metric = Counter(name, documentation, labelnames)
+    with _registry_lock:
+        _metrics.append(metric)
+    return metric
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    metric = Histogram(name, documentation, labelnames, buckets)
+    with _registry_lock:
+        _metrics.append(metric)
+    return metric
+
+def register_collector(name, documentation, collect, labelnames=()):
+    """
+    Adds a gauge whose samples come from `collect()` at scrape time. `collect` returns
+    a number, or a list of (label values tuple, number) pairs when `labelnames` is set.
+    """
+    with _registry_lock:
+        _collectors.append((name, documentation, tuple(labelnames), collect))
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    with _registry_lock:
+        metrics = list(_metrics)
+        collectors = list(_collectors)
+    for metric in metrics:
+        name = f"{metric.name}_total" if metric.kind == "counter" else metric.name
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        lines.extend(metric.samples())
+    for name, documentation, labelnames, collect in collectors:
+        try:
+            value = collect()
+        except Exception:
+            # A failing collector (e.g. database down) must not break the whole scrape
+            continue
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} gauge")
+        samples = value if labelnames else [((), value)]
+        for key, sample in samples:
+            if sample is not None:
+                lines.append(f"{name}{_format_labels(labelnames, key)} {_format_value(sample)}")
+    return "\n".join(lines) + "\n"
+
+class StartupTimings:
+    """Cold-start milestones in seconds, each recorded once per process."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def record(self, phase, seconds):
+        """Stores `seconds` for `phase` unless already recorded. Returns whether it was stored."""
+        with self._lock:
+            if phase in self._values:
+                return False
+            self._values[phase] = seconds
+            return True
+
+    def snapshot(self):
+        with self._lock:
+            return {phase: round(seconds, 6) for phase, seconds in self._values.items()}
+
+    def samples(self):
+        return [((phase,), seconds) for phase, seconds in self.snapshot().items()]
+
+# --- metrics shared across modules ----------------------------------------------
+
+http_request_duration = histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status"))
+webhook_notifications_received = counter(
+    "webhook_notifications_received", "Video IDs received in webhook notifications.")
+jobs_finished = counter(
+    "jobs_finished", "Background jobs finished, by kind and outcome (processed, retried, failed).", ("kind", "outcome"))
+job_duration = histogram(
+    "job_duration_seconds", "Time spent in a background job handler.", ("kind",))
+job_queue_latency = histogram(
+    "job_queue_latency_seconds", "Time from enqueue to a job's final outcome.", ("kind",))
+video_details_duration = histogram(
+    "fetch_video_details_duration_seconds", "Duration of yt-dlp video extractions (cache misses and forced refreshes).")
+video_details_errors = counter(
+    "fetch_video_details_errors", "yt-dlp extractions that raised or returned nothing.")
+db_session_duration = histogram(
+    "db_session_duration_seconds", "Time from a session's first database use to commit, rollback or close.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+videos_upserted = counter(
+    "videos_upserted", "Videos passed to upsert_videos and committed, by result (inserted, updated, unchanged).", ("result",))
+
+startup_timings = StartupTimings()
+register_collector(
+    "app_startup_seconds",
+    "Cold start: import of the app module, init_db() at startup, and time from import start to startup done "
+    "(ready) and to the first response (first_response); first_request is that request's own latency.",
+    startup_timings.samples, ("phase",))
+
+@event.listens_for(Session, "after_begin")
+def _session_begin(session, transaction, connection):
+    session.info.setdefault("metrics_started_at", time.perf_counter())
+
+@event.listens_for(Session, "after_transaction_end")
+def _session_end(session, transaction):
+    if transaction.parent is None:
+        started = session.info.pop("metrics_started_at", None)
+        if started is not None:
+            db_session_duration.observe(time.perf_counter() - started)
+
+def count_upserts(session, totals):
+    """Records upsert_videos results once `session` commits (dropped on rollback)."""
+    pending = session.info.setdefault("metrics_upserts", {})
+    for result, amount in totals.items():
+        pending[result] = pending.get(result, 0) + amount
+
+@event.listens_for(Session, "after_commit")
+def _commit_upserts(session):
+    for result, amount in session.info.pop("metrics_upserts", {}).items():
+        if amount:
+            videos_upserted.inc(amount, result=result)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_upserts(session):
+    session.info.pop("metrics_upserts", None)
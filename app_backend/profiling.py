@@ -0,0 +1,237 @@
+"""
+Opt-in query and request profiling.
+
+SQL: with SQL_PROFILING=true (implied by PROFILING_ENABLED=true) every engine from
+database.get_engine() gets before/after_cursor_execute listeners that record each
+statement's duration, row count and parameter shape (names and types, never values). Statements slower than
+SQL_SLOW_QUERY_MS are logged and kept in a ring buffer shown by GET /stats; with
+SQL_EXPLAIN_SLOW=true the log line carries the database's plan for slow SELECTs.
+
+Requests: with PROFILING_ENABLED=true, a request carrying `X-Profile: 1` and a valid
+API key runs under cProfile and the response body is replaced by the profile (top
+functions by cumulative time, plus the SQL the request ran). PROFILE_SAMPLE_RATE
+profiles that share of all requests and logs the result instead. cProfile only sees
+the thread it runs in, so handlers should offload blocking work with this module's
+run_in_threadpool(), which profiles the worker thread too.
+"""
+import collections
+import contextvars
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+from sqlalchemy import event
+
+try:
+    from .metrics import histogram
+except ImportError:
+    from metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+SQL_PROFILING = os.getenv("SQL_PROFILING", "false").lower() in ("1", "true", "yes")
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+SQL_EXPLAIN_SLOW = os.getenv("SQL_EXPLAIN_SLOW", "false").lower() in ("1", "true", "yes")
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+# Request profiles list the SQL they ran, so they need the statement listeners
+SQL_INSTRUMENTED = SQL_PROFILING or PROFILING_ENABLED
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_HEADER = "X-Profile"
+PROFILE_TOP_N = 40
+SLOW_QUERY_BUFFER = 100
+# Distinct statements tracked in query_stats(); new ones are dropped beyond this
+STATEMENT_STATS_LIMIT = 500
+
+db_query_duration = histogram(
+    "db_query_duration_seconds", "SQL statement duration by operation (SQL_PROFILING only).", ("operation",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+# Statements run by the request being profiled, if any
+_request_queries = contextvars.ContextVar("request_queries", default=None)
+# Per-thread profilers started by run_in_threadpool() for the request being profiled
+_request_profiles = contextvars.ContextVar("request_profiles", default=None)
+
+# One profiled request at a time: a second cProfile in the event loop thread would replace the first
+_profile_lock = threading.Lock()
+
+_slow_queries = collections.deque(maxlen=SLOW_QUERY_BUFFER)
+_statement_stats = {}
+_stats_lock = threading.Lock()
+
+def normalize_statement(statement):
+    """Single-line statement with IN-lists collapsed, used as the aggregation key."""
+    statement = " ".join(statement.split())
+    return re.sub(r"\((?:\s*(?:\?|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|:\w+)\s*\)", "(...)", statement)
+
+def parameter_shape(parameters, executemany):
+    """Describes parameters without their values, e.g. '500 x {video_id: str, title: str}'."""
+    if executemany:
+        rows = list(parameters) if parameters else []
+        return f"{len(rows)} x {parameter_shape(rows[0], False)}" if rows else "0 rows"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(v).__name__ for v in parameters) + ")"
+    return type(parameters).__name__ if parameters is not None else "none"
+
+def _explain(cursor, dialect, statement, parameters):
+    # Raw DBAPI cursor on the same connection, so the listeners don't see it
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute(prefix + statement, parameters)
+        rows = explain_cursor.fetchall()
+    finally:
+        explain_cursor.close()
+    if dialect == "sqlite":
+        return "\n".join(str(row[-1]) for row in rows)
+    return "\n".join(str(row[0]) for row in rows)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("profiling_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("profiling_started")
+    if not started:
+        return
+    duration = time.perf_counter() - started.pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+    db_query_duration.observe(duration, operation=operation)
+
+    key = normalize_statement(statement)
+    rowcount = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else None
+    with _stats_lock:
+        stats = _statement_stats.get(key)
+        if stats is None and len(_statement_stats) < STATEMENT_STATS_LIMIT:
+            stats = _statement_stats[key] = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+        if stats is not None:
+            stats["count"] += 1
+            stats["total_seconds"] += duration
+            stats["max_seconds"] = max(stats["max_seconds"], duration)
+
+    queries = _request_queries.get()
+    if queries is not None:
+        queries.append((duration, key, rowcount))
+
+    if duration * 1000 < SQL_SLOW_QUERY_MS:
+        return
+    entry = {
+        "statement": key[:2000],
+        "parameters": parameter_shape(parameters, executemany),
+        "duration_ms": round(duration * 1000, 2),
+        "rowcount": rowcount,
+        "at": time.time(),
+    }
+    if SQL_EXPLAIN_SLOW and operation in ("SELECT", "WITH") and not executemany:
+        try:
+            entry["plan"] = _explain(cursor, conn.dialect.name, statement, parameters)
+        except Exception as e:
+            entry["plan"] = f"EXPLAIN failed: {e}"
+    with _stats_lock:
+        _slow_queries.append(entry)
+    logger.warning(
+        f"Slow query ({entry['duration_ms']} ms, rows={rowcount}, params={entry['parameters']}): {entry['statement'][:500]}"
+        + (f"\nPlan:\n{entry['plan']}" if "plan" in entry else "")
+    )
+
+def instrument_engine(engine):
+    """Attaches the statement listeners to `engine` (idempotent)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def query_stats(limit=20):
+    """Statements by total time, and the most recent slow queries."""
+    with _stats_lock:
+        top = sorted(_statement_stats.items(), key=lambda item: item[1]["total_seconds"], reverse=True)[:limit]
+        slow = list(_slow_queries)[-limit:]
+    return {
+        "enabled": SQL_INSTRUMENTED,
+        "slow_query_ms": SQL_SLOW_QUERY_MS,
+        "top_statements": [
+            {"statement": key[:500], "count": s["count"], "total_ms": round(s["total_seconds"] * 1000, 2),
+             "mean_ms": round(s["total_seconds"] * 1000 / s["count"], 3), "max_ms": round(s["max_seconds"] * 1000, 2)}
+            for key, s in top
+        ],
+        "slow_queries": slow,
+    }
+
+# --- request profiling ----------------------------------------------------------
+
+async def run_in_threadpool(func, *args, **kwargs):
+    """Starlette's run_in_threadpool, but the worker thread is profiled too while a request is."""
+    from starlette.concurrency import run_in_threadpool as _starlette_run_in_threadpool
+    profiles = _request_profiles.get()
+    if profiles is None:
+        return await _starlette_run_in_threadpool(func, *args, **kwargs)
+
+    def profiled():
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            profiles.append(profile)
+    return await _starlette_run_in_threadpool(profiled)
+
+def should_profile(headers, api_key):
+    """'header' when the caller asked for the profile, 'sample' when sampled, else None."""
+    if not PROFILING_ENABLED:
+        return None
+    if headers.get(PROFILE_HEADER, "").lower() in ("1", "true", "yes") and api_key and headers.get("X-API-Key") == api_key:
+        return "header"
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+class RequestProfile:
+    """
+    Profiles one request: the event loop thread plus any run_in_threadpool() workers.
+    Other requests the event loop serves meanwhile show up in the profile too.
+    `active` is False (and nothing is profiled) while another request is being profiled.
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.queries = []
+        self.thread_profiles = []
+        self.active = False
+
+    def __enter__(self):
+        self.active = _profile_lock.acquire(blocking=False)
+        if not self.active:
+            return self
+        self._tokens = (_request_queries.set(self.queries), _request_profiles.set(self.thread_profiles))
+        self.start = time.perf_counter()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if not self.active:
+            return False
+        _profile_lock.release()
+        self.profile.disable()
+        self.seconds = time.perf_counter() - self.start
+        _request_queries.reset(self._tokens[0])
+        _request_profiles.reset(self._tokens[1])
+        return False
+
+    def report(self, title, top=PROFILE_TOP_N):
+        out = io.StringIO()
+        sql_seconds = sum(q[0] for q in self.queries)
+        out.write(f"{title}: {self.seconds * 1000:.1f} ms wall, {len(self.queries)} SQL statements "
+                  f"({sql_seconds * 1000:.1f} ms)\n")
+        for duration, statement, rowcount in sorted(self.queries, reverse=True)[:20]:
+            out.write(f"  {duration * 1000:8.2f} ms  rows={rowcount}  {statement[:200]}\n")
+        out.write("\n")
+        stats = pstats.Stats(self.profile, stream=out)
+        for profile in self.thread_profiles:
+            stats.add(profile)
+        stats.sort_stats("cumulative").print_stats(top)
+        return out.getvalue()
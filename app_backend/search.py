@@ -0,0 +1,254 @@
+"""
+Full-text search over video titles and descriptions.
+
+SQLite databases get an FTS5 table (videos_fts); Postgres gets a videos_search table
+holding a weighted tsvector with a GIN index. The write paths (webhook and ingest)
+keep it in sync by calling index_videos() in the same transaction as the video
+write. The index is created and filled by upgrade_search_index() at API startup and
+in scripts/migrate.py; existing databases can be re-indexed with
+scripts/rebuild_search_index.py.
+"""
+import hashlib
+import logging
+import re
+import threading
+
+from sqlalchemy import text, event
+from sqlalchemy.orm import Session
+
+try:
+    from .database import Video
+except ImportError:
+    from database import Video
+
+logger = logging.getLogger(__name__)
+
+# Title matches count more than description matches when ranking
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_ready_engines = set()
+_ready_lock = threading.Lock()
+
+def _dialect(session):
+    return session.get_bind().dialect.name
+
+def _engine_key(session):
+    return str(session.get_bind().url)
+
+def fts_rowid(video_id):
+    """
+    Stable 64-bit FTS5 rowid for a video. video_id is an UNINDEXED column, so entries
+    are replaced by rowid; filtering on video_id would scan the whole index.
+    """
+    return int.from_bytes(hashlib.blake2b(video_id.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+def ensure_search_index(session):
+    """
+    Creates the full-text table/index for the session's database if missing. Does not
+    populate it or commit; the engine is remembered as indexed once the transaction
+    commits. Returns True if it created the index.
+    """
+    key = _engine_key(session)
+    if key in _ready_engines:
+        return False
+    with _ready_lock:
+        dialect = _dialect(session)
+        if dialect not in ("sqlite", "postgresql"):
+            logger.warning(f"Full-text search not supported for dialect {dialect}, using LIKE")
+            return False
+        if search_index_available(session):
+            return False
+        if dialect == "sqlite":
+            session.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5("
+                "video_id UNINDEXED, title, description, tokenize='porter unicode61')"
+            ))
+        else:
+            session.execute(text(
+                "CREATE TABLE IF NOT EXISTS videos_search ("
+                "video_id VARCHAR PRIMARY KEY, document TSVECTOR NOT NULL)"
+            ))
+            session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_videos_search_document ON videos_search USING GIN (document)"
+            ))
+        # Remembered as ready once this transaction commits (see _mark_indexes_ready)
+        session.info.setdefault("created_search_indexes", set()).add(key)
+        return True
+
+@event.listens_for(Session, "after_commit")
+def _mark_indexes_ready(session):
+    keys = session.info.pop("created_search_indexes", None)
+    if keys:
+        _ready_engines.update(keys)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_indexes(session):
+    session.info.pop("created_search_indexes", None)
+
+def _has_stale_rowids(session):
+    sample = session.execute(text("SELECT rowid, video_id FROM videos_fts LIMIT 1")).first()
+    return bool(sample) and sample.rowid != fts_rowid(sample.video_id)
+
+def upgrade_search_index(session):
+    """
+    Migration step: creates the index and fills it from the videos table, or
+    repopulates an FTS5 index built before rowids were derived from video_id. A
+    full-table rebuild, so it runs from scripts/migrate.py and API startup, never
+    inside a webhook or ingest write. Does not commit. Returns True if it (re)built.
+    """
+    if ensure_search_index(session):
+        logger.info("Building the full-text index")
+        _populate(session)
+        return True
+    if _dialect(session) != "sqlite" or not search_index_available(session) or not _has_stale_rowids(session):
+        return False
+    logger.info("Re-indexing videos_fts with stable rowids")
+    session.execute(text("DELETE FROM videos_fts"))
+    _populate(session)
+    return True
+
+def search_index_available(session):
+    """True if the full-text index exists, otherwise searches fall back to LIKE."""
+    key = _engine_key(session)
+    if key in _ready_engines:
+        return True
+    dialect = _dialect(session)
+    if dialect == "sqlite":
+        found = session.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'videos_fts'")).first()
+    elif dialect == "postgresql":
+        found = session.execute(text("SELECT to_regclass('videos_search')")).scalar()
+    else:
+        found = None
+    # An index created but not yet committed in this session is not remembered yet
+    if found and key not in session.info.get("created_search_indexes", ()):
+        _ready_engines.add(key)
+    return bool(found)
+
+def index_videos(session, videos):
+    """
+    Adds or refreshes index entries for `videos` (dicts with video_id, title, description).
+    Does not commit; callers run it inside the transaction that writes the videos.
+    """
+    rows = [
+        {"video_id": v["video_id"], "title": v.get("title") or "", "description": v.get("description") or ""}
+        for v in videos if v.get("video_id")
+    ]
+    # Without an index (never migrated) the videos are picked up when it is built
+    if not rows or not search_index_available(session):
+        return
+    dialect = _dialect(session)
+
+    if dialect == "sqlite":
+        for r in rows:
+            r["rowid"] = fts_rowid(r["video_id"])
+        session.execute(text("DELETE FROM videos_fts WHERE rowid = :rowid"), [{"rowid": r["rowid"]} for r in rows])
+        session.execute(text("INSERT INTO videos_fts (rowid, video_id, title, description) VALUES (:rowid, :video_id, :title, :description)"), rows)
+    elif dialect == "postgresql":
+        session.execute(text(
+            "INSERT INTO videos_search (video_id, document) VALUES (:video_id, "
+            "setweight(to_tsvector('english', :title), 'A') || setweight(to_tsvector('english', :description), 'B')) "
+            "ON CONFLICT (video_id) DO UPDATE SET document = EXCLUDED.document"
+        ), rows)
+
+def remove_videos(session, video_ids):
+    """Drops index entries for deleted videos."""
+    if not video_ids or not search_index_available(session):
+        return
+    params = [{"video_id": v_id} for v_id in video_ids]
+    if _dialect(session) == "sqlite":
+        session.execute(text("DELETE FROM videos_fts WHERE rowid = :rowid"), [{"rowid": fts_rowid(v_id)} for v_id in video_ids])
+    else:
+        session.execute(text("DELETE FROM videos_search WHERE video_id = :video_id"), params)
+
+def build_fts5_query(keyword):
+    """
+    Turns free text into an FTS5 query: every word must match, as a prefix, so
+    'inflat' finds 'inflation'. Quoting each token keeps user input from being
+    parsed as FTS5 syntax.
+    """
+    tokens = re.findall(r"\w+", keyword or "")
+    return " ".join(f'"{t}"*' for t in tokens)
+
+def _filters(since, channel, params):
+    clauses = []
+    if since is not None:
+        clauses.append("v.upload_date >= :since")
+        params["since"] = since
+    if channel:
+        clauses.append("v.channel_title LIKE :channel")
+        params["channel"] = f"%{channel}%"
+    return "".join(f" AND {c}" for c in clauses)
+
+def _keyword_query(session, keyword, select_sql, since, channel, ranked, limit=None):
+    params = {}
+    extra = _filters(since, channel, params)
+    dialect = _dialect(session)
+
+    if dialect == "sqlite" and search_index_available(session):
+        match = build_fts5_query(keyword)
+        if not match:
+            return None
+        params["query"] = match
+        sql = f"SELECT {select_sql} FROM videos_fts JOIN videos v ON v.video_id = videos_fts.video_id WHERE videos_fts MATCH :query{extra}"
+        if ranked:
+            sql += f" ORDER BY bm25(videos_fts, 0.0, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT})"
+    elif dialect == "postgresql" and search_index_available(session):
+        params["query"] = keyword
+        sql = f"SELECT {select_sql} FROM videos_search s JOIN videos v ON v.video_id = s.video_id WHERE s.document @@ plainto_tsquery('english', :query){extra}"
+        if ranked:
+            sql += " ORDER BY ts_rank(s.document, plainto_tsquery('english', :query)) DESC"
+    else:
+        # No index yet (e.g. an old database that was never migrated): substring scan.
+        # On SQLite descriptions are stored compressed (CompressedText), so only titles
+        # can match until scripts/migrate.py builds the index.
+        params["keyword"] = f"%{keyword}%"
+        if dialect == "sqlite":
+            logger.warning("videos_fts is missing; matching titles only. Run scripts/migrate.py")
+            sql = f"SELECT {select_sql} FROM videos v WHERE v.title LIKE :keyword{extra}"
+        else:
+            sql = f"SELECT {select_sql} FROM videos v WHERE (v.title LIKE :keyword OR v.description LIKE :keyword){extra}"
+        if ranked:
+            sql += " ORDER BY v.upload_date DESC"
+
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params["limit"] = limit
+    return session.execute(text(sql), params)
+
+def search_videos(session, keyword, since=None, channel=None, limit=5):
+    """Returns (title, channel_title, upload_date, video_id) rows, best matches first."""
+    result = _keyword_query(session, keyword, "v.title, v.channel_title, v.upload_date, v.video_id", since, channel, ranked=True, limit=limit)
+    return result.fetchall() if result is not None else []
+
+def count_videos(session, keyword, since=None, channel=None):
+    """Counts videos whose title or description match `keyword`."""
+    result = _keyword_query(session, keyword, "COUNT(*)", since, channel, ranked=False)
+    return result.scalar() if result is not None else 0
+
+def rebuild_search_index(session, batch_size=1000):
+    """Drops and repopulates the index from the videos table. Returns the number of videos indexed."""
+    # A newly created index is already empty
+    if not ensure_search_index(session):
+        if _dialect(session) == "sqlite":
+            session.execute(text("DELETE FROM videos_fts"))
+        elif _dialect(session) == "postgresql":
+            session.execute(text("DELETE FROM videos_search"))
+    total = _populate(session, batch_size)
+    session.commit()
+    return total
+
+def _populate(session, batch_size=1000):
+    total = 0
+    batch = []
+    query = session.query(Video.video_id, Video.title, Video.description).yield_per(batch_size)
+    for row in query:
+        batch.append({"video_id": row.video_id, "title": row.title, "description": row.description})
+        if len(batch) >= batch_size:
+            index_videos(session, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        index_videos(session, batch)
+        total += len(batch)
+    return total
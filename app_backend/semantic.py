@@ -0,0 +1,537 @@
+"""
+Offline semantic search over video titles and descriptions (latent semantic analysis).
+
+Titles and descriptions are turned into sparse TF-IDF vectors over hashed words. A
+projection fitted with a randomized SVD on a sample of the catalogue
+maps them to SEMANTIC_DIM dense dimensions, where words that occur in similar videos
+("rate hikes", "raises interest rates") end up close together. Everything is NumPy on
+CPU: no network, no model download.
+
+Video vectors are quantized to int8 with one float32 scale per row and stored in a
+memory-mapped matrix in SEMANTIC_INDEX_DIR (by default next to the SQLite file, e.g.
+youtube.db.semantic/, or semantic_index/ in the project root for other databases),
+about 130 bytes per video at the default 128 dimensions. A search
+vectorizes the queries and scores them against the matrix block by block (cosine, top-k).
+
+Index directory:
+    meta.json       dim, row count, rows at the last fit, generation token
+    ids.txt         one video ID per line; line n is row n of the matrix
+    vectors.i8      (capacity, dim) int8 matrix, grown by doubling
+    scales.f32      (capacity,) float32 scale of each row
+    projection.f32  (HASH_BUCKETS, dim) projection fitted by rebuild_semantic_index()
+    idf.f32         IDF weight per hashed term
+
+storage.upsert_videos() schedules changed videos and they are encoded with the current
+projection after the database transaction commits. Writers in different processes are
+serialized with a lock file; readers pick up appended rows on their next search. The
+projection itself only changes on a rebuild: words first seen after the last fit do not
+contribute until then. Rebuild with scripts/rebuild_semantic_index.py after large
+imports; the API also rebuilds at startup when the index was never fitted or has
+doubled in size since.
+"""
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import uuid
+import zlib
+
+from sqlalchemy import event, func
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+# Imported on first use by _load_numpy(): storage.py imports this module on every
+# write path, and NumPy alone adds about 200 ms to a cold start
+np = None
+_numpy_missing = False
+
+try:
+    from .database import DATABASE_URL, ReadSessionLocal, Video
+except ImportError:
+    from database import DATABASE_URL, ReadSessionLocal, Video
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_INDEX_ENABLED = os.getenv("SEMANTIC_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+SEMANTIC_DIM = int(os.getenv("SEMANTIC_DIM", "128"))
+# Documents sampled to fit the projection, and the minimum worth fitting on
+FIT_SAMPLE_DOCS = int(os.getenv("SEMANTIC_FIT_SAMPLE_DOCS", "50000"))
+FIT_MIN_DOCS = 200
+HASH_BUCKETS = 1 << 16
+# Rows scored per block; small enough for the float32 copy of a block to stay in cache
+SEARCH_BLOCK_ROWS = 16384
+TITLE_WEIGHT = 2.0
+
+STOPWORDS = frozenset(
+    "a about an and are as at be been by for from has have he her his i in is it its of on or our "
+    "she that the their they this to video videos was we were what when which who will with you your".split()
+)
+
+# Fallback location when the database is not a SQLite file: fixed, so the API and the
+# scripts share one index whatever directory they are started from
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def default_index_dir(url=None):
+    url = make_url(url or DATABASE_URL)
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+        return os.path.abspath(url.database) + ".semantic"
+    return os.path.join(APP_ROOT, "semantic_index")
+
+SEMANTIC_INDEX_DIR = os.getenv("SEMANTIC_INDEX_DIR") or default_index_dir()
+
+def _load_numpy():
+    """Imports NumPy into the module globals. False if it is not installed (semantic search is disabled)."""
+    global np, _numpy_missing
+    if np is None and not _numpy_missing:
+        try:
+            import numpy
+        except ImportError:
+            _numpy_missing = True
+        else:
+            np = numpy
+    return np is not None
+
+# --- text to sparse vectors -----------------------------------------------------
+
+def _stem(word):
+    # Just enough normalization for plurals: 'rates' -> 'rate', 'hikes' -> 'hike'
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def extract_terms(text):
+    """Words of a piece of text, stopwords dropped and plurals folded."""
+    return [_stem(w) for w in re.findall(r"[a-z0-9]+", (text or "").lower()) if len(w) > 1 and w not in STOPWORDS]
+
+def term_counts(fields):
+    """{hash bucket: weighted count} for [(text, field_weight), ...]."""
+    counts = {}
+    for text, field_weight in fields:
+        for term in extract_terms(text):
+            # crc32 is stable across processes, unlike hash()
+            bucket = zlib.crc32(term.encode("utf-8")) % HASH_BUCKETS
+            counts[bucket] = counts.get(bucket, 0.0) + field_weight
+    return counts
+
+def document_fields(video):
+    return [(video.get("title") or "", TITLE_WEIGHT), (video.get("description") or "", 1.0)]
+
+def sparse_tfidf(docs_counts, idf):
+    """
+    COO arrays (rows, cols, vals) of L2-normalized, sublinear TF-IDF rows, sorted by row.
+    `docs_counts` is a list of term_counts() dicts.
+    """
+    rows, cols, vals = [], [], []
+    for i, counts in enumerate(docs_counts):
+        if not counts:
+            continue
+        buckets = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        weights = np.where(tf > 1, 1 + np.log(np.maximum(tf, 1)), tf) * idf[buckets]
+        norm = np.linalg.norm(weights)
+        if norm:
+            rows.append(np.full(len(buckets), i, dtype=np.int64))
+            cols.append(buckets)
+            vals.append(weights / norm)
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(vals).astype(np.float32)
+
+def sparse_matmul(rows, cols, vals, n_rows, matrix, chunk=1 << 18):
+    """(sparse n_rows x HASH_BUCKETS) @ matrix, for COO input sorted by `rows`."""
+    out = np.zeros((n_rows, matrix.shape[1]), dtype=np.float32)
+    for start in range(0, len(rows), chunk):
+        r = rows[start:start + chunk]
+        contrib = vals[start:start + chunk, None] * matrix[cols[start:start + chunk]]
+        # Rows are sorted, so each row's nonzeros are contiguous: sum them with reduceat
+        starts = np.flatnonzero(np.r_[True, r[1:] != r[:-1]])
+        out[r[starts]] += np.add.reduceat(contrib, starts, axis=0)
+    return out
+
+def fit_projection(docs_counts, dim, n_iter=3, seed=0):
+    """
+    Fits IDF weights and a (HASH_BUCKETS, dim) LSA projection on a sample of documents
+    with a randomized SVD (Halko et al.) that only needs sparse products.
+    """
+    n = len(docs_counts)
+    df = np.zeros(HASH_BUCKETS, dtype=np.float64)
+    for counts in docs_counts:
+        df[np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))] += 1
+    idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+
+    rows, cols, vals = sparse_tfidf(docs_counts, idf)
+    # The same matrix sorted by column, for products with the transpose
+    order = np.argsort(cols, kind="stable")
+    t_rows, t_cols, t_vals = cols[order], rows[order], vals[order]
+
+    rank = min(dim + 10, n)
+    rng = np.random.default_rng(seed)
+    q, _ = np.linalg.qr(sparse_matmul(rows, cols, vals, n, rng.standard_normal((HASH_BUCKETS, rank)).astype(np.float32)))
+    for _ in range(n_iter):
+        z, _ = np.linalg.qr(sparse_matmul(t_rows, t_cols, t_vals, HASH_BUCKETS, q))
+        q, _ = np.linalg.qr(sparse_matmul(rows, cols, vals, n, z))
+    b = sparse_matmul(t_rows, t_cols, t_vals, HASH_BUCKETS, q).T  # (rank, HASH_BUCKETS)
+    _, _, vt = np.linalg.svd(b, full_matrices=False)
+
+    projection = np.zeros((HASH_BUCKETS, dim), dtype=np.float32)
+    projection[:, :min(dim, vt.shape[0])] = vt[:dim].T
+    return idf, projection
+
+# --- on-disk index --------------------------------------------------------------
+
+class _FileLock:
+    """Exclusive lock on a file, so one process at a time writes the index."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = None
+
+    def __enter__(self):
+        self._fh = open(self.path, "a+b")
+        try:
+            import fcntl
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+        except ImportError:
+            import msvcrt
+            self._fh.seek(0)
+            msvcrt.locking(self._fh.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            import fcntl
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        except ImportError:
+            import msvcrt
+            self._fh.seek(0)
+            msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+        self._fh.close()
+
+class SemanticIndex:
+    """Quantized video vectors in a memory-mapped matrix, with the fitted projection."""
+
+    def __init__(self, path, dim=SEMANTIC_DIM):
+        if not _load_numpy():
+            raise RuntimeError("numpy is required for semantic search")
+        self.path = path
+        self.dim = dim
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._file_lock = _FileLock(os.path.join(path, "write.lock"))
+        self._reset()
+        with self._lock:
+            self._sync()
+
+    def _reset(self):
+        self._ids = []
+        self._rows = {}
+        self._ids_offset = 0
+        self._count = 0
+        self._generation = None
+        self._meta_mtime = None
+        self._vectors = np.zeros((0, self.dim), dtype=np.int8)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self.fitted = False
+        self.fitted_count = 0
+        self._idf = np.ones(HASH_BUCKETS, dtype=np.float32)
+        self._projection = None
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def __len__(self):
+        return self._count
+
+    def _open_matrix(self, capacity):
+        vectors_path, scales_path = self._file("vectors.i8"), self._file("scales.f32")
+        for path, size in ((vectors_path, capacity * self.dim), (scales_path, capacity * 4)):
+            if not os.path.exists(path) or os.path.getsize(path) < size:
+                with open(path, "ab") as fh:
+                    fh.truncate(size)
+        capacity = min(os.path.getsize(vectors_path) // self.dim, os.path.getsize(scales_path) // 4)
+        if capacity:
+            self._vectors = np.memmap(vectors_path, dtype=np.int8, mode="r+", shape=(capacity, self.dim))
+            self._scales = np.memmap(scales_path, dtype=np.float32, mode="r+", shape=(capacity,))
+
+    def _sync(self):
+        """Picks up rows appended (or a rebuild swapped in) by other processes."""
+        meta_path = self._file("meta.json")
+        if not os.path.exists(meta_path):
+            return
+        mtime = os.path.getmtime(meta_path)
+        if mtime == self._meta_mtime:
+            return
+        with open(meta_path) as fh:
+            meta = json.load(fh)
+        if meta["dim"] != self.dim:
+            raise RuntimeError(f"Index at {self.path} has dim {meta['dim']}, expected {self.dim}; rebuild it")
+        if meta["generation"] != self._generation:
+            self._reset()
+            self._generation = meta["generation"]
+            self.fitted_count = meta["fitted_count"]
+            self.fitted = self.fitted_count > 0
+            if self.fitted:
+                self._idf = np.fromfile(self._file("idf.f32"), dtype=np.float32)
+                self._projection = np.fromfile(self._file("projection.f32"), dtype=np.float32).reshape(HASH_BUCKETS, self.dim)
+
+        with open(self._file("ids.txt"), "ab+") as fh:
+            fh.seek(self._ids_offset)
+            while len(self._ids) < meta["count"]:
+                line = fh.readline()
+                if not line.endswith(b"\n"):
+                    break
+                video_id = line.decode("utf-8").rstrip("\n")
+                self._rows[video_id] = len(self._ids)
+                self._ids.append(video_id)
+                self._ids_offset += len(line)
+        self._count = len(self._ids)
+        self._meta_mtime = mtime
+        if len(self._vectors) < self._count:
+            self._open_matrix(self._count)
+
+    def _write_meta(self):
+        if self._generation is None:
+            self._generation = uuid.uuid4().hex
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as fh:
+            json.dump({"dim": self.dim, "count": self._count, "fitted_count": self.fitted_count, "generation": self._generation}, fh)
+        os.replace(tmp, self._file("meta.json"))
+        self._meta_mtime = os.path.getmtime(self._file("meta.json"))
+
+    def set_projection(self, idf, projection, fitted_count):
+        idf.astype(np.float32).tofile(self._file("idf.f32"))
+        projection.astype(np.float32).tofile(self._file("projection.f32"))
+        self._idf, self._projection = idf, projection
+        self.fitted, self.fitted_count = True, fitted_count
+
+    def needs_refit(self):
+        with self._lock:
+            self._sync()
+            return not self.fitted or self._count >= 2 * self.fitted_count
+
+    def encode(self, fields_list):
+        """L2-normalized float32 vectors for a list of [(text, weight), ...] documents."""
+        docs_counts = [term_counts(fields) for fields in fields_list]
+        rows, cols, vals = sparse_tfidf(docs_counts, self._idf)
+        if self._projection is not None:
+            out = sparse_matmul(rows, cols, vals, len(docs_counts), self._projection)
+        else:
+            # Not fitted yet: plain signed feature hashing, until the first rebuild
+            out = np.zeros((len(docs_counts), self.dim), dtype=np.float32)
+            signs = np.where((cols * 2654435761 >> 16) & 1, 1.0, -1.0).astype(np.float32)
+            np.add.at(out, (rows, cols % self.dim), signs * vals)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.where(norms == 0, 1, norms)
+
+    def _append(self, videos):
+        # Caller holds both locks
+        vectors = self.encode([document_fields(v) for v in videos])
+        # Symmetric int8 quantization with one scale per row
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        quantized = np.rint(vectors / scales[:, None]).astype(np.int8)
+        new = sum(1 for v in {v["video_id"] for v in videos} if v not in self._rows)
+        if self._count + new > len(self._vectors):
+            self._open_matrix(max(1024, 2 * (self._count + new)))
+        with open(self._file("ids.txt"), "ab") as fh:
+            for v, vector, scale in zip(videos, quantized, scales):
+                row = self._rows.get(v["video_id"])
+                if row is None:
+                    row = self._count
+                    line = (v["video_id"] + "\n").encode("utf-8")
+                    fh.write(line)
+                    self._ids_offset += len(line)
+                    self._rows[v["video_id"]] = row
+                    self._ids.append(v["video_id"])
+                    self._count += 1
+                self._vectors[row] = vector
+                self._scales[row] = scale
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+            self._scales.flush()
+
+    def upsert(self, videos):
+        """Adds or replaces vectors for `videos` (dicts with video_id, title, description)."""
+        videos = [v for v in videos if v.get("video_id")]
+        if not videos:
+            return
+        with self._lock, self._file_lock:
+            self._sync()
+            self._append(videos)
+            self._write_meta()
+
+    def search(self, queries, k=10):
+        """
+        Top-k (video_id, score) lists for each query string, by cosine similarity.
+        All queries are scored in a single pass over the matrix.
+        """
+        if isinstance(queries, str):
+            queries = [queries]
+        with self._lock:
+            self._sync()
+            count = self._count
+            if not count or not queries:
+                return [[] for _ in queries]
+            q = self.encode([[(text, 1.0)] for text in queries])
+            vectors, scales, ids = self._vectors, self._scales, self._ids
+
+        k = min(k, count)
+        best = [(np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)) for _ in queries]
+        # Score of each query's current k-th best hit; most rows of a block fall below it
+        threshold = np.full(len(queries), -np.inf, dtype=np.float32)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            end = min(count, start + SEARCH_BLOCK_ROWS)
+            block = vectors[start:end].astype(np.float32)
+            scores = (q @ block.T) * scales[start:end]  # (queries, rows)
+            for i, (row_scores, bound) in enumerate(zip(scores, threshold)):
+                candidates = np.flatnonzero(row_scores > bound)
+                if not len(candidates):
+                    continue
+                top_scores = np.concatenate([best[i][0], row_scores[candidates]])
+                top_rows = np.concatenate([best[i][1], candidates + start])
+                if len(top_scores) > k:
+                    keep = np.argpartition(-top_scores, k - 1)[:k]
+                    top_scores, top_rows = top_scores[keep], top_rows[keep]
+                best[i] = (top_scores, top_rows)
+                if len(top_scores) == k:
+                    threshold[i] = top_scores.min()
+
+        results = []
+        for scores, rows in best:
+            order = np.argsort(-scores)
+            results.append([(ids[rows[i]], float(scores[i])) for i in order if scores[i] > 0])
+        return results
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_semantic_index(path=None):
+    """Shared SemanticIndex for `path` (SEMANTIC_INDEX_DIR by default), or None if disabled."""
+    if not SEMANTIC_INDEX_ENABLED or not _load_numpy():
+        return None
+    path = path or SEMANTIC_INDEX_DIR
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = SemanticIndex(path)
+        return _indexes[path]
+
+def schedule_index_update(session, videos):
+    """Queues `videos` for the semantic index; they are encoded once `session` commits."""
+    if not SEMANTIC_INDEX_ENABLED or not _load_numpy():
+        return
+    session.info.setdefault("semantic_pending", []).extend(
+        {"video_id": v["video_id"], "title": v.get("title"), "description": v.get("description")} for v in videos
+    )
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    pending = session.info.pop("semantic_pending", None)
+    if pending:
+        try:
+            get_semantic_index().upsert(pending)
+        except Exception as e:
+            # The database is the source of truth; a rebuild repairs a missed update
+            logger.error(f"Semantic index update failed: {e}")
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop("semantic_pending", None)
+
+def _iter_videos(session, batch_size):
+    query = session.query(Video.video_id, Video.title, Video.description).order_by(Video.video_id)
+    for row in query.yield_per(batch_size):
+        yield {"video_id": row.video_id, "title": row.title, "description": row.description}
+
+def rebuild_semantic_index(session, path=None, batch_size=2000):
+    """
+    Fits a new projection on a sample of the videos table, encodes every video into a
+    fresh directory and swaps it in. Returns the number of videos indexed. Videos
+    written by other processes while it runs may be missing until the next rebuild.
+    """
+    path = path or SEMANTIC_INDEX_DIR
+    total = session.query(func.count(Video.video_id)).scalar() or 0
+    step = max(1, math.ceil(total / FIT_SAMPLE_DOCS))
+    sample = [term_counts(document_fields(v)) for i, v in enumerate(_iter_videos(session, batch_size)) if i % step == 0]
+
+    tmp_path = path + ".rebuild"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    index = SemanticIndex(tmp_path)
+    if len(sample) >= FIT_MIN_DOCS:
+        index.set_projection(*fit_projection(sample, index.dim), fitted_count=total)
+    del sample
+
+    batch = []
+    with index._lock, index._file_lock:
+        for video in _iter_videos(session, batch_size):
+            batch.append(video)
+            if len(batch) >= batch_size:
+                index._append(batch)
+                batch = []
+        if batch:
+            index._append(batch)
+        index._write_meta()
+
+    with _indexes_lock:
+        _indexes.pop(path, None)
+        old_path = path + ".old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+    return total
+
+def ensure_semantic_index():
+    """
+    Rebuilds the index if it was never fitted or has doubled since the last fit, once
+    enough videos exist. An index that fails to load (e.g. a truncated matrix) is
+    rebuilt from scratch. Meant to run in a background thread at startup.
+    """
+    broken = False
+    try:
+        index = get_semantic_index()
+        if index is None or not index.needs_refit():
+            return
+    except Exception:
+        logger.exception(f"Semantic index in {SEMANTIC_INDEX_DIR} could not be loaded, rebuilding it")
+        with _indexes_lock:
+            _indexes.pop(SEMANTIC_INDEX_DIR, None)
+        broken = True
+    session = ReadSessionLocal()
+    try:
+        if broken or (session.query(func.count(Video.video_id)).scalar() or 0) >= FIT_MIN_DOCS:
+            logger.info("Building semantic index...")
+            logger.info(f"Semantic index built for {rebuild_semantic_index(session)} videos")
+    except Exception as e:
+        logger.error(f"Semantic index build failed: {e}")
+    finally:
+        session.close()
+
+def semantic_search(session, queries, k=10):
+    """
+    Batched search returning, per query, dicts with video_id, score, title,
+    channel_title and upload_date (looked up in one query).
+    """
+    index = get_semantic_index()
+    if index is None:
+        raise RuntimeError("Semantic search is disabled (SEMANTIC_INDEX_ENABLED=false or numpy missing)")
+    single = isinstance(queries, str)
+    hits = index.search([queries] if single else queries, k=k)
+    ids = {video_id for result in hits for video_id, _ in result}
+    rows = {}
+    if ids:
+        query = session.query(Video.video_id, Video.title, Video.channel_title, Video.upload_date).filter(Video.video_id.in_(ids))
+        rows = {row.video_id: row for row in query}
+    results = [
+        [
+            {"video_id": video_id, "score": round(score, 4), "title": rows[video_id].title,
+             "channel_title": rows[video_id].channel_title, "upload_date": rows[video_id].upload_date}
+            for video_id, score in result if video_id in rows
+        ]
+        for result in hits
+    ]
+    return results[0] if single else results
@@ -0,0 +1,217 @@
+"""
+Append-only history of view/like counts, for growth rates and "trending" questions.
+
+upsert_videos() appends a sample to video_stats_history whenever a video's stored
+view count changes (first insert, stats refresh, re-ingest). Samples are small
+(integer timestamps, no rowid) and thinned out as they age by compact_stats_history():
+raw samples are kept for STATS_HISTORY_RAW_HOURS, then only the last sample of each hour
+until STATS_HISTORY_HOURLY_DAYS, then the last sample of each day. Counts only ever grow,
+so the last sample of a bucket loses nothing for growth over bucket-aligned windows.
+Compaction is incremental (a watermark per level in stats_history_watermarks) and is
+run by the StatsRefresher threads.
+
+video_growth() ranks videos by views gained over a window; trending_videos() is its
+"last N hours" form.
+"""
+import calendar
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+try:
+    from .database import VideoStatsSample, StatsHistoryWatermark, DataVersion
+except ImportError:
+    from database import VideoStatsSample, StatsHistoryWatermark, DataVersion
+
+logger = logging.getLogger(__name__)
+
+STATS_HISTORY_RAW_HOURS = int(os.getenv("STATS_HISTORY_RAW_HOURS", "48"))
+STATS_HISTORY_HOURLY_DAYS = int(os.getenv("STATS_HISTORY_HOURLY_DAYS", "30"))
+# Seconds of history thinned per transaction
+COMPACT_CHUNK_SECONDS = 6 * 3600
+
+HOUR = 3600
+DAY = 86400
+# stats_history_watermarks rows holding how far each level has been compacted
+HOURLY_WATERMARK = "stats_history_hourly"
+DAILY_WATERMARK = "stats_history_daily"
+
+def to_timestamp(dt):
+    """Naive UTC datetime -> unix seconds."""
+    return calendar.timegm(dt.timetuple())
+
+def _dialect_insert(session):
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(VideoStatsSample)
+    if dialect == "postgresql":
+        return postgresql.insert(VideoStatsSample)
+    return None
+
+def record_stats_samples(session, rows, old=None, ts=None):
+    """
+    Appends a sample for each row (dicts with video_id, view_count, like_count) whose
+    view_count is known and differs from `old[video_id]["view_count"]`. Does not commit.
+    """
+    old = old or {}
+    ts = ts or int(time.time())
+    samples = []
+    for row in rows:
+        views = row.get("view_count")
+        if views is None:
+            continue
+        previous = old.get(row["video_id"])
+        if previous is not None and previous["view_count"] == views:
+            continue
+        samples.append({"video_id": row["video_id"], "ts": ts, "views": views, "likes": row.get("like_count")})
+    if not samples:
+        return 0
+    stmt = _dialect_insert(session)
+    if stmt is not None:
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=[VideoStatsSample.__table__.c.video_id, VideoStatsSample.__table__.c.ts],
+            set_={"views": stmt.excluded.views, "likes": stmt.excluded.likes},
+        ), samples)
+    else:
+        for sample in samples:
+            session.merge(VideoStatsSample(**sample))
+    return len(samples)
+
+def _get_watermark(session, name):
+    row = session.get(StatsHistoryWatermark, name)
+    if row is not None:
+        return row.bucket
+    # Earlier versions kept the watermarks in data_versions; moved on the next _set_watermark
+    legacy = session.get(DataVersion, name)
+    return legacy.version if legacy is not None else 0
+
+def _set_watermark(session, name, value):
+    row = session.get(StatsHistoryWatermark, name)
+    if row is None:
+        session.add(StatsHistoryWatermark(level=name, bucket=value))
+        legacy = session.get(DataVersion, name)
+        if legacy is not None:
+            session.delete(legacy)
+    else:
+        row.bucket = value
+
+def _thin(session, start, end, bucket):
+    """Deletes every sample in [start, end) that is not the last of its `bucket`-second bucket."""
+    return session.execute(text(
+        "DELETE FROM video_stats_history WHERE ts >= :start AND ts < :end AND EXISTS ("
+        "  SELECT 1 FROM video_stats_history later"
+        "  WHERE later.video_id = video_stats_history.video_id"
+        "    AND later.ts > video_stats_history.ts"
+        "    AND later.ts < (video_stats_history.ts / :bucket + 1) * :bucket)"
+    ), {"start": start, "end": end, "bucket": bucket}).rowcount
+
+def _compact_level(session, watermark_name, bucket, cutoff):
+    # Bucket-aligned, so a bucket is never split across runs
+    end = cutoff // bucket * bucket
+    done_until = _get_watermark(session, watermark_name) * bucket
+    if done_until == 0:
+        first = session.execute(select(VideoStatsSample.ts).order_by(VideoStatsSample.ts).limit(1)).scalar()
+        done_until = (first // bucket * bucket) if first is not None else end
+    removed = 0
+    while done_until < end:
+        chunk_end = min(end, done_until + max(bucket, COMPACT_CHUNK_SECONDS // bucket * bucket))
+        removed += _thin(session, done_until, chunk_end, bucket)
+        _set_watermark(session, watermark_name, chunk_end // bucket)
+        session.commit()
+        done_until = chunk_end
+    return removed
+
+def compact_stats_history(session, now=None):
+    """Downsamples samples past their retention (raw -> hourly -> daily). Commits in chunks; returns rows removed."""
+    now = int(now if now is not None else time.time())
+    removed = _compact_level(session, HOURLY_WATERMARK, HOUR, now - STATS_HISTORY_RAW_HOURS * HOUR)
+    removed += _compact_level(session, DAILY_WATERMARK, DAY, now - STATS_HISTORY_HOURLY_DAYS * DAY)
+    session.commit()
+    return removed
+
+def video_history(session, video_id, since=None):
+    """[(datetime, views, likes)] of one video, oldest first."""
+    query = select(VideoStatsSample.ts, VideoStatsSample.views, VideoStatsSample.likes) \
+        .where(VideoStatsSample.video_id == video_id).order_by(VideoStatsSample.ts)
+    if since is not None:
+        query = query.where(VideoStatsSample.ts >= to_timestamp(since))
+    return [(datetime.utcfromtimestamp(ts), views, likes) for ts, views, likes in session.execute(query)]
+
+def video_growth(session, start, end=None, channel=None, limit=None):
+    """
+    Views gained over (start, end] (naive UTC datetimes) by videos with a sample in it,
+    most gained first. The baseline is the last sample at or before `start`; for videos
+    uploaded inside the window it is zero at upload time, otherwise the first sample in
+    the window. Returns dicts with video_id, title, channel_title, upload_date, views,
+    views_gained, views_per_hour and growth_pct.
+    """
+    end = end or datetime.utcnow()
+    params = {"start": to_timestamp(start), "end": to_timestamp(end), "start_date": start}
+    channel_filter = ""
+    if channel:
+        channel_filter = "WHERE v.channel_title LIKE :channel"
+        params["channel"] = f"%{channel}%"
+    # Ranked in SQL so only the top rows reach Python
+    query = f"""
+        WITH w AS (
+            SELECT video_id, MIN(ts) AS first_ts, MAX(ts) AS last_ts FROM video_stats_history
+            WHERE ts > :start AND ts <= :end GROUP BY video_id
+        ), g AS (
+            SELECT w.video_id, w.first_ts, w.last_ts, v.title, v.channel_title, v.upload_date,
+                (SELECT s.views FROM video_stats_history s WHERE s.video_id = w.video_id AND s.ts = w.last_ts) AS views,
+                CASE
+                    WHEN EXISTS (SELECT 1 FROM video_stats_history s WHERE s.video_id = w.video_id AND s.ts <= :start)
+                        THEN (SELECT s.views FROM video_stats_history s WHERE s.video_id = w.video_id AND s.ts <= :start
+                              ORDER BY s.ts DESC LIMIT 1)
+                    WHEN v.upload_date > :start_date THEN 0
+                    ELSE (SELECT s.views FROM video_stats_history s WHERE s.video_id = w.video_id AND s.ts = w.first_ts)
+                END AS base_views
+            FROM w JOIN videos v ON v.video_id = w.video_id
+            {channel_filter}
+        )
+        SELECT video_id, first_ts, last_ts, title, channel_title, upload_date, views, base_views,
+               views - base_views AS views_gained
+        FROM g ORDER BY views_gained DESC, video_id
+    """
+    if limit is not None:
+        query += " LIMIT :limit"
+        params["limit"] = limit
+    rows = session.execute(text(query), params).all()
+
+    # When each baseline was taken, for the per-hour rate
+    base_ts = {}
+    for row in rows:
+        base_ts[row.video_id] = session.execute(
+            select(VideoStatsSample.ts).where(VideoStatsSample.video_id == row.video_id, VideoStatsSample.ts <= params["start"])
+            .order_by(VideoStatsSample.ts.desc()).limit(1)
+        ).scalar()
+
+    results = []
+    for row in rows:
+        upload_date = row.upload_date
+        if isinstance(upload_date, str):
+            upload_date = datetime.fromisoformat(upload_date)
+        since = base_ts[row.video_id]
+        if since is None:
+            since = to_timestamp(upload_date) if upload_date is not None and upload_date > start else row.first_ts
+        hours = (row.last_ts - since) / HOUR
+        results.append({
+            "video_id": row.video_id,
+            "title": row.title,
+            "channel_title": row.channel_title,
+            "upload_date": upload_date.isoformat() if upload_date else None,
+            "views": row.views,
+            "views_gained": row.views_gained,
+            "views_per_hour": round(row.views_gained / hours, 1) if hours > 0 else None,
+            "growth_pct": round(100.0 * row.views_gained / row.base_views, 1) if row.base_views else None,
+        })
+    return results
+
+def trending_videos(session, hours=24, limit=10, channel=None, now=None):
+    """Videos that gained the most views in the last `hours` hours."""
+    now = now or datetime.utcnow()
+    return video_growth(session, now - timedelta(hours=hours), now, channel=channel, limit=limit)
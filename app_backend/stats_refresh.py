@@ -0,0 +1,383 @@
+"""
+Keeps view_count and like_count fresh without re-extracting every video all the time.
+
+Every video has a row in stats_refresh_schedule saying when it is due. The interval
+depends on the video's age (STATS_REFRESH_TIERS: hourly during its first day, daily
+during its first week, weekly after that), so effort goes where the numbers still move.
+upsert_videos() schedules new videos; backfill_stats_schedule() covers videos stored
+before this existed (spreading their first refresh over one interval). It scans the
+whole videos table, so it only runs when asked for: STATS_REFRESH_BACKFILL=true or
+scripts/refresh_stats.py --backfill.
+
+StatsRefresher threads claim due rows in batches and refresh them with
+refresh_video_details() (a fresh extraction that also updates the details cache),
+all drawing from one token bucket of STATS_REFRESH_RATE extractions per minute. The
+schedule lives in the database, so a restart resumes where it stopped. Pass any
+`extractor(video_id) -> dict` to test without yt-dlp.
+"""
+import collections
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects import postgresql, sqlite
+
+try:
+    from .database import SessionLocal, ReadSessionLocal, Video, StatsRefresh
+    from .metrics import counter
+    from .stats_history import compact_stats_history
+except ImportError:
+    from database import SessionLocal, ReadSessionLocal, Video, StatsRefresh
+    from metrics import counter
+    from stats_history import compact_stats_history
+
+logger = logging.getLogger(__name__)
+
+STATS_REFRESH_ENABLED = os.getenv("STATS_REFRESH_ENABLED", "true").lower() in ("1", "true", "yes")
+# Schedule videos that have no refresh row yet when the refresher starts
+STATS_REFRESH_BACKFILL = os.getenv("STATS_REFRESH_BACKFILL", "false").lower() in ("1", "true", "yes")
+# Global budget: extractions per minute across all refresher threads, and the allowed burst
+STATS_REFRESH_RATE = float(os.getenv("STATS_REFRESH_RATE", "30"))
+STATS_REFRESH_BURST = int(os.getenv("STATS_REFRESH_BURST", "10"))
+STATS_REFRESH_WORKERS = int(os.getenv("STATS_REFRESH_WORKERS", "2"))
+STATS_REFRESH_BATCH_SIZE = int(os.getenv("STATS_REFRESH_BATCH_SIZE", "50"))
+STATS_REFRESH_POLL_SECONDS = float(os.getenv("STATS_REFRESH_POLL_SECONDS", "30"))
+# "max age=interval" pairs in seconds, youngest first; the last interval applies to older videos
+STATS_REFRESH_TIERS = os.getenv("STATS_REFRESH_TIERS", "86400=3600,604800=86400,0=604800")
+# Fields taken from a refresh; upload_date and the channel are kept as first stored
+REFRESH_FIELDS = ("view_count", "like_count", "title", "description")
+# A claimed batch not finished within this long is picked up again (e.g. after a crash)
+CLAIM_SECONDS = 1800
+# The stats history is downsampled this often, whether or not refreshes are due
+COMPACTION_SECONDS = 3600
+MAX_BACKOFF = timedelta(days=30)
+
+stats_refreshed = counter(
+    "stats_refreshed", "Videos whose view/like counts were refreshed, by outcome (updated, unchanged, failed).", ("outcome",))
+
+def parse_tiers(spec):
+    """'86400=3600,0=604800' -> ([(timedelta(days=1), timedelta(hours=1))], timedelta(days=7))."""
+    tiers, default = [], None
+    for part in spec.split(","):
+        max_age, interval = (int(x) for x in part.split("="))
+        if max_age:
+            tiers.append((timedelta(seconds=max_age), timedelta(seconds=interval)))
+        else:
+            default = timedelta(seconds=interval)
+    tiers.sort()
+    return tiers, default or (tiers[-1][1] if tiers else timedelta(days=7))
+
+REFRESH_TIERS, REFRESH_INTERVAL_OLDER = parse_tiers(STATS_REFRESH_TIERS)
+
+def refresh_interval(upload_date, now=None):
+    """How often a video of this age is refreshed."""
+    if upload_date is None:
+        return REFRESH_INTERVAL_OLDER
+    age = (now or datetime.utcnow()) - upload_date
+    for max_age, interval in REFRESH_TIERS:
+        if age < max_age:
+            return interval
+    return REFRESH_INTERVAL_OLDER
+
+def next_refresh_at(upload_date, now=None, failures=0):
+    now = now or datetime.utcnow()
+    interval = refresh_interval(upload_date, now)
+    if failures:
+        interval = min(MAX_BACKOFF, interval * (2 ** min(failures, 10)))
+    return now + interval
+
+def _dialect_insert(session):
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(StatsRefresh)
+    if dialect == "postgresql":
+        return postgresql.insert(StatsRefresh)
+    return None
+
+def _insert_schedule(session, rows):
+    if not rows:
+        return
+    stmt = _dialect_insert(session)
+    if stmt is not None:
+        session.execute(stmt.on_conflict_do_nothing(index_elements=[StatsRefresh.__table__.c.video_id]), rows)
+        return
+    existing = set(session.execute(
+        select(StatsRefresh.video_id).where(StatsRefresh.video_id.in_([r["video_id"] for r in rows]))).scalars())
+    session.add_all(StatsRefresh(**r) for r in rows if r["video_id"] not in existing)
+
+def schedule_stats_refresh(session, videos):
+    """Schedules the first refresh of newly stored videos (dicts with video_id, upload_date). Does not commit."""
+    now = datetime.utcnow()
+    _insert_schedule(session, [
+        {"video_id": v["video_id"], "next_refresh_at": next_refresh_at(v.get("upload_date"), now), "failures": 0}
+        for v in videos
+    ])
+
+def backfill_stats_schedule(session, batch_size=5000):
+    """
+    Schedules videos that have no row yet, e.g. stored before the refresher existed or
+    bulk-loaded by scripts/generate_catalogue.py. Their first refresh is spread uniformly
+    over one interval so a large backlog doesn't come due at once. Commits per batch.
+    """
+    added = 0
+    while True:
+        missing = session.execute(
+            select(Video.video_id, Video.upload_date)
+            .where(~select(StatsRefresh.video_id).where(StatsRefresh.video_id == Video.video_id).exists())
+            .limit(batch_size)
+        ).all()
+        if not missing:
+            return added
+        now = datetime.utcnow()
+        _insert_schedule(session, [
+            {"video_id": video_id, "failures": 0,
+             "next_refresh_at": now + refresh_interval(upload_date, now) * random.random()}
+            for video_id, upload_date in missing
+        ])
+        session.commit()
+        added += len(missing)
+
+def due_count(session, now=None):
+    return session.execute(
+        select(func.count()).select_from(StatsRefresh).where(StatsRefresh.next_refresh_at <= (now or datetime.utcnow()))
+    ).scalar()
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate_per_minute` tokens per minute, holding at most `capacity`."""
+
+    def __init__(self, rate_per_minute, capacity):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop=None):
+        """Takes one token, waiting as needed. Returns False if `stop` (an Event) was set meanwhile."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if stop is None:
+                time.sleep(wait)
+            elif stop.wait(wait):
+                return False
+
+class StatsRefresher:
+    """
+    Refreshes due videos with `workers` threads under one shared rate budget. run_once()
+    does a single pass in the calling thread (scripts, tests).
+    """
+
+    def __init__(self, extractor=None, workers=STATS_REFRESH_WORKERS, rate_per_minute=STATS_REFRESH_RATE,
+                 burst=STATS_REFRESH_BURST, batch_size=STATS_REFRESH_BATCH_SIZE, poll_interval=STATS_REFRESH_POLL_SECONDS,
+                 backfill=STATS_REFRESH_BACKFILL):
+        if extractor is None:
+            try:
+                from .youtube import refresh_video_details as extractor
+            except ImportError:
+                from youtube import refresh_video_details as extractor
+        self.extractor = extractor
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.bucket = TokenBucket(rate_per_minute, burst)
+
+        self._threads = []
+        self._stop = threading.Event()
+        self._backfilled = not backfill
+        self._last_compaction = 0.0
+        self._lock = threading.Lock()
+        self._counters = collections.Counter()
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"stats-refresh-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.workers} stats refresh workers ({self.bucket.rate * 60:g}/min)")
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _backfill(self):
+        with self._lock:
+            if self._backfilled:
+                return
+            self._backfilled = True
+        session = SessionLocal()
+        try:
+            added = backfill_stats_schedule(session)
+            if added:
+                logger.info(f"Scheduled stats refresh for {added} existing videos")
+        finally:
+            session.close()
+
+    def _claim(self, limit):
+        """Marks up to `limit` due videos as taken for CLAIM_SECONDS. Returns their IDs."""
+        session = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            ids = list(session.execute(
+                select(StatsRefresh.video_id).where(StatsRefresh.next_refresh_at <= now)
+                .order_by(StatsRefresh.next_refresh_at).limit(limit)
+            ).scalars())
+            if not ids:
+                session.commit()
+                return []
+            # The claim time doubles as a marker of which rows this call took
+            claimed_until = now + timedelta(seconds=CLAIM_SECONDS, microseconds=random.randrange(1, 1_000_000))
+            session.execute(
+                update(StatsRefresh).where(StatsRefresh.video_id.in_(ids), StatsRefresh.next_refresh_at <= now)
+                .values(next_refresh_at=claimed_until)
+            )
+            session.commit()
+            return list(session.execute(
+                select(StatsRefresh.video_id).where(StatsRefresh.video_id.in_(ids), StatsRefresh.next_refresh_at == claimed_until)
+            ).scalars())
+        finally:
+            session.close()
+
+    def _refresh(self, video_id):
+        try:
+            from .storage import upsert_videos
+        except ImportError:
+            from storage import upsert_videos
+
+        error = None
+        try:
+            details = self.extractor(video_id)
+            if not details:
+                error = "no details returned"
+        except Exception as e:
+            details, error = None, str(e) or type(e).__name__
+
+        session = SessionLocal()
+        try:
+            schedule = session.get(StatsRefresh, video_id)
+            now = datetime.utcnow()
+            video = session.execute(select(Video.video_id, Video.upload_date).where(Video.video_id == video_id)).first()
+            upload_date = video.upload_date if video is not None else None
+            if video is None:
+                # Deleted since it was scheduled
+                outcome = "failed"
+                if schedule is not None:
+                    session.delete(schedule)
+                    schedule = None
+            elif error is None:
+                row = {f: details.get(f) for f in REFRESH_FIELDS}
+                stats = upsert_videos(session, [{**row, "video_id": video_id}])[0]
+                outcome = "updated" if stats["updated"] or stats["inserted"] else "unchanged"
+                values = {"next_refresh_at": next_refresh_at(upload_date, now), "last_refreshed_at": now,
+                          "failures": 0, "last_error": None}
+            else:
+                outcome = "failed"
+                failures = (schedule.failures if schedule is not None else 0) + 1
+                values = {"next_refresh_at": next_refresh_at(upload_date, now, failures), "failures": failures,
+                          "last_error": error[:1000]}
+                logger.warning(f"Stats refresh of {video_id} failed ({failures}x): {error}")
+            if schedule is not None and video is not None:
+                for key, value in values.items():
+                    setattr(schedule, key, value)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+        stats_refreshed.inc(outcome=outcome)
+        with self._lock:
+            self._counters[outcome] += 1
+        return outcome
+
+    def run_once(self, limit=None):
+        """Refreshes due videos (at most `limit`) until none are due. Returns outcome counts."""
+        self._backfill()
+        counts = collections.Counter()
+        while limit is None or sum(counts.values()) < limit:
+            batch = self.batch_size if limit is None else min(self.batch_size, limit - sum(counts.values()))
+            ids = self._claim(batch)
+            if not ids:
+                break
+            for video_id in ids:
+                if not self.bucket.acquire(self._stop):
+                    return dict(counts)
+                counts[self._refresh(video_id)] += 1
+        return dict(counts)
+
+    def _run(self):
+        try:
+            self._backfill()
+        except Exception as e:
+            logger.error(f"Stats schedule backfill failed: {e}")
+        while not self._stop.is_set():
+            try:
+                self._compact_history()
+            except Exception as e:
+                logger.error(f"Stats history compaction failed: {e}")
+            try:
+                ids = self._claim(self.batch_size)
+                if not ids:
+                    self._stop.wait(self.poll_interval)
+                    continue
+                for i, video_id in enumerate(ids):
+                    if not self.bucket.acquire(self._stop):
+                        # Stopping: leave the rest of the batch due again right away
+                        self._release(ids[i:])
+                        return
+                    self._refresh(video_id)
+            except Exception as e:
+                # Database hiccup: back off and keep the worker alive
+                logger.error(f"Stats refresh worker error: {e}")
+                self._stop.wait(self.poll_interval)
+
+    def _compact_history(self):
+        # Downsample the stats history every COMPACTION_SECONDS, from one thread
+        with self._lock:
+            if time.time() - self._last_compaction < COMPACTION_SECONDS:
+                return
+            self._last_compaction = time.time()
+        session = SessionLocal()
+        try:
+            removed = compact_stats_history(session)
+            if removed:
+                logger.info(f"Downsampled stats history: removed {removed} samples")
+        finally:
+            session.close()
+
+    def _release(self, video_ids):
+        session = SessionLocal()
+        try:
+            session.execute(update(StatsRefresh).where(StatsRefresh.video_id.in_(video_ids))
+                            .values(next_refresh_at=datetime.utcnow()))
+            session.commit()
+        finally:
+            session.close()
+
+    def stats(self):
+        """Videos due now, the schedule size, and refresh outcomes since start."""
+        session = ReadSessionLocal()
+        try:
+            due = due_count(session)
+            scheduled = session.execute(select(func.count()).select_from(StatsRefresh)).scalar()
+        finally:
+            session.close()
+        with self._lock:
+            counters = dict(self._counters)
+        return {"due": due, "scheduled": scheduled, "rate_per_minute": self.bucket.rate * 60, **counters}
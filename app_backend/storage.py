@@ -0,0 +1,209 @@
+"""
+Batched video writes shared by the webhook workers and scripts/ingest.py.
+
+upsert_videos() looks up a whole batch of IDs in one query, skips rows whose data is
+unchanged and writes the rest with a single dialect-aware INSERT ... ON CONFLICT DO
+UPDATE (SQLite and Postgres), instead of one SELECT and one INSERT/UPDATE per video.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import select, update, func, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+try:
+    from .database import SessionLocal, ReadSessionLocal, Video, DataVersion
+    from .search import index_videos
+    from .channels import ChannelDeltas, apply_channel_deltas
+    from .semantic import schedule_index_update
+    from .metrics import count_upserts
+    from .stats_refresh import schedule_stats_refresh
+    from .stats_history import record_stats_samples
+except ImportError:
+    from database import SessionLocal, ReadSessionLocal, Video, DataVersion
+    from search import index_videos
+    from channels import ChannelDeltas, apply_channel_deltas
+    from semantic import schedule_index_update
+    from metrics import count_upserts
+    from stats_refresh import schedule_stats_refresh
+    from stats_history import record_stats_samples
+
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "500"))
+# How long a process trusts its last read of the data version before re-reading it.
+# Writes made by this process are seen immediately; other processes within this window.
+DATA_VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", "2"))
+VIDEOS_DATASET = "videos"
+# Bumped instead of VIDEOS_DATASET when a write only changes view/like counts, so the
+# stats refresher doesn't invalidate every ETag and cache keyed on the videos version
+STATS_DATASET = "video_stats"
+STATS_FIELDS = ("view_count", "like_count")
+
+# Columns written by the ingest and webhook paths
+VIDEO_FIELDS = [
+    "video_id", "title", "url", "upload_date", "view_count", "like_count",
+    "description", "channel_id", "channel_title",
+]
+UPDATE_FIELDS = [f for f in VIDEO_FIELDS if f != "video_id"]
+
+_version_cache = {}  # dataset -> (read_at, version)
+_version_lock = threading.Lock()
+
+def bump_data_version(session, name=VIDEOS_DATASET):
+    """Increments the dataset's version inside the caller's transaction."""
+    updated = session.execute(
+        update(DataVersion).where(DataVersion.name == name).values(version=DataVersion.version + 1)
+    ).rowcount
+    if not updated:
+        session.add(DataVersion(name=name, version=1))
+        session.flush()
+    # Forget the cached value once this transaction commits (see _invalidate_versions)
+    session.info.setdefault("bumped_versions", set()).add(name)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_versions(session):
+    names = session.info.pop("bumped_versions", None)
+    if names:
+        with _version_lock:
+            for name in names:
+                _version_cache.pop(name, None)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_versions(session):
+    session.info.pop("bumped_versions", None)
+
+def cached_data_version(name=VIDEOS_DATASET, max_age=None):
+    """The version get_data_version() would return without a query, or None if it has to read it."""
+    max_age = DATA_VERSION_TTL if max_age is None else max_age
+    with _version_lock:
+        cached = _version_cache.get(name)
+        if cached and time.monotonic() - cached[0] < max_age:
+            return cached[1]
+    return None
+
+def get_data_version(name=VIDEOS_DATASET, max_age=None):
+    """
+    Current version of a dataset. Reads from the database at most once per `max_age`
+    seconds (DATA_VERSION_TTL by default), so hot paths like ETag checks stay off the DB.
+    """
+    version = cached_data_version(name, max_age)
+    if version is not None:
+        return version
+
+    now = time.monotonic()
+    session = ReadSessionLocal()
+    try:
+        version = session.execute(select(DataVersion.version).where(DataVersion.name == name)).scalar() or 0
+    finally:
+        session.close()
+    with _version_lock:
+        _version_cache[name] = (now, version)
+    return version
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _insert_statement(session):
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        stmt = sqlite.insert(Video)
+    elif dialect == "postgresql":
+        stmt = postgresql.insert(Video)
+    else:
+        return None
+    # A missing value (e.g. no description in flat playlist extraction) never erases stored data
+    table = Video.__table__
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.video_id],
+        set_={f: func.coalesce(stmt.excluded[f], table.c[f]) for f in UPDATE_FIELDS},
+    )
+
+def upsert_videos(session, videos, batch_size=None):
+    """
+    Inserts or updates `videos` (dicts keyed by VIDEO_FIELDS) in batches and keeps the
+    search indexes and channel rollups in sync; new videos are scheduled for stats
+    refresh and changed view counts are appended to the stats history. Does not
+    commit. Bumps the videos data version, or only the stats one (STATS_DATASET) when
+    nothing but counts changed. Returns one stats dict per batch:
+    {"batch": n, "inserted": ..., "updated": ..., "unchanged": ...}.
+    """
+    batch_size = batch_size or UPSERT_BATCH_SIZE
+    # Last write wins for duplicate IDs within the call
+    by_id = {}
+    for v in videos:
+        if v.get("video_id"):
+            by_id[v["video_id"]] = {f: v.get(f) for f in VIDEO_FIELDS}
+    rows = list(by_id.values())
+
+    stmt = _insert_statement(session)
+    report = []
+    content_changed = stats_changed = False
+    for n, batch in enumerate(_chunks(rows, batch_size), start=1):
+        ids = [r["video_id"] for r in batch]
+        existing = {
+            row.video_id: row._mapping
+            for row in session.execute(select(*[Video.__table__.c[f] for f in VIDEO_FIELDS]).where(Video.video_id.in_(ids)))
+        }
+
+        stats = {"batch": n, "inserted": 0, "updated": 0, "unchanged": 0}
+        changed = []
+        inserted = []
+        deltas = ChannelDeltas()
+        for row in batch:
+            old = existing.get(row["video_id"])
+            if old is None:
+                if row["upload_date"] is None:
+                    # Unknown publish time: record when we first saw the video
+                    row["upload_date"] = datetime.utcnow()
+                stats["inserted"] += 1
+                content_changed = True
+                changed.append(row)
+                inserted.append(row)
+                deltas.add(row["channel_title"], row["upload_date"], channel_id=row["channel_id"])
+            elif any(row[f] is not None and row[f] != old[f] for f in UPDATE_FIELDS):
+                stats["updated"] += 1
+                changed.append(row)
+                if any(row[f] is not None and row[f] != old[f] for f in UPDATE_FIELDS if f not in STATS_FIELDS):
+                    content_changed = True
+                else:
+                    stats_changed = True
+                # What the row looks like after the COALESCE in the upsert
+                merged = {f: row[f] if row[f] is not None else old[f] for f in ("channel_title", "upload_date", "channel_id")}
+                deltas.move(old, merged)
+            else:
+                stats["unchanged"] += 1
+
+        if changed:
+            if stmt is not None:
+                session.execute(stmt, changed)
+            else:
+                for row in changed:
+                    session.merge(Video(**{k: v for k, v in row.items() if v is not None}))
+            # Index what the row looks like after the COALESCE above
+            docs = [
+                {f: row[f] if row[f] is not None else (existing.get(row["video_id"]) or {}).get(f) for f in ("video_id", "title", "description")}
+                for row in changed
+            ]
+            index_videos(session, docs)
+            schedule_index_update(session, docs)
+            apply_channel_deltas(session, deltas)
+            schedule_stats_refresh(session, inserted)
+            record_stats_samples(session, changed, existing)
+        report.append(stats)
+    if content_changed:
+        bump_data_version(session)
+    if stats_changed:
+        bump_data_version(session, STATS_DATASET)
+    count_upserts(session, {k: v for k, v in summarize_upserts(report).items() if k != "batches"})
+    return report
+
+def summarize_upserts(report):
+    """Totals of a per-batch report returned by upsert_videos."""
+    totals = {"batches": len(report), "inserted": 0, "updated": 0, "unchanged": 0}
+    for stats in report:
+        for key in ("inserted", "updated", "unchanged"):
+            totals[key] += stats[key]
+    return totals
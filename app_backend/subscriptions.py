@@ -0,0 +1,282 @@
+"""
+PubSubHubbub subscriptions for channel feeds, with lease tracking and renewal.
+
+subscribe_channels() sends one request per channel to the hub (PUBSUB_HUB_URL)
+concurrently through a pooled httpx.AsyncClient, at most SUBSCRIBE_CONCURRENCY at a
+time, and records each channel in the subscriptions table. The hub confirms
+asynchronously with a GET to our callback; record_verification() stores the lease it
+grants (hub.lease_seconds) and refuses topics we never asked for. LeaseRenewer re-sends
+subscriptions in batches before their lease runs out, and retries channels whose
+request failed or was never verified.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import select, or_, func
+
+try:
+    from .database import SessionLocal, ReadSessionLocal, Subscription
+    from .metrics import counter, register_collector
+    from .profiling import run_in_threadpool
+except ImportError:
+    from database import SessionLocal, ReadSessionLocal, Subscription
+    from metrics import counter, register_collector
+    from profiling import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_HUB_URL = os.getenv("PUBSUB_HUB_URL", "https://pubsubhubbub.appspot.com/subscribe")
+# Public URL of our /webhook, used by /subscribe when no callback_url is given
+PUBSUB_CALLBACK_URL = os.getenv("PUBSUB_CALLBACK_URL")
+# Lease to ask for; the hub may grant a different one (YouTube's default is 5 days)
+PUBSUB_LEASE_SECONDS = int(os.getenv("PUBSUB_LEASE_SECONDS", "432000"))
+SUBSCRIBE_CONCURRENCY = int(os.getenv("SUBSCRIBE_CONCURRENCY", "32"))
+SUBSCRIBE_TIMEOUT = float(os.getenv("SUBSCRIBE_TIMEOUT", "10"))
+# Renew leases expiring within this window
+LEASE_RENEW_MARGIN_SECONDS = int(os.getenv("LEASE_RENEW_MARGIN_SECONDS", "86400"))
+LEASE_RENEW_INTERVAL_SECONDS = float(os.getenv("LEASE_RENEW_INTERVAL_SECONDS", "600"))
+LEASE_RENEW_BATCH_SIZE = int(os.getenv("LEASE_RENEW_BATCH_SIZE", "200"))
+# A request that failed or was never verified is sent again after this long
+SUBSCRIBE_RETRY_SECONDS = int(os.getenv("SUBSCRIBE_RETRY_SECONDS", "3600"))
+
+subscription_requests = counter(
+    "pubsub_subscription_requests", "Requests sent to the PubSubHubbub hub, by mode and outcome (accepted, rejected, error).",
+    ("mode", "outcome"))
+subscription_verifications = counter(
+    "pubsub_verifications", "Hub verification callbacks, by mode and whether they were accepted.", ("mode", "accepted"))
+
+def topic_url(channel_id):
+    return f"https://www.youtube.com/xml/feeds/videos.xml?channel_id={channel_id}"
+
+def open_hub_client():
+    """AsyncClient whose connection pool matches SUBSCRIBE_CONCURRENCY."""
+    return httpx.AsyncClient(
+        timeout=SUBSCRIBE_TIMEOUT,
+        limits=httpx.Limits(max_connections=SUBSCRIBE_CONCURRENCY, max_keepalive_connections=SUBSCRIBE_CONCURRENCY),
+    )
+
+async def _send(client, semaphore, channel_id, callback_url, mode):
+    data = {
+        "hub.mode": mode,
+        "hub.topic": topic_url(channel_id),
+        "hub.callback": callback_url,
+        "hub.verify": "async",
+    }
+    if mode == "subscribe" and PUBSUB_LEASE_SECONDS:
+        data["hub.lease_seconds"] = str(PUBSUB_LEASE_SECONDS)
+    async with semaphore:
+        try:
+            response = await client.post(PUBSUB_HUB_URL, data=data)
+        except httpx.HTTPError as e:
+            subscription_requests.inc(mode=mode, outcome="error")
+            return {"channel_id": channel_id, "status": "error", "detail": str(e) or type(e).__name__}
+    if response.status_code in (202, 204):
+        subscription_requests.inc(mode=mode, outcome="accepted")
+        return {"channel_id": channel_id, "status": f"{mode}_requested", "code": response.status_code}
+    subscription_requests.inc(mode=mode, outcome="rejected")
+    return {"channel_id": channel_id, "status": "failed", "code": response.status_code, "error": response.text[:500]}
+
+def _mark_requested(channel_ids, callback_url, mode):
+    """
+    Records the requests before they are sent, since the hub may call back to verify
+    before it has even answered us.
+    """
+    now = datetime.utcnow()
+    session = SessionLocal()
+    try:
+        existing = {s.channel_id: s for s in session.execute(
+            select(Subscription).where(Subscription.channel_id.in_(channel_ids))).scalars()}
+        for channel_id in channel_ids:
+            subscription = existing.get(channel_id)
+            if subscription is None:
+                subscription = Subscription(channel_id=channel_id, topic_url=topic_url(channel_id))
+                session.add(subscription)
+            subscription.callback_url = callback_url
+            subscription.requested_at = now
+            if mode == "unsubscribe":
+                subscription.status = "unsubscribing"
+            elif subscription.status != "verified":
+                # A verified lease stays valid until it expires, even while its renewal is pending
+                subscription.status = "requested"
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def _record_results(results, mode):
+    """Stores the hub's answers: errors on failed requests, cleared errors on accepted ones."""
+    session = SessionLocal()
+    try:
+        by_id = {r["channel_id"]: r for r in results}
+        for subscription in session.execute(
+                select(Subscription).where(Subscription.channel_id.in_(list(by_id)))).scalars():
+            result = by_id[subscription.channel_id]
+            if result["status"] == f"{mode}_requested":
+                subscription.last_error = None
+            else:
+                subscription.last_error = result.get("error") or result.get("detail") or f"HTTP {result.get('code')}"
+                if subscription.status == "requested":
+                    subscription.status = "failed"
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+async def subscribe_channels(client, channel_ids, callback_url, mode="subscribe"):
+    """
+    Sends a subscribe (or unsubscribe) request per channel concurrently and records
+    them. Returns one result dict per channel, in order. `client` may be None for a
+    one-off client (e.g. from a script).
+    """
+    if client is None:
+        async with open_hub_client() as client:
+            return await subscribe_channels(client, channel_ids, callback_url, mode)
+    channel_ids = list(dict.fromkeys(c for c in channel_ids if c))
+    if not channel_ids:
+        return []
+    await run_in_threadpool(_mark_requested, channel_ids, callback_url, mode)
+    semaphore = asyncio.Semaphore(SUBSCRIBE_CONCURRENCY)
+    results = await asyncio.gather(*(_send(client, semaphore, c, callback_url, mode) for c in channel_ids))
+    await run_in_threadpool(_record_results, results, mode)
+    return list(results)
+
+def record_verification(mode, topic, lease_seconds=None, reason=None):
+    """
+    Handles the hub's verification GET. Returns True if the challenge should be echoed,
+    i.e. we asked for this (un)subscription; a hub.mode=denied notice is recorded either way.
+    """
+    session = SessionLocal()
+    try:
+        subscription = session.execute(select(Subscription).where(Subscription.topic_url == topic)).scalar_one_or_none()
+        accepted = False
+        if subscription is not None:
+            now = datetime.utcnow()
+            if mode == "subscribe" and subscription.status not in ("unsubscribing", "unsubscribed"):
+                lease = int(lease_seconds) if str(lease_seconds or "").isdigit() else PUBSUB_LEASE_SECONDS
+                subscription.status = "verified"
+                subscription.verified_at = now
+                subscription.lease_seconds = lease
+                subscription.expires_at = now + timedelta(seconds=lease)
+                subscription.last_error = None
+                accepted = True
+            elif mode == "unsubscribe" and subscription.status == "unsubscribing":
+                subscription.status = "unsubscribed"
+                subscription.expires_at = None
+                accepted = True
+            elif mode == "denied":
+                subscription.status = "denied"
+                subscription.expires_at = None
+                subscription.last_error = reason or "denied by hub"
+                accepted = True
+        session.commit()
+        subscription_verifications.inc(mode=mode or "", accepted=str(accepted).lower())
+        return accepted
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def due_for_renewal(limit=LEASE_RENEW_BATCH_SIZE, now=None):
+    """(channel_id, callback_url) of subscriptions to (re)send, soonest expiry first."""
+    now = now or datetime.utcnow()
+    retry_before = now - timedelta(seconds=SUBSCRIBE_RETRY_SECONDS)
+    session = ReadSessionLocal()
+    try:
+        rows = session.execute(
+            select(Subscription.channel_id, Subscription.callback_url)
+            .where(
+                Subscription.status.in_(["requested", "verified", "failed", "denied"]),
+                or_(Subscription.requested_at.is_(None), Subscription.requested_at <= retry_before),
+                or_(
+                    Subscription.status != "verified",
+                    Subscription.expires_at.is_(None),
+                    Subscription.expires_at <= now + timedelta(seconds=LEASE_RENEW_MARGIN_SECONDS),
+                ),
+            )
+            .order_by(Subscription.expires_at, Subscription.channel_id)
+            .limit(limit)
+        ).all()
+        return [(r.channel_id, r.callback_url) for r in rows]
+    finally:
+        session.close()
+
+async def renew_due_subscriptions(client, batch_size=LEASE_RENEW_BATCH_SIZE):
+    """Renews everything currently due, one batch at a time. Returns the number of requests sent."""
+    sent = 0
+    while True:
+        due = await run_in_threadpool(due_for_renewal, batch_size)
+        if not due:
+            return sent
+        by_callback = {}
+        for channel_id, callback_url in due:
+            by_callback.setdefault(callback_url, []).append(channel_id)
+        for callback_url, channel_ids in by_callback.items():
+            await subscribe_channels(client, channel_ids, callback_url)
+        sent += len(due)
+        # Sent rows are no longer due (requested_at moved on), so the next batch is new rows
+        if len(due) < batch_size:
+            return sent
+
+def subscription_summary():
+    """Subscription counts by status and the soonest lease expiry."""
+    session = ReadSessionLocal()
+    try:
+        counts = dict(session.execute(
+            select(Subscription.status, func.count()).group_by(Subscription.status)).all())
+        next_expiry = session.execute(
+            select(func.min(Subscription.expires_at)).where(Subscription.status == "verified")).scalar()
+    finally:
+        session.close()
+    return {"by_status": counts, "next_expiry": next_expiry.isoformat() if next_expiry else None}
+
+class LeaseRenewer:
+    """Event-loop task that calls renew_due_subscriptions() every `interval` seconds."""
+
+    def __init__(self, interval=LEASE_RENEW_INTERVAL_SECONDS, batch_size=LEASE_RENEW_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.client = None
+        self._task = None
+
+    def start(self):
+        """Must be called from the running event loop (e.g. an async startup hook)."""
+        if self._task is not None:
+            return
+        self.client = open_hub_client()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _run(self):
+        while True:
+            try:
+                sent = await renew_due_subscriptions(self.client, self.batch_size)
+                if sent:
+                    logger.info(f"Sent {sent} subscription renewals to {PUBSUB_HUB_URL}")
+            except Exception as e:
+                # Hub or database hiccup: try again next round
+                logger.error(f"Subscription renewal failed: {e}")
+            await asyncio.sleep(self.interval)
+
+def _subscription_samples():
+    return [((status,), count) for status, count in subscription_summary()["by_status"].items()]
+
+register_collector("pubsub_subscriptions", "Subscriptions by status.", _subscription_samples, ("status",))
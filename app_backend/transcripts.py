@@ -0,0 +1,278 @@
+"""
+Video captions, fetched in the background and stored as timestamped chunks.
+
+Caption downloads run as 'transcript' jobs in the durable job queue, drained by their
+own WorkerPool (TRANSCRIPT_WORKERS threads), so they never hold up the webhook
+workers. The webhook workers enqueue a job for every newly stored video;
+enqueue_missing_transcripts() (scripts/fetch_transcripts.py, scripts/ingest.py)
+backfills the rest. Captions are cut into chunks of about TRANSCRIPT_CHUNK_SECONDS,
+one transcript_chunks row each, and indexed for full-text search: an FTS5 table
+(transcript_fts, rowid = chunk id) on SQLite, a GIN expression index on Postgres.
+search_transcripts() returns matching snippets with the time they start at.
+
+process_transcript_job() calls fetch_captions() through the module, so tests and
+benchmarks can replace it with a stub.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+
+from sqlalchemy import select, delete, text
+
+try:
+    from .database import SessionLocal, ReadSessionLocal, Video, Transcript, TranscriptChunk
+    from .jobs import enqueue_jobs
+    from .search import build_fts5_query
+    from .storage import bump_data_version
+    from .youtube import extract_captions
+except ImportError:
+    from database import SessionLocal, ReadSessionLocal, Video, Transcript, TranscriptChunk
+    from jobs import enqueue_jobs
+    from search import build_fts5_query
+    from storage import bump_data_version
+    from youtube import extract_captions
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPTS_ENABLED = os.getenv("TRANSCRIPTS_ENABLED", "true").lower() in ("1", "true", "yes")
+TRANSCRIPT_WORKERS = int(os.getenv("TRANSCRIPT_WORKERS", "1"))
+# Caption tracks tried in this order, manual subtitles before automatic captions
+TRANSCRIPT_LANGUAGES = [l.strip() for l in os.getenv("TRANSCRIPT_LANGUAGES", "en,en-US,en-GB").split(",") if l.strip()]
+TRANSCRIPT_CHUNK_SECONDS = float(os.getenv("TRANSCRIPT_CHUNK_SECONDS", "60"))
+TRANSCRIPT_JOB_KIND = "transcript"
+# Bumped on every transcript write; part of the agent tool cache key
+TRANSCRIPTS_DATASET = "transcripts"
+
+_ready_engines = set()
+_ready_lock = threading.Lock()
+
+# --- parsing ---
+
+_VTT_TIME = re.compile(r"(?:(\d+):)?(\d+):(\d+(?:\.\d+)?)\s+-->\s+(?:(\d+):)?(\d+):(\d+(?:\.\d+)?)")
+_VTT_TAG = re.compile(r"<[^>]+>")
+
+def parse_json3(body):
+    """YouTube's json3 caption format -> [(start_seconds, end_seconds, text)]."""
+    cues = []
+    for event in json.loads(body).get("events") or []:
+        line = "".join(seg.get("utf8", "") for seg in event.get("segs") or []).strip()
+        if not line:
+            continue
+        start = event.get("tStartMs", 0) / 1000
+        cues.append((start, start + event.get("dDurationMs", 0) / 1000, line))
+    return cues
+
+def parse_vtt(body):
+    """WebVTT -> [(start_seconds, end_seconds, text)], with inline timing tags removed."""
+    def seconds(hours, minutes, secs):
+        return int(hours or 0) * 3600 + int(minutes) * 60 + float(secs)
+
+    cues = []
+    for block in re.split(r"\n\s*\n", body.replace("\r\n", "\n")):
+        lines = block.strip().split("\n")
+        for i, line in enumerate(lines):
+            match = _VTT_TIME.search(line)
+            if match:
+                words = " ".join(_VTT_TAG.sub("", l).strip() for l in lines[i + 1:]).strip()
+                if words:
+                    cues.append((seconds(*match.groups()[:3]), seconds(*match.groups()[3:]), words))
+                break
+    return cues
+
+def chunk_cues(cues, chunk_seconds=TRANSCRIPT_CHUNK_SECONDS):
+    """
+    Merges cues into chunks spanning about `chunk_seconds`. Automatic captions repeat
+    each line in the next cue as they scroll, so a cue equal to the previous one is dropped.
+    Returns [(start_seconds, end_seconds, text)].
+    """
+    chunks = []
+    start = end = None
+    words = []
+    previous = None
+    for cue_start, cue_end, line in cues:
+        line = " ".join(line.split())
+        if line == previous:
+            end = max(end, cue_end)
+            continue
+        previous = line
+        if start is not None and cue_start - start >= chunk_seconds:
+            chunks.append((start, end, " ".join(words)))
+            start, words = None, []
+        if start is None:
+            start = cue_start
+        end = cue_end if end is None else max(end, cue_end)
+        words.append(line)
+    if words:
+        chunks.append((start, end, " ".join(words)))
+    return chunks
+
+def fetch_captions(video_id):
+    """
+    Downloads and parses a video's captions. Returns (language, source, cues) or None
+    if it has no captions in TRANSCRIPT_LANGUAGES.
+    """
+    track = extract_captions(video_id, TRANSCRIPT_LANGUAGES)
+    if track is None:
+        return None
+    language, source, ext, body = track
+    cues = parse_json3(body) if ext == "json3" else parse_vtt(body)
+    return language, source, cues
+
+# --- storage and index ---
+
+def _dialect(session):
+    return session.get_bind().dialect.name
+
+def _engine_key(session):
+    return str(session.get_bind().url)
+
+def ensure_transcript_index(session):
+    """Creates the full-text table/index over transcript chunks if missing."""
+    key = _engine_key(session)
+    if key in _ready_engines:
+        return
+    with _ready_lock:
+        dialect = _dialect(session)
+        if dialect == "sqlite":
+            session.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS transcript_fts USING fts5(text, tokenize='porter unicode61')"
+            ))
+        elif dialect == "postgresql":
+            session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_transcript_chunks_text "
+                "ON transcript_chunks USING GIN (to_tsvector('english', text))"
+            ))
+        else:
+            logger.warning(f"Full-text search not supported for dialect {dialect}, using LIKE")
+        _ready_engines.add(key)
+
+def _transcript_index_available(session):
+    if _engine_key(session) in _ready_engines:
+        return True
+    dialect = _dialect(session)
+    if dialect == "sqlite":
+        found = session.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'transcript_fts'")).first()
+    else:
+        found = dialect == "postgresql"
+    if found:
+        _ready_engines.add(_engine_key(session))
+    return bool(found)
+
+def store_transcript(session, video_id, captions):
+    """
+    Replaces a video's chunks (and their index entries) with `captions` as returned
+    by fetch_captions(); None records that the video has no captions so it is not
+    fetched again. Does not commit. Returns the number of chunks stored.
+    """
+    ensure_transcript_index(session)
+    old_ids = list(session.execute(select(TranscriptChunk.id).where(TranscriptChunk.video_id == video_id)).scalars())
+    if old_ids:
+        if _dialect(session) == "sqlite":
+            session.execute(text("DELETE FROM transcript_fts WHERE rowid = :id"), [{"id": i} for i in old_ids])
+        session.execute(delete(TranscriptChunk).where(TranscriptChunk.video_id == video_id))
+
+    language, source, cues = captions or (None, None, [])
+    chunks = [
+        TranscriptChunk(video_id=video_id, seq=seq, start_seconds=start, end_seconds=end, text=words)
+        for seq, (start, end, words) in enumerate(chunk_cues(cues))
+    ]
+    session.add_all(chunks)
+    session.flush()
+    if chunks and _dialect(session) == "sqlite":
+        session.execute(text("INSERT INTO transcript_fts (rowid, text) VALUES (:id, :text)"),
+                        [{"id": c.id, "text": c.text} for c in chunks])
+
+    session.merge(Transcript(video_id=video_id, language=language, source=source,
+                             chunk_count=len(chunks), fetched_at=datetime.utcnow()))
+    bump_data_version(session, TRANSCRIPTS_DATASET)
+    return len(chunks)
+
+def process_transcript_job(video_id):
+    """Job handler: fetches and stores one video's captions. Raises so the job is retried."""
+    captions = fetch_captions(video_id)
+    session = SessionLocal()
+    try:
+        count = store_transcript(session, video_id, captions)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    logger.info(f"Stored transcript for {video_id}: {count} chunks" if captions else f"No captions for {video_id}")
+
+def enqueue_missing_transcripts(limit=None):
+    """Queues a transcript job for stored videos that were never fetched, newest first. Returns the number queued."""
+    session = ReadSessionLocal()
+    try:
+        query = (
+            select(Video.video_id)
+            .outerjoin(Transcript, Transcript.video_id == Video.video_id)
+            .where(Transcript.video_id.is_(None))
+            .order_by(Video.upload_date.desc())
+        )
+        if limit:
+            query = query.limit(limit)
+        video_ids = list(session.execute(query).scalars())
+    finally:
+        session.close()
+    return enqueue_jobs(TRANSCRIPT_JOB_KIND, video_ids)
+
+# --- search ---
+
+def search_transcripts(session, query, channel=None, limit=5):
+    """
+    Best-matching transcript chunks for `query`. Returns dicts with video_id, title,
+    channel_title, start_seconds, snippet and url (which starts playback at the chunk).
+    """
+    params = {"limit": limit}
+    extra = ""
+    if channel:
+        extra = " AND v.channel_title LIKE :channel"
+        params["channel"] = f"%{channel}%"
+    columns = "c.video_id, v.title, v.channel_title, c.start_seconds"
+    dialect = _dialect(session)
+
+    if dialect == "sqlite" and _transcript_index_available(session):
+        match = build_fts5_query(query)
+        if not match:
+            return []
+        params["query"] = match
+        sql = (
+            f"SELECT {columns}, snippet(transcript_fts, 0, '', '', '...', 24) AS snippet "
+            "FROM transcript_fts JOIN transcript_chunks c ON c.id = transcript_fts.rowid "
+            f"JOIN videos v ON v.video_id = c.video_id WHERE transcript_fts MATCH :query{extra} "
+            "ORDER BY bm25(transcript_fts) LIMIT :limit"
+        )
+    elif dialect == "postgresql":
+        params["query"] = query
+        sql = (
+            f"SELECT {columns}, ts_headline('english', c.text, plainto_tsquery('english', :query), "
+            "'MaxWords=30, MinWords=12') AS snippet "
+            "FROM transcript_chunks c JOIN videos v ON v.video_id = c.video_id "
+            f"WHERE to_tsvector('english', c.text) @@ plainto_tsquery('english', :query){extra} "
+            "ORDER BY ts_rank(to_tsvector('english', c.text), plainto_tsquery('english', :query)) DESC LIMIT :limit"
+        )
+    else:
+        # No index yet: substring scan
+        params["query"] = f"%{query}%"
+        sql = (
+            f"SELECT {columns}, substr(c.text, 1, 200) AS snippet "
+            "FROM transcript_chunks c JOIN videos v ON v.video_id = c.video_id "
+            f"WHERE c.text LIKE :query{extra} LIMIT :limit"
+        )
+
+    return [
+        {
+            "video_id": row.video_id,
+            "title": row.title,
+            "channel_title": row.channel_title,
+            "start_seconds": row.start_seconds,
+            "snippet": row.snippet,
+            "url": f"https://www.youtube.com/watch?v={row.video_id}&t={int(row.start_seconds)}s",
+        }
+        for row in session.execute(text(sql), params)
+    ]
@@ -0,0 +1,146 @@
+"""
+yt-dlp helpers for single videos and channel lookups.
+
+fetch_video_details() serves callers from a cache (VIDEO_DETAILS_CACHE_TTL seconds,
+VIDEO_DETAILS_CACHE_SIZE entries); concurrent misses for one video share a single
+extraction. The webhook workers pass max_age=VIDEO_NOTIFICATION_MAX_AGE: notifications
+delivered together, or re-delivered within that window, share one extraction, while a
+later re-delivery (possibly announcing an edit) extracts again. The stats refresher
+calls refresh_video_details(), which always extracts and replaces the cached entry.
+extract_video_details() bypasses the cache entirely.
+
+yt_dlp is imported on first use: it is the slowest import of the API, and only the
+webhook workers, the stats refresher, the transcript workers and channel lookups need it.
+"""
+import os
+import time
+from datetime import datetime
+
+try:
+    from .cache import TTLCache
+    from .metrics import video_details_duration, video_details_errors
+except ImportError:
+    from cache import TTLCache
+    from metrics import video_details_duration, video_details_errors
+
+VIDEO_DETAILS_CACHE_TTL = float(os.getenv("VIDEO_DETAILS_CACHE_TTL", "300"))
+VIDEO_DETAILS_CACHE_SIZE = int(os.getenv("VIDEO_DETAILS_CACHE_SIZE", "2048"))
+# Oldest cached details a webhook notification may store; a re-delivery after this re-extracts
+VIDEO_NOTIFICATION_MAX_AGE = float(os.getenv("VIDEO_NOTIFICATION_MAX_AGE", "30"))
+
+video_details_cache = TTLCache(maxsize=VIDEO_DETAILS_CACHE_SIZE, ttl=VIDEO_DETAILS_CACHE_TTL)
+
+def _youtube_dl(opts):
+    import yt_dlp
+    return yt_dlp.YoutubeDL(opts)
+
+def extract_video_details(video_id):
+    """Runs a full yt-dlp extraction for one video. Returns a dict of Video fields or None."""
+    start = time.perf_counter()
+    try:
+        details = _extract(video_id)
+    except Exception:
+        video_details_errors.inc()
+        raise
+    finally:
+        video_details_duration.observe(time.perf_counter() - start)
+    if details is None:
+        video_details_errors.inc()
+    return details
+
+def _extract(video_id):
+    ydl_opts = {
+        'quiet': True,
+        'ignoreerrors': True
+    }
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    with _youtube_dl(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+        if info:
+            upload_date_str = info.get('upload_date')
+            if upload_date_str:
+                try:
+                    upload_date = datetime.strptime(upload_date_str, "%Y%m%d")
+                except ValueError:
+                    upload_date = datetime.utcnow()
+            else:
+                upload_date = datetime.utcnow()
+                
+            return {
+                "video_id": info.get('id'),
+                "title": info.get('title'),
+                "url": info.get('webpage_url'),
+                "upload_date": upload_date,
+                "view_count": info.get('view_count'),
+                "like_count": info.get('like_count'),
+                "description": info.get('description'),
+                "channel_id": info.get('channel_id'),
+                "channel_title": info.get('channel')
+            }
+    return None
+
+def fetch_video_details(video_id, max_age=None):
+    """
+    Cached, single-flight extract_video_details(); failed extractions (None) are not
+    cached. The result may be up to `max_age` seconds old (VIDEO_DETAILS_CACHE_TTL by
+    default).
+    """
+    return video_details_cache.get_or_load(video_id, lambda: extract_video_details(video_id), max_age=max_age)
+
+def refresh_video_details(video_id):
+    """extract_video_details() that always extracts, then replaces the cached entry (stats refresh)."""
+    details = extract_video_details(video_id)
+    if details is None:
+        video_details_cache.invalidate(video_id)
+    else:
+        video_details_cache.set(video_id, details)
+    return details
+
+def extract_captions(video_id, languages):
+    """
+    Downloads one caption track for a video: manual subtitles in the first of
+    `languages` it has, else automatic captions. Returns (language, source, ext, body)
+    with source 'manual' or 'automatic' and ext 'json3' or 'vtt', or None if the
+    video has no captions in those languages. Raises if the video can't be extracted.
+    """
+    ydl_opts = {
+        'quiet': True,
+        'skip_download': True,
+    }
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    with _youtube_dl(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+        if not info:
+            raise RuntimeError(f"No data returned for {video_id}")
+        for source, tracks in (("manual", info.get('subtitles')), ("automatic", info.get('automatic_captions'))):
+            for language in languages:
+                formats = {f.get('ext'): f for f in (tracks or {}).get(language) or []}
+                # json3 has exact cue timings; vtt is what every track offers
+                for ext in ("json3", "vtt"):
+                    if ext in formats:
+                        body = ydl.urlopen(formats[ext]['url']).read().decode('utf-8')
+                        return language, source, ext, body
+    return None
+
+def resolve_channel(channel_url):
+    """
+    Looks up a channel page (e.g. https://www.youtube.com/@CNN) with one flat yt-dlp
+    request. Returns {"channel_id", "title", "handle"}; raises if the page has no channel ID.
+    """
+    ydl_opts = {
+        'quiet': True,
+        'extract_flat': True,
+        'playlistend': 1,
+        'skip_download': True,
+    }
+    with _youtube_dl(ydl_opts) as ydl:
+        info = ydl.extract_info(channel_url, download=False)
+    channel_id = (info or {}).get('channel_id')
+    if not channel_id:
+        raise ValueError(f"No channel ID found at {channel_url}")
+    handle = info.get('uploader_id')
+    return {
+        "channel_id": channel_id,
+        "title": info.get('channel') or info.get('uploader') or info.get('title'),
+        "handle": handle if handle and handle.startswith('@') else None,
+    }
@@ -0,0 +1,410 @@
+import os
+import sys
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import math
+import platform
+import random
+import subprocess
+import time
+import types
+from datetime import datetime
+
+# Add parent directory to path to import database module; main.py imports its
+# siblings directly, so app_backend itself goes on the path too
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "app_backend"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# The API's background stats refresher and transcript workers would run real yt-dlp extractions
+os.environ.setdefault("STATS_REFRESH_ENABLED", "false")
+os.environ.setdefault("TRANSCRIPTS_ENABLED", "false")
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from fastapi.testclient import TestClient
+import httpx
+
+from app_backend.database import ReadSessionLocal, DATABASE_URL, init_db, dispose_async_engines
+from app_backend.channels import channel_titles
+import agent_tools
+import main
+import ingest
+from generate_catalogue import make_channels, make_video, make_video_id
+
+# --- measurement ----------------------------------------------------------------
+
+def percentile(latencies, p):
+    # Nearest-rank on sorted latencies
+    return latencies[max(0, math.ceil(p * len(latencies)) - 1)]
+
+def summarize(latencies, items=None):
+    """p50/p95/p99/max in milliseconds and throughput for one case."""
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    summary = {
+        "n": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "ops_per_s": round(len(latencies) / total, 1) if total else None,
+    }
+    if items is not None:
+        summary["items_per_s"] = round(items / total, 1) if total else None
+    return summary
+
+def measure(fn, iterations, warmup=3):
+    """Calls fn(i) `iterations` times (after `warmup` untimed calls) and returns the latencies."""
+    for i in range(warmup):
+        fn(-1 - i)
+    latencies = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+@contextlib.contextmanager
+def quiet():
+    # Tools and the ingest script print progress; keep it out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+# --- fixtures -------------------------------------------------------------------
+
+def load_fixtures(rng, samples=200):
+    """Channel names and keywords drawn from the catalogue being benchmarked."""
+    session = ReadSessionLocal()
+    try:
+        channels = channel_titles(session) or [None]
+        titles = [row[0] for row in session.execute(
+            text("SELECT title FROM videos WHERE title IS NOT NULL ORDER BY video_id LIMIT :n"), {"n": samples * 5}
+        )]
+        total = session.execute(text("SELECT COUNT(*) FROM videos")).scalar()
+    finally:
+        session.close()
+    words = sorted({w.strip(".,:;!?'\"").lower() for t in titles for w in t.split() if len(w) > 4})
+    keywords = rng.sample(words, min(samples, len(words))) if words else ["news"]
+    return {"channels": channels, "keywords": keywords, "videos": total}
+
+def fake_details(video_id, max_age=None):
+    # Stand-in for the yt-dlp call in main.fetch_video_details
+    return {
+        "video_id": video_id,
+        "title": f"Benchmark notification {video_id}",
+        "url": f"https://www.youtube.com/watch?v={video_id}",
+        "upload_date": datetime.utcnow(),
+        "view_count": 0,
+        "like_count": 0,
+        "description": "Synthetic video stored by scripts/benchmark.py",
+        "channel_id": "UCbenchmark",
+        "channel_title": "Benchmark Channel",
+    }
+
+class FakeYoutubeDL:
+    """Returns a synthetic flat channel listing instead of calling YouTube."""
+    listings = {}
+
+    def __init__(self, opts):
+        self.opts = opts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=False, process=True):
+        channel_title, entries = self.listings[url]
+        limit = self.opts.get("playlistend") or len(entries)
+        return {"uploader": channel_title, "entries": iter(entries[:limit])}
+
+def make_listing(seed, count, rng):
+    channel = make_channels(1, rng)[0]
+    now = datetime.utcnow()
+    entries = []
+    for n in range(count):
+        v = make_video(n, seed, channel, now, 30, rng)
+        # Flat extraction: no description, no dates
+        entries.append({"id": v["video_id"], "title": v["title"], "webpage_url": v["url"], "channel": v["channel_title"],
+                        "channel_id": v["channel_id"], "view_count": v["view_count"]})
+    return channel["title"], entries
+
+# --- cases ----------------------------------------------------------------------
+
+def bench_tools(args, fixtures, rng, results):
+    def call(tool, **kwargs):
+        if not args.warm_cache:
+            agent_tools.tool_cache.clear()
+        with quiet():
+            tool(**kwargs)
+
+    channels, keywords = fixtures["channels"], fixtures["keywords"]
+    cases = {
+        "tools.get_video_stats": lambda i: call(agent_tools.get_video_stats, channel_name=rng.choice(channels)),
+        "tools.count_videos_last_24h": lambda i: call(agent_tools.count_videos_last_24h, channel_name=rng.choice(channels)),
+        "tools.count_videos_last_24h[keyword]": lambda i: call(agent_tools.count_videos_last_24h, keyword=rng.choice(keywords)),
+        "tools.search_videos": lambda i: call(agent_tools.search_videos, keyword=rng.choice(keywords)),
+        "tools.semantic_search_videos": lambda i: call(agent_tools.semantic_search_videos, query=rng.choice(keywords)),
+        "tools.search_transcripts": lambda i: call(agent_tools.search_transcripts, query=rng.choice(keywords)),
+    }
+    for name, fn in cases.items():
+        results[name] = summarize(measure(fn, args.iterations))
+
+def bench_api(args, client, results):
+    headers = {"X-API-Key": main.API_KEY}
+
+    def get(path, **params):
+        response = client.get(path, params=params, headers=headers)
+        if response.status_code not in (200, 304):
+            raise RuntimeError(f"GET {path} returned {response.status_code}: {response.text[:200]}")
+        return response
+
+    first = get("/videos/recent", limit=20)
+    cursor = first.headers.get("X-Next-Cursor")
+    etag = first.headers.get("ETag")
+
+    def revalidate(i):
+        response = client.get("/videos/recent", params={"limit": 20}, headers={**headers, "If-None-Match": etag})
+        if response.status_code != 304:
+            raise RuntimeError(f"Expected 304, got {response.status_code}")
+
+    cases = {
+        "api.videos_recent": lambda i: get("/videos/recent", limit=20),
+        "api.videos_recent[cursor]": lambda i: get("/videos/recent", limit=20, cursor=cursor) if cursor else None,
+        "api.videos_recent[fields]": lambda i: get("/videos/recent", limit=100, fields="video_id,title,upload_date"),
+        "api.videos_recent[304]": revalidate,
+    }
+    for name, fn in cases.items():
+        results[name] = summarize(measure(fn, args.iterations))
+
+def bench_webhook(args, client, run_seed, results):
+    """POST /webhook latency, then end-to-end throughput until the workers have stored every video."""
+    main.fetch_video_details = fake_details
+    ids = [make_video_id(run_seed, n) for n in range(args.iterations + 3)]
+
+    def post(i):
+        body = (
+            '<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">'
+            f"<entry><yt:videoId>{ids[i]}</yt:videoId><yt:channelId>UCbenchmark</yt:channelId></entry></feed>"
+        )
+        response = client.post("/webhook", content=body, headers={"Content-Type": "application/atom+xml"})
+        if response.status_code != 200:
+            raise RuntimeError(f"POST /webhook returned {response.status_code}")
+
+    start = time.perf_counter()
+    results["webhook.receive"] = summarize(measure(post, args.iterations))
+
+    deadline = time.time() + args.webhook_timeout
+    while time.time() < deadline:
+        stats = main.webhook_workers.stats()
+        if not stats["pending"] and not stats["processing"]:
+            break
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    stored = len(ids)
+    results["webhook.end_to_end"] = {
+        "n": stored,
+        "seconds": round(elapsed, 3),
+        "items_per_s": round(stored / elapsed, 1),
+        "drained": not stats["pending"] and not stats["processing"],
+    }
+
+def bench_ingest(args, run_seed, rng, results):
+    ingest.yt_dlp = types.SimpleNamespace(YoutubeDL=FakeYoutubeDL)
+    runs = args.ingest_runs
+    urls = []
+    for n in range(runs + 3):
+        url = f"https://www.youtube.com/@benchmark{run_seed}x{n}"
+        FakeYoutubeDL.listings[ingest.channel_videos_url(url)] = make_listing(run_seed + 1 + n, args.ingest_videos, rng)
+        urls.append(url)
+
+    def run(i):
+        with quiet():
+            ingest.ingest_channel(urls[i], limit=args.ingest_videos)
+
+    # First pass inserts every video; the second sees them all unchanged
+    results["ingest.channel[new]"] = summarize(measure(run, runs), items=runs * args.ingest_videos)
+    results["ingest.channel[unchanged]"] = summarize(measure(run, runs, warmup=0), items=runs * args.ingest_videos)
+
+async def _recent_rounds(parallel, rounds, concurrent):
+    """Wall time of `rounds` batches of `parallel` GET /videos/recent, concurrent or one after another."""
+    headers = {"X-API-Key": main.API_KEY}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def get(i):
+            response = await client.get("/videos/recent", params={"limit": 100, "fields": "video_id,title,upload_date,description"},
+                                        headers=headers)
+            if response.status_code != 200:
+                raise RuntimeError(f"GET /videos/recent returned {response.status_code}")
+
+        await get(0)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            if concurrent:
+                await asyncio.gather(*(get(i) for i in range(parallel)))
+            else:
+                for i in range(parallel):
+                    await get(i)
+        elapsed = time.perf_counter() - start
+    # Async pools belong to this event loop
+    await dispose_async_engines()
+    return elapsed
+
+def bench_concurrency(args, results):
+    """
+    N parallel /videos/recent calls against the same N made one by one, on the async
+    session and on the thread-pool fallback. speedup near N means requests overlap;
+    near 1 means they serialize. Only database time overlaps: on a warm local SQLite
+    file a request is mostly Python CPU time under the GIL, so expect close to 1 there
+    (tests/test_concurrency.py checks the overlap itself).
+    """
+    n, rounds = args.parallel, max(1, args.iterations // args.parallel)
+    async_factory = main.get_async_session_factory
+    paths = {"async": async_factory, "threads": lambda *a, **k: None}
+    if async_factory() is None:
+        paths = {"threads": async_factory}
+    try:
+        for label, factory in paths.items():
+            main.get_async_session_factory = factory
+            sequential = asyncio.run(_recent_rounds(n, rounds, concurrent=False))
+            parallel = asyncio.run(_recent_rounds(n, rounds, concurrent=True))
+            results[f"api.videos_recent[x{n} {label}]"] = {
+                "n": n * rounds,
+                "seconds": round(parallel, 3),
+                "items_per_s": round(n * rounds / parallel, 1),
+                "speedup": round(sequential / parallel, 2),
+            }
+    finally:
+        main.get_async_session_factory = async_factory
+
+# Runs in a fresh interpreter: import the deployed entrypoint, serve one request, report timings
+COLD_START_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import serverless_entrypoint
+imported = time.perf_counter() - start
+from fastapi.testclient import TestClient
+import httpx
+import metrics
+with TestClient(serverless_entrypoint.app) as client:
+    client.get("/")
+print(json.dumps({"entrypoint_import": imported, **metrics.startup_timings.snapshot()}))
+"""
+
+def bench_cold_start(args, results):
+    """Import and first-request latency of serverless_entrypoint, one new process per run."""
+    timings = {}
+    for _ in range(args.cold_starts):
+        out = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT], cwd=ROOT, env=os.environ,
+                             capture_output=True, text=True, check=True).stdout
+        for phase, seconds in json.loads(out.strip().splitlines()[-1]).items():
+            timings.setdefault(phase, []).append(seconds)
+    for phase in ("entrypoint_import", "import", "schema", "ready", "first_response", "first_request"):
+        if phase in timings:
+            results[f"coldstart.{phase}"] = summarize(timings[phase])
+
+# --- report ---------------------------------------------------------------------
+
+def print_report(results):
+    print(f"\n{'case':<38} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'ops/s':>9} {'items/s':>9}")
+    for name, r in results.items():
+        if "p50_ms" not in r:
+            print(f"{name:<38} {r['n']:>6} {'':>9} {'':>9} {'':>9} {'':>9} {'':>9} {r['items_per_s']:>9}"
+                  + ("" if r.get("drained", True) else "  (queue not drained)")
+                  + (f"  ({r['speedup']}x vs sequential)" if "speedup" in r else ""))
+            continue
+        print(f"{name:<38} {r['n']:>6} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} {r['max_ms']:>9} "
+              f"{r['ops_per_s'] or '':>9} {r.get('items_per_s') or '':>9}")
+
+def compare(results, baseline, threshold):
+    """Prints changes against a previous --json report. Returns the names of regressed cases."""
+    regressions = []
+    print(f"\n{'case':<38} {'p50 change':>11} {'p95 change':>11}")
+    for name, r in results.items():
+        base = baseline["results"].get(name)
+        if not base or "p95_ms" not in r or "p95_ms" not in base:
+            continue
+        changes = {k: (r[k] - base[k]) / base[k] if base[k] else 0.0 for k in ("p50_ms", "p95_ms")}
+        flag = ""
+        if changes["p95_ms"] > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<38} {changes['p50_ms']:>+10.1%} {changes['p95_ms']:>+10.1%}{flag}")
+    return regressions
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Time the agent tools, API, webhook, ingest and cold start paths against DATABASE_URL")
+    parser.add_argument("--iterations", type=int, default=200, help="Timed calls per case")
+    parser.add_argument("--only", default="tools,api,concurrency,webhook,ingest,coldstart", help="Comma-separated groups to run")
+    parser.add_argument("--skip-writes", action="store_true", help="Skip the webhook and ingest groups (they write rows)")
+    parser.add_argument("--warm-cache", action="store_true", help="Keep the agent tool cache between calls")
+    parser.add_argument("--ingest-runs", type=int, default=10, help="Channels ingested per ingest case")
+    parser.add_argument("--ingest-videos", type=int, default=200, help="Videos per fake channel listing")
+    parser.add_argument("--webhook-timeout", type=float, default=120, help="Seconds to wait for the webhook queue to drain")
+    parser.add_argument("--parallel", type=int, default=16, help="Concurrent /videos/recent calls in the concurrency group")
+    parser.add_argument("--cold-starts", type=int, default=5, help="Fresh processes timed by the coldstart group")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for picking channels and keywords")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--compare", help="Compare against a previous --json file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p95 increase reported as a regression")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    groups = set(args.only.split(","))
+    if args.skip_writes:
+        groups -= {"webhook", "ingest"}
+    rng = random.Random(args.seed)
+    # Fresh video IDs per run so write cases always measure inserts
+    run_seed = int(time.time()) % (1 << 20)
+
+    init_db()
+    url = make_url(DATABASE_URL).render_as_string(hide_password=True)
+    fixtures = load_fixtures(rng)
+    print(f"Benchmarking {url} ({fixtures['videos']} videos, {len(fixtures['channels'])} channels)")
+    if groups & {"webhook", "ingest"}:
+        print("Note: webhook and ingest cases write synthetic videos; run against a copy of the database.")
+
+    results = {}
+    if "tools" in groups:
+        bench_tools(args, fixtures, rng, results)
+    if groups & {"api", "webhook"}:
+        with TestClient(main.app) as client:
+            if "api" in groups:
+                bench_api(args, client, results)
+            if "webhook" in groups:
+                bench_webhook(args, client, run_seed, results)
+    if "concurrency" in groups:
+        bench_concurrency(args, results)
+    if "ingest" in groups:
+        bench_ingest(args, run_seed, rng, results)
+    if "coldstart" in groups:
+        bench_cold_start(args, results)
+
+    print_report(results)
+    report = {
+        "database": url,
+        "videos": fixtures["videos"],
+        "iterations": args.iterations,
+        "python": platform.python_version(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"\nWrote {args.json}")
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = compare(results, json.load(fh), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%} at p95")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main_cli()
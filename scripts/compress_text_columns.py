@@ -0,0 +1,138 @@
+import os
+import sys
+import argparse
+import statistics
+import time
+
+# Add parent directory to path to import database module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import text
+from sqlalchemy.orm import undefer_group
+from sqlalchemy.engine import make_url
+from app_backend.database import (
+    SessionLocal, ReadSessionLocal, Video, DATABASE_URL, TEXT_COMPRESSION, init_db, get_writer_engine,
+    compress_text, decompress_text,
+)
+
+TEXT_COLUMNS = ("description", "ai_summary", "transcript")
+
+def database_bytes():
+    path = make_url(DATABASE_URL).database
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+def stored_text_bytes():
+    session = ReadSessionLocal()
+    try:
+        return session.execute(text(
+            "SELECT " + " + ".join(f"COALESCE(SUM(LENGTH(CAST({c} AS BLOB))), 0)" for c in TEXT_COLUMNS) + " FROM videos"
+        )).scalar()
+    finally:
+        session.close()
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def measure(runs):
+    """Database size and median latency (ms) of the list and scan queries."""
+    def query(fn):
+        def run():
+            session = ReadSessionLocal()
+            try:
+                fn(session)
+            finally:
+                session.close()
+        return run
+
+    return {
+        "database bytes": database_bytes(),
+        "text column bytes": stored_text_bytes(),
+        "SELECT * LIMIT 10 (ms)": timed(query(lambda s: s.execute(text(
+            "SELECT * FROM videos ORDER BY upload_date DESC LIMIT 10")).fetchall()), runs),
+        "ORM list, 100 rows (ms)": timed(query(lambda s: s.query(Video).order_by(Video.upload_date.desc()).limit(100).all()), runs),
+        "ORM list + text, 100 rows (ms)": timed(query(lambda s: s.query(Video).options(undefer_group("text"))
+                                                     .order_by(Video.upload_date.desc()).limit(100).all()), runs),
+        "scan all descriptions (ms)": timed(query(lambda s: s.query(Video.description).all()), runs),
+    }
+
+def rewrite(convert, batch_size):
+    """Rewrites every stored value of TEXT_COLUMNS through `convert`, one batch per transaction. Returns rows changed."""
+    changed = 0
+    last_rowid = 0
+    while True:
+        session = SessionLocal()
+        try:
+            rows = session.execute(text(
+                f"SELECT rowid, {', '.join(TEXT_COLUMNS)} FROM videos WHERE rowid > :after ORDER BY rowid LIMIT :limit"
+            ), {"after": last_rowid, "limit": batch_size}).all()
+            if not rows:
+                return changed
+            last_rowid = rows[-1].rowid
+            updates = []
+            for row in rows:
+                values = {c: convert(getattr(row, c)) for c in TEXT_COLUMNS}
+                if any(values[c] is not getattr(row, c) and values[c] != getattr(row, c) for c in TEXT_COLUMNS):
+                    updates.append({"rowid": row.rowid, **values})
+            if updates:
+                session.execute(text(
+                    f"UPDATE videos SET {', '.join(f'{c} = :{c}' for c in TEXT_COLUMNS)} WHERE rowid = :rowid"
+                ), updates)
+            session.commit()
+            changed += len(updates)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+def run_outside_transaction(*statements):
+    # On a raw connection of the (autocommit) writer engine
+    connection = get_writer_engine().raw_connection()
+    try:
+        for statement in statements:
+            connection.execute(statement)
+    finally:
+        connection.close()
+
+def checkpoint():
+    """Moves the WAL back into the database file, so database_bytes() compares like with like."""
+    run_outside_transaction("PRAGMA wal_checkpoint(TRUNCATE)")
+
+def vacuum():
+    # In WAL mode the rebuilt file goes through the WAL
+    run_outside_transaction("VACUUM", "PRAGMA wal_checkpoint(TRUNCATE)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compress the large text columns of existing videos (SQLite)")
+    parser.add_argument("--decompress", action="store_true", help="Store every value as plain text again")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows rewritten per transaction")
+    parser.add_argument("--runs", type=int, default=20, help="Runs per latency measurement")
+    parser.add_argument("--no-vacuum", action="store_true", help="Don't VACUUM afterwards (the file keeps its size)")
+    args = parser.parse_args()
+    init_db()
+
+    if make_url(DATABASE_URL).get_backend_name() != "sqlite":
+        sys.exit("Only SQLite stores these columns compressed; Postgres already compresses large values (TOAST).")
+
+    checkpoint()
+    before = measure(args.runs)
+    start = time.time()
+    if args.decompress:
+        changed = rewrite(decompress_text, args.batch_size)
+    else:
+        changed = rewrite(lambda value: compress_text(decompress_text(value)), args.batch_size)
+    print(f"Rewrote {changed} rows ({'decompressed' if args.decompress else TEXT_COMPRESSION}) in {time.time() - start:.1f}s")
+    if args.no_vacuum:
+        checkpoint()
+    else:
+        vacuum()
+    after = measure(args.runs)
+
+    print(f"\n{'':<32}{'before':>14}{'after':>14}{'change':>10}")
+    for key in before:
+        change = f"{(after[key] - before[key]) / before[key] * 100:+.0f}%" if before[key] else ""
+        print(f"{key:<32}{before[key]:>14,.1f}{after[key]:>14,.1f}{change:>10}")
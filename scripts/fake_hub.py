@@ -0,0 +1,98 @@
+"""
+Local stand-in for the PubSubHubbub hub, for testing subscriptions without YouTube.
+
+Accepts subscribe/unsubscribe requests on POST /subscribe (202), then verifies each one
+against its callback like the real hub: GET with hub.mode, hub.topic, hub.challenge and
+hub.lease_seconds, expecting the challenge echoed back. GET /stats shows what it saw.
+
+    python scripts/fake_hub.py --port 8090 --latency 0.2 --lease-seconds 120
+    PUBSUB_HUB_URL=http://127.0.0.1:8090/subscribe uvicorn main:app  (from app_backend/)
+"""
+import argparse
+import asyncio
+import collections
+import random
+import secrets
+import time
+from urllib.parse import parse_qs
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+app = FastAPI(title="Fake PubSubHubbub hub")
+settings = argparse.Namespace(latency=0.0, verify_delay=0.5, lease_seconds=None, fail_rate=0.0)
+stats = collections.Counter()
+# topic -> (mode, lease, verified_at) of the last verified request
+subscriptions = {}
+_in_flight = 0
+_background = set()
+_client = None
+
+async def verify(callback, mode, topic, lease_seconds):
+    global _client
+    await asyncio.sleep(settings.verify_delay)
+    # One shared client: building one per callback (SSL context) stalls the event loop
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=10)
+    challenge = secrets.token_hex(8)
+    params = {"hub.mode": mode, "hub.topic": topic, "hub.challenge": challenge}
+    if mode == "subscribe":
+        params["hub.lease_seconds"] = str(lease_seconds)
+    try:
+        response = await _client.get(callback, params=params)
+    except httpx.HTTPError as e:
+        stats["verify_error"] += 1
+        print(f"verify {mode} {topic}: {e}")
+        return
+    if response.status_code == 200 and response.text.strip().strip('"') == challenge:
+        stats[f"verified_{mode}"] += 1
+        subscriptions[topic] = (mode, lease_seconds, time.time())
+    else:
+        stats["verify_refused"] += 1
+        print(f"verify {mode} {topic}: callback answered {response.status_code} {response.text[:100]!r}")
+
+@app.post("/subscribe")
+async def subscribe(request: Request):
+    global _in_flight
+    form = {k: v[0] for k, v in parse_qs((await request.body()).decode()).items()}
+    mode, topic, callback = form.get("hub.mode"), form.get("hub.topic"), form.get("hub.callback")
+    if mode not in ("subscribe", "unsubscribe") or not topic or not callback:
+        stats["bad_request"] += 1
+        return Response("hub.mode, hub.topic and hub.callback are required", status_code=400)
+
+    _in_flight += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], _in_flight)
+    try:
+        await asyncio.sleep(settings.latency)
+    finally:
+        _in_flight -= 1
+    stats[f"requests_{mode}"] += 1
+    if random.random() < settings.fail_rate:
+        stats["failed"] += 1
+        return Response("simulated hub error", status_code=503)
+
+    requested = int(form["hub.lease_seconds"]) if form.get("hub.lease_seconds", "").isdigit() else 432000
+    lease = settings.lease_seconds or requested
+    task = asyncio.get_running_loop().create_task(verify(callback, mode, topic, lease))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return Response(status_code=202)
+
+@app.get("/stats")
+async def get_stats():
+    active = sum(1 for mode, _, _ in subscriptions.values() if mode == "subscribe")
+    return {"counters": dict(stats), "active_subscriptions": active}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake PubSubHubbub hub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before answering each request")
+    parser.add_argument("--verify-delay", type=float, default=0.5, help="Seconds before calling back to verify")
+    parser.add_argument("--lease-seconds", type=int, default=None, help="Lease to grant (default: what was asked for)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    args = parser.parse_args()
+    settings.latency, settings.verify_delay = args.latency, args.verify_delay
+    settings.lease_seconds, settings.fail_rate = args.lease_seconds, args.fail_rate
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
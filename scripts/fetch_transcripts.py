@@ -0,0 +1,42 @@
+import os
+import sys
+import argparse
+import time
+
+# Add parent directory to path to import database module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app_backend.database import DATABASE_URL, init_db
+from app_backend.jobs import WorkerPool
+from app_backend.transcripts import (
+    enqueue_missing_transcripts, process_transcript_job, TRANSCRIPT_JOB_KIND, TRANSCRIPT_WORKERS,
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill video transcripts (captions) through the transcript job queue")
+    parser.add_argument("--limit", type=int, default=None, help="Queue at most this many videos (newest first)")
+    parser.add_argument("--workers", type=int, default=TRANSCRIPT_WORKERS, help="Caption downloads at a time")
+    parser.add_argument("--enqueue-only", action="store_true", help="Only queue the jobs; the API's transcript workers run them")
+    args = parser.parse_args()
+    init_db()
+
+    queued = enqueue_missing_transcripts(limit=args.limit)
+    print(f"Queued {queued} transcript jobs in {DATABASE_URL}")
+    if args.enqueue_only:
+        sys.exit(0)
+
+    pool = WorkerPool(TRANSCRIPT_JOB_KIND, process_transcript_job, workers=args.workers, max_attempts=3,
+                      base_delay=60.0, max_delay=3600.0, poll_interval=1.0)
+    start = time.time()
+    pool.start()
+    try:
+        while True:
+            stats = pool.stats()
+            print(f"  pending {stats['pending']}, processing {stats['processing']}, "
+                  f"done {stats['processed_total']}, failed {stats['failed_total']}")
+            # Failed downloads are retried after a backoff, so this waits for those too
+            if not stats["pending"] and not stats["processing"]:
+                break
+            time.sleep(5)
+    finally:
+        pool.stop()
+    print(f"Done in {time.time() - start:.1f}s: {pool.stats()}")
@@ -0,0 +1,182 @@
+import os
+import sys
+import argparse
+import base64
+import random
+import time
+from datetime import datetime, timedelta
+
+# Add parent directory to path to import database module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app_backend.database import SessionLocal, Video, DATABASE_URL, init_db
+from app_backend.search import rebuild_search_index
+from app_backend.channels import rebuild_channel_rollup
+from app_backend.semantic import rebuild_semantic_index
+from app_backend.storage import bump_data_version
+
+# Vocabulary per topic: (title templates, subjects, sentences for descriptions)
+TOPICS = {
+    "markets": (
+        ["{s} Falls as Investors Weigh Rate Outlook", "Fed Holds Rates Steady; {s} in Focus", "Why {s} Is Rallying Today",
+         "{s} Earnings Beat Expectations", "Stocks Slide as {s} Tumbles", "Bond Yields Rise Ahead of {s} Data",
+         "Central Bank Raises Interest Rates, {s} Reacts", "Is {s} Headed for a Crash?"],
+        ["Nvidia", "Apple", "Treasury Bonds", "Oil", "Gold", "Bitcoin", "the Dollar", "Tesla", "the S&P 500",
+         "Inflation", "the Yen", "Copper", "Bank Stocks", "Tech Shares", "Emerging Markets"],
+        ["Traders are pricing in fewer rate cuts this year.", "Analysts discuss the outlook for earnings and valuations.",
+         "Inflation data came in hotter than expected.", "The central bank signalled it is in no hurry to ease policy.",
+         "Markets swung between gains and losses in volatile trading.", "Strategists weigh the risks of a slowdown."],
+    ),
+    "politics": (
+        ["{s} Faces Backlash Over New Policy", "Inside the Fight Over {s}", "{s}: What Happens Next",
+         "Senate Votes on {s} Bill", "Election Update: {s} Leads in Polls", "{s} Responds to Critics",
+         "Breaking: {s} Announces Resignation", "Debate Heats Up Over {s}"],
+        ["the President", "Congress", "the Prime Minister", "the Supreme Court", "Immigration Reform", "the Budget",
+         "Healthcare", "the Opposition", "Tariffs", "Voting Rights", "the Governor", "Parliament"],
+        ["Lawmakers are divided along party lines.", "The vote is expected later this week.",
+         "Critics say the plan goes too far.", "Supporters argue it is long overdue.",
+         "Polls show voters are closely split.", "Officials declined to comment on the report."],
+    ),
+    "world": (
+        ["{s}: Ceasefire Talks Resume", "Protests Erupt in {s}", "{s} Hit by Deadly Floods", "Aid Arrives in {s}",
+         "Tensions Rise Between {s} and Neighbours", "Earthquake Strikes {s}", "{s} Holds Historic Election",
+         "Refugees Flee Fighting in {s}"],
+        ["Gaza", "Ukraine", "Sudan", "Taiwan", "Bangladesh", "Venezuela", "Syria", "Nepal", "Myanmar", "Haiti",
+         "Iran", "Pakistan", "Indonesia", "Kenya"],
+        ["Thousands have been displaced by the violence.", "International mediators are pushing for talks.",
+         "Aid agencies warn of a humanitarian crisis.", "Our correspondent reports from the capital.",
+         "The United Nations has called for restraint.", "Rescue teams are searching for survivors."],
+    ),
+    "sports": (
+        ["{s} Wins Thriller in Final Over", "Highlights: {s} vs Rivals", "{s} Clinches Championship",
+         "{s} Coach Sacked After Defeat", "Record Broken as {s} Dominates", "{s} Star Ruled Out With Injury",
+         "Fans Celebrate as {s} Lifts Trophy", "{s} Squad Announced for World Cup"],
+        ["India", "Pakistan", "Australia", "England", "Real Madrid", "the Lakers", "Manchester United", "the Yankees",
+         "Argentina", "Brazil", "New Zealand", "South Africa"],
+        ["Watch the best moments from the match.", "The team sealed victory in the final minutes.",
+         "Fans packed the stadium for the clash.", "The captain praised the squad's resilience.",
+         "It was a record-breaking performance.", "The tournament continues next week."],
+    ),
+    "tech": (
+        ["{s} Unveils New AI Model", "Hands-On With {s}'s Latest Phone", "{s} Faces Antitrust Probe",
+         "How {s} Is Changing the Chip Industry", "{s} Layoffs Hit Thousands", "{s} Stock Soars on AI Demand",
+         "Is {s} Winning the AI Race?", "{s} Hit by Major Outage"],
+        ["Google", "Microsoft", "OpenAI", "Meta", "Amazon", "Samsung", "TSMC", "Intel", "Apple", "Nvidia", "SpaceX"],
+        ["The company showed off new artificial intelligence features.", "Regulators are examining its market power.",
+         "Demand for data center chips continues to surge.", "Engineers say the rollout will take months.",
+         "Users reported problems across several services.", "Investors are betting big on machine learning."],
+    ),
+    "health": (
+        ["Doctors Warn of {s} Outbreak", "New Study Links {s} to Longer Life", "{s} Cases Rise Across Region",
+         "What You Need to Know About {s}", "Vaccine for {s} Shows Promise", "Hospitals Strained by {s}",
+         "Experts Explain the {s} Risk", "{s}: Symptoms and Treatment"],
+        ["Nipah Virus", "Measles", "Flu", "Dengue", "Covid", "Bird Flu", "Heart Disease", "Diabetes", "Sleep",
+         "Obesity", "Mental Health"],
+        ["Health officials urge people to stay alert.", "Researchers followed thousands of patients.",
+         "The fatality rate remains high.", "Doctors recommend early testing.",
+         "Hospitals have set up isolation wards.", "The findings were published in a medical journal."],
+    ),
+}
+
+CHANNEL_PREFIXES = ["Global", "Daily", "Live", "World", "National", "Morning", "Evening", "Breaking", "Insight", "Prime"]
+CHANNEL_SUFFIXES = {
+    "markets": ["Markets", "Business", "Finance", "Money"],
+    "politics": ["Politics", "Politics Desk", "Capitol Report", "Newsroom"],
+    "world": ["News", "World Report", "Broadcast", "Dispatch"],
+    "sports": ["Sports", "Sports Center", "Cricket", "Football"],
+    "tech": ["Tech", "Technology", "Tech Review", "Digital"],
+    "health": ["Health", "Medical News", "Health Desk", "Wellness"],
+}
+BOILERPLATE = "Subscribe to our channel for the latest updates. Follow us on social media."
+
+def make_channels(count, rng):
+    """Channels with a topic and a Zipf-like share of uploads (a few big channels, a long tail)."""
+    channels = []
+    topics = list(TOPICS)
+    for i in range(count):
+        topic = topics[i % len(topics)]
+        title = f"{rng.choice(CHANNEL_PREFIXES)} {rng.choice(CHANNEL_SUFFIXES[topic])} {i + 1}"
+        channel_id = "UC" + base64.urlsafe_b64encode(rng.randbytes(17)).decode()[:22]
+        channels.append({"title": title, "channel_id": channel_id, "topic": topic, "weight": 1.0 / (i + 1) ** 0.8})
+    return channels
+
+def make_video_id(seed, n):
+    # 11 URL-safe base64 characters like real IDs, unique per (seed, n)
+    return base64.urlsafe_b64encode(((seed << 44) | n).to_bytes(9, "big")).decode()[1:12]
+
+def make_video(n, seed, channel, now, days, rng):
+    titles, subjects, sentences = TOPICS[channel["topic"]]
+    subject = rng.choice(subjects)
+    title = rng.choice(titles).format(s=subject)
+    description = " ".join(rng.sample(sentences, rng.randint(1, 3))) + f" {subject}. " + BOILERPLATE
+    # Uploads are denser towards the present
+    age = timedelta(days=days * rng.random() ** 2, seconds=rng.randint(0, 86399))
+    views = int(rng.lognormvariate(8, 2))
+    video_id = make_video_id(seed, n)
+    return {
+        "video_id": video_id,
+        "title": title,
+        "url": f"https://www.youtube.com/watch?v={video_id}",
+        "upload_date": now - age,
+        "view_count": views,
+        "like_count": int(views * rng.uniform(0.005, 0.06)),
+        "description": description,
+        "channel_id": channel["channel_id"],
+        "channel_title": channel["title"],
+    }
+
+def generate(videos, channels, days, batch_size, seed, rebuild_indexes=True, semantic=True):
+    rng = random.Random(seed)
+    channel_list = make_channels(channels, rng)
+    weights = [c["weight"] for c in channel_list]
+    now = datetime.utcnow()
+
+    session = SessionLocal()
+    try:
+        start = time.time()
+        insert = Video.__table__.insert()
+        for offset in range(0, videos, batch_size):
+            count = min(batch_size, videos - offset)
+            picks = rng.choices(channel_list, weights=weights, k=count)
+            rows = [make_video(offset + i, seed, channel, now, days, rng) for i, channel in enumerate(picks)]
+            # Plain bulk insert; the derived indexes are rebuilt once at the end
+            session.execute(insert, rows)
+            session.commit()
+            done = offset + count
+            rate = done / (time.time() - start)
+            print(f"  {done}/{videos} videos ({rate:.0f}/s)", end="\r", flush=True)
+        print(f"\nInserted {videos} videos across {channels} channels in {time.time() - start:.1f}s")
+
+        if rebuild_indexes:
+            step = time.time()
+            rebuild_search_index(session)
+            print(f"Rebuilt search index in {time.time() - step:.1f}s")
+            step = time.time()
+            rebuild_channel_rollup(session)
+            print(f"Rebuilt channel rollup in {time.time() - step:.1f}s")
+            if semantic:
+                step = time.time()
+                rebuild_semantic_index(session)
+                print(f"Rebuilt semantic index in {time.time() - step:.1f}s")
+        bump_data_version(session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill the database (DATABASE_URL) with a synthetic video catalogue")
+    parser.add_argument("--videos", type=int, default=1_000_000, help="Number of videos to insert")
+    parser.add_argument("--channels", type=int, default=500, help="Number of channels")
+    parser.add_argument("--days", type=int, default=365, help="Spread upload dates over this many days")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per insert/commit")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed; video IDs depend on it, so use a new seed to add more rows")
+    parser.add_argument("--skip-indexes", action="store_true", help="Do not rebuild search index, channel rollup and semantic index")
+    parser.add_argument("--skip-semantic", action="store_true", help="Do not rebuild the semantic index")
+    args = parser.parse_args()
+    init_db()
+
+    print(f"Generating into {DATABASE_URL}")
+    generate(args.videos, args.channels, args.days, args.batch_size, args.seed,
+             rebuild_indexes=not args.skip_indexes, semantic=not args.skip_semantic)
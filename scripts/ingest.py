@@ -1,29 +1,41 @@
 import sys
 import os
+import argparse
+import queue
+import threading
+import time
+import itertools
+import multiprocessing
 import yt_dlp
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 
 # Add parent directory to path to import database module
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from app_backend.database import SessionLocal, Video
+from app_backend.database import SessionLocal, ReadSessionLocal, IngestState, init_db
+from app_backend.storage import upsert_videos, summarize_upserts, UPSERT_BATCH_SIZE
+from app_backend.channels import tracked_channels, resolve_pending_channels, normalize_channel_url
+from app_backend.transcripts import enqueue_missing_transcripts, TRANSCRIPTS_ENABLED
 
-CHANNELS = [
-    "https://www.youtube.com/@markets",
-    "https://www.youtube.com/@ANINewsIndia",
-    "https://www.youtube.com/@CNN",
-    "https://www.youtube.com/@SkyNews",
-    "https://www.youtube.com/@AlJazeeraEnglish"
-]
+def load_channel_urls():
+    """URLs of the tracked channels in the registry (channels table), resolving new ones once."""
+    session = SessionLocal()
+    try:
+        resolve_pending_channels(session)
+        return [c.url for c in tracked_channels(session)]
+    finally:
+        session.close()
 
 def parse_video_data(entry, default_channel_title=None):
+    # Flat extraction usually has no upload_date; leave it None so an existing
+    # row keeps its date (new rows get the time they were first seen)
+    upload_date = None
     upload_date_str = entry.get('upload_date')
     if upload_date_str:
         try:
             upload_date = datetime.strptime(upload_date_str, "%Y%m%d")
         except ValueError:
-            upload_date = datetime.utcnow()
-    else:
-        upload_date = datetime.utcnow()
+            upload_date = None
 
     # yt-dlp flat extraction sometimes puts channel in 'uploader' or 'channel'
     channel_title = entry.get('channel') or entry.get('uploader') or default_channel_title
@@ -41,67 +53,393 @@ def parse_video_data(entry, default_channel_title=None):
         "channel_title": channel_title
     }
 
-def ingest_channel(channel_url, limit=1000):
+def channel_videos_url(channel_url):
     # Append /videos to ensure we get video list, not channel tabs
     if not channel_url.endswith('/videos') and not channel_url.endswith('/featured'):
-         target_url = channel_url + '/videos'
-    else:
-         target_url = channel_url
+        return channel_url + '/videos'
+    return channel_url
+
+# How many of the newest stored IDs to remember per channel for incremental runs
+WATERMARK_RECENT_IDS = 20
+# Rows committed per transaction; memory use is bounded by this, not by the channel size
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "500"))
+# How often a worker blocked on a full write queue checks whether the writer is still there
+WRITE_QUEUE_PUT_TIMEOUT = 1.0
+
+def load_watermark(channel_url):
+    """Returns the IngestState for a channel as a dict, or None if it was never ingested."""
+    session = ReadSessionLocal()
+    try:
+        state = session.get(IngestState, channel_url)
+        if state is None:
+            return None
+        return {
+            "last_video_id": state.last_video_id,
+            "last_upload_date": state.last_upload_date,
+            "recent_video_ids": state.recent_video_ids or [],
+            "checkpoint": state.checkpoint,
+        }
+    finally:
+        session.close()
+
+def _reached_watermark(data, watermark):
+    if data["video_id"] in watermark["recent_video_ids"] or data["video_id"] == watermark["last_video_id"]:
+        return True
+    # Only when the listing carries dates (flat extraction usually does not)
+    if data.get("upload_date") and watermark["last_upload_date"]:
+        return data["upload_date"] < watermark["last_upload_date"]
+    return False
+
+# --- pipeline: listing -> parse -> validate/dedupe -> watermark -> resume -> chunks ---
+
+class ChannelListing:
+    """
+    A channel's flat video listing, newest first, at most `limit` entries. Iterating it
+    pages through yt-dlp lazily, so nothing is materialized and stopping early stops
+    the page requests. `channel_title` is known once iteration has started.
+    """
+
+    def __init__(self, channel_url, limit=1000):
+        self.url = channel_videos_url(channel_url)
+        self.limit = limit
+        self.channel_title = None
+
+    def __iter__(self):
+        print(f"Fetching videos from {self.url}...")
+        ydl_opts = {
+            'quiet': True,
+            'extract_flat': True,
+            'playlistend': self.limit,
+            'ignoreerrors': True,
+            'socket_timeout': 30
+        }
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            # process=False leaves 'entries' as yt-dlp's lazy page generator
+            info = ydl.extract_info(self.url, download=False, process=False)
+            if not info:
+                raise RuntimeError(f"No data returned for {self.url}")
+            # Try to get channel title from top-level info
+            self.channel_title = info.get('uploader') or info.get('channel') or info.get('title')
+            print(f"Extracted Channel Title: {self.channel_title}")
+            yield from itertools.islice(info.get('entries') or [], self.limit)
+
+def parse_entries(listing):
+    for entry in listing:
+        if entry:
+            yield parse_video_data(entry, default_channel_title=listing.channel_title)
+
+def valid_unique(rows):
+    """Drops entries that are not videos and repeats within the listing."""
+    seen_ids = set()
+    for data in rows:
+        v_id = data["video_id"]
+        # YT video IDs are 11 chars; channel IDs are longer (24 chars, start with UC)
+        if not v_id or len(v_id) > 11 or v_id in seen_ids:
+            continue
+        seen_ids.add(v_id)
+        yield data
+
+def until_watermark(rows, watermark):
+    """Stops at the first already-stored video (incremental mode)."""
+    for n, data in enumerate(rows):
+        if _reached_watermark(data, watermark):
+            print(f"Reached watermark at {data['video_id']}; {n} new videos")
+            return
+        yield data
+
+def skip_committed(rows, checkpoint):
+    """
+    Resumes an interrupted run: skips the stretch of the listing its chunks already
+    committed. Videos above that stretch were published since and are kept. The skip
+    ends at the last committed ID or after as many rows as were committed, so a
+    deleted video cannot make it skip the rest of the listing.
+    """
+    head, last_id = set(checkpoint["head"]), checkpoint["last_id"]
+    phase, skipped = "new", 0
+    for data in rows:
+        if phase == "new" and data["video_id"] in head:
+            phase = "committed"
+        if phase == "committed":
+            skipped += 1
+            if data["video_id"] == last_id or skipped >= checkpoint["committed"]:
+                phase = "resumed"
+                print(f"Resuming after {skipped} already committed videos")
+            continue
+        yield data
+
+def channel_rows(listing, state=None, incremental=False):
+    """The lazy pipeline for one channel: rows to write, newest first."""
+    rows = valid_unique(parse_entries(listing))
+    # Incremental runs only page until the last stored video; a channel without a
+    # watermark yet gets a full run
+    if incremental and state:
+        rows = until_watermark(rows, state)
+    if state and state.get("checkpoint"):
+        rows = skip_committed(rows, state["checkpoint"])
+    return rows
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+# --- writes ---
+
+def _ingest_state(session, channel_url):
+    state = session.get(IngestState, channel_url)
+    if state is None:
+        state = IngestState(channel_url=channel_url)
+        session.add(state)
+    return state
+
+def advance_checkpoint(session, channel_url, rows, first=False):
+    """
+    Records a committed chunk in the channel's checkpoint: the run's newest IDs (from
+    the first chunk of each attempt), the chunk's last ID and the rows committed so
+    far. The watermark itself only moves in finish_run(), so an incremental run never
+    stops short of videos an interrupted run did not get to.
+    """
+    state = _ingest_state(session, channel_url)
+    checkpoint = dict(state.checkpoint or {"head": [], "last_id": None, "committed": 0, "last_upload_date": None})
+    if first:
+        newest = [r["video_id"] for r in rows[:WATERMARK_RECENT_IDS]]
+        checkpoint["head"] = list(dict.fromkeys(newest + checkpoint["head"]))[:WATERMARK_RECENT_IDS]
+    checkpoint["last_id"] = rows[-1]["video_id"]
+    checkpoint["committed"] += len(rows)
+    dates = [r["upload_date"].isoformat() for r in rows if r.get("upload_date")]
+    if checkpoint["last_upload_date"]:
+        dates.append(checkpoint["last_upload_date"])
+    checkpoint["last_upload_date"] = max(dates) if dates else None
+    # Reassigned, not mutated: the JSON column does not track in-place changes
+    state.checkpoint = checkpoint
+    state.updated_at = datetime.utcnow()
 
+def store_chunk(channel_url, rows, first=False, batch_size=UPSERT_BATCH_SIZE):
+    """
+    Upserts one chunk and records it in the channel's checkpoint in the same
+    transaction, so a crash loses at most the chunk in flight. Returns the per-batch report.
+    """
     session = SessionLocal()
-    print(f"Fetching videos from {target_url}...")
-    
-    ydl_opts = {
-        'quiet': True,
-        'extract_flat': True, 
-        'playlistend': limit,
-        'ignoreerrors': True
-    }
+    try:
+        # Batched upsert: one lookup and one write per batch instead of per video
+        report = upsert_videos(session, rows, batch_size=batch_size)
+        advance_checkpoint(session, channel_url, rows, first)
+        session.commit()
+        return report
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def finish_run(channel_url):
+    """Moves the channel's watermark to the newest videos of the finished run and clears its checkpoint."""
+    session = SessionLocal()
+    try:
+        state = session.get(IngestState, channel_url)
+        if state is None or not state.checkpoint:
+            return
+        checkpoint = state.checkpoint
+        if checkpoint["head"]:
+            previous = state.recent_video_ids or []
+            state.recent_video_ids = list(dict.fromkeys(checkpoint["head"] + previous))[:WATERMARK_RECENT_IDS]
+            state.last_video_id = checkpoint["head"][0]
+        if checkpoint["last_upload_date"]:
+            last = datetime.fromisoformat(checkpoint["last_upload_date"])
+            state.last_upload_date = max(last, state.last_upload_date) if state.last_upload_date else last
+        state.checkpoint = None
+        state.updated_at = datetime.utcnow()
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def print_upsert_report(report):
+    for stats in report:
+        print(f"  batch {stats['batch']}: {stats['inserted']} inserted, {stats['updated']} updated, {stats['unchanged']} unchanged")
+    totals = summarize_upserts(report)
+    print(f"  total: {totals['inserted']} inserted, {totals['updated']} updated, {totals['unchanged']} unchanged")
+
+def ingest_channel(channel_url, limit=1000, batch_size=UPSERT_BATCH_SIZE, incremental=False, chunk_size=INGEST_CHUNK_SIZE):
+    """Streams one channel into the database, committing every `chunk_size` rows."""
+    listing = ChannelListing(channel_url, limit=limit)
+    report = []
+    for n, chunk in enumerate(chunked(channel_rows(listing, load_watermark(channel_url), incremental), chunk_size)):
+        for stats in store_chunk(channel_url, chunk, first=n == 0, batch_size=batch_size):
+            report.append({**stats, "batch": len(report) + 1})
+    finish_run(channel_url)
+    print_upsert_report(report)
+    print(f"Finished ingestion for {channel_url}")
+    return report
+
+def _put(write_queue, item, shutdown):
+    """put() that gives up once `shutdown` is set, so a worker never waits on a writer that is gone."""
+    while True:
+        if shutdown.is_set():
+            raise RuntimeError("Writer stopped; chunk not written")
+        try:
+            write_queue.put(item, timeout=WRITE_QUEUE_PUT_TIMEOUT)
+            return
+        except queue.Full:
+            continue
+
+def _stream_channel(channel_url, limit, chunk_size, incremental, write_queue, shutdown):
+    """
+    Runs in a pool worker: feeds one channel's chunks to the writer as they are
+    extracted, then a (channel_url, None, False) end marker. The bounded queue holds
+    the worker back while the writer is behind; `shutdown` releases it when the writer
+    has exited. Returns (channel title, rows extracted, seconds).
+    """
+    start = time.perf_counter()
+    listing = ChannelListing(channel_url, limit=limit)
+    count = 0
+    for n, chunk in enumerate(chunked(channel_rows(listing, load_watermark(channel_url), incremental), chunk_size)):
+        _put(write_queue, (channel_url, chunk, n == 0), shutdown)
+        count += len(chunk)
+    _put(write_queue, (channel_url, None, False), shutdown)
+    return listing.channel_title, count, time.perf_counter() - start
+
+def _writer(write_queue, results, batch_size, shutdown):
+    """
+    Single writer: all database writes happen on this thread, one chunk per
+    transaction. Counts the rows it committed per channel in "written". Sets
+    `shutdown` when it exits, however it exits.
+    """
+    try:
+        while True:
+            item = write_queue.get()
+            if item is None:
+                return
+            channel_url, rows, first = item
+            result = results[channel_url]
+            if result["status"] in ("timeout", "write_failed"):
+                # Committed chunks stay; the next run resumes from them
+                continue
+            start = time.perf_counter()
+            try:
+                if rows is None:
+                    finish_run(channel_url)
+                else:
+                    totals = summarize_upserts(store_chunk(channel_url, rows, first, batch_size))
+                    for key, value in totals.items():
+                        result[key] = result.get(key, 0) + value
+                    result["written"] += totals["inserted"] + totals["updated"] + totals["unchanged"]
+            except Exception as e:
+                result.update({"status": "write_failed", "error": str(e)})
+            result["write_seconds"] += time.perf_counter() - start
+    finally:
+        shutdown.set()
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(target_url, download=False)
-        
-        # Try to get channel title from top-level info
-        channel_level_title = info.get('uploader') or info.get('channel') or info.get('title')
-        print(f"Extracted Channel Title: {channel_level_title}")
-
-        if 'entries' in info:
-            entries = list(info['entries'])
-            print(f"Found {len(entries)} entries. Processing...")
-            
-            seen_ids = set()
-            
-            for entry in entries:
-                if entry:
-                    data = parse_video_data(entry, default_channel_title=channel_level_title)
-                    v_id = data["video_id"]
-                    
-                    # Validate It's a Video (Simple length check: YT video IDs are 11 chars)
-                    # Channel IDs are longer (24 chars, start with UC)
-                    if not v_id or len(v_id) > 11:
-                        continue
-                        
-                    # Deduplicate in current batch
-                    if v_id in seen_ids:
-                        continue
-                    seen_ids.add(v_id)
-
-                    # Upsert logic
-                    existing = session.query(Video).filter(Video.video_id == v_id).first()
-                    if existing:
-                        for key, value in data.items():
-                            setattr(existing, key, value)
-                    else:
-                        new_video = Video(**data)
-                        session.add(new_video)
-            
-            session.commit()
-            print(f"Finished ingestion for {channel_url}")
-    session.close()
+def ingest_channels(channels, limit=1000, workers=4, timeout=300, batch_size=UPSERT_BATCH_SIZE, executor="thread",
+                    incremental=False, chunk_size=INGEST_CHUNK_SIZE):
+    """
+    Extracts up to `workers` channels concurrently (thread or process pool) and funnels
+    every write through one writer thread, so SQLite never sees competing writers.
+    Chunks are written while extraction is still running. A channel that fails or runs
+    past `timeout` seconds is recorded and skipped without affecting the others; what
+    it committed is kept and the next run resumes after it. Returns a per-channel
+    results dict.
+    """
+    pool_cls = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    results = {url: {"status": "pending", "extracted": 0, "written": 0, "extract_seconds": 0.0, "write_seconds": 0.0}
+               for url in channels}
+    manager = multiprocessing.Manager() if executor == "process" else None
+    # Process workers can only reach the writer through a manager queue and event
+    write_queue = manager.Queue(maxsize=workers * 2) if manager else queue.Queue(maxsize=workers * 2)
+    shutdown = manager.Event() if manager else threading.Event()
+    writer = threading.Thread(target=_writer, args=(write_queue, results, batch_size, shutdown), daemon=True)
+    writer.start()
+
+    start = time.perf_counter()
+    pool = pool_cls(max_workers=workers)
+    try:
+        remaining = list(channels)
+        in_flight = {}  # future -> (channel_url, submitted_at)
+        while remaining or in_flight:
+            # Keep at most `workers` channels in flight so submit time ~ start time
+            while remaining and len(in_flight) < workers:
+                url = remaining.pop(0)
+                future = pool.submit(_stream_channel, url, limit, chunk_size, incremental, write_queue, shutdown)
+                in_flight[future] = (url, time.perf_counter())
+
+            done, _ = wait(list(in_flight), timeout=1, return_when=FIRST_COMPLETED)
+            for future in done:
+                url, _ = in_flight.pop(future)
+                try:
+                    channel_title, count, seconds = future.result()
+                except Exception as e:
+                    results[url].update({"status": "failed", "error": str(e)})
+                    print(f"Failed to fetch {url}: {e}")
+                    continue
+                results[url].update({"channel_title": channel_title, "extracted": count, "extract_seconds": seconds})
+                if results[url]["status"] == "pending":
+                    results[url]["status"] = "ok"
+
+            now = time.perf_counter()
+            for future, (url, submitted) in list(in_flight.items()):
+                if timeout and now - submitted > timeout:
+                    # A running thread cannot be killed; the writer drops its remaining chunks
+                    future.cancel()
+                    in_flight.pop(future)
+                    results[url].update({"status": "timeout", "extract_seconds": now - submitted})
+                    print(f"Timed out fetching {url} after {timeout}s")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        try:
+            _put(write_queue, None, shutdown)
+        except RuntimeError:
+            pass  # the writer already exited
+        writer.join()
+        # Releases workers of timed-out channels still blocked on the full queue
+        shutdown.set()
+        if manager:
+            manager.shutdown()
+
+    results["_total_seconds"] = time.perf_counter() - start
+    return results
+
+def print_ingest_summary(results):
+    total_seconds = results.pop("_total_seconds", 0.0)
+    print("\nChannel                                     status       extracted  written  extract(s)  write(s)  videos/s")
+    total_videos = 0
+    for url, r in results.items():
+        seconds = r["extract_seconds"] + r["write_seconds"]
+        rate = r["written"] / seconds if seconds else 0.0
+        # Rows committed count even for a channel that failed or timed out later
+        total_videos += r["written"]
+        print(f"{url[:42]:<43} {r['status']:<12} {r['extracted']:>9}  {r['written']:>7}  {r['extract_seconds']:>10.1f}  {r['write_seconds']:>8.2f}  {rate:>8.1f}")
+        if r.get("error"):
+            print(f"    error: {r['error']}")
+    rate = total_videos / total_seconds if total_seconds else 0.0
+    print(f"Total: {total_videos} videos in {total_seconds:.1f}s wall time ({rate:.1f} videos/s)")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill videos from YouTube channels")
+    parser.add_argument("--limit", type=int, default=50, help="Max videos per channel") # Reduced limit to 50 for quick testing
+    parser.add_argument("--workers", type=int, default=int(os.getenv("INGEST_WORKERS", "4")), help="Channels fetched concurrently (1 = sequential)")
+    parser.add_argument("--timeout", type=float, default=float(os.getenv("INGEST_CHANNEL_TIMEOUT", "300")), help="Per-channel extraction timeout in seconds")
+    parser.add_argument("--batch-size", type=int, default=UPSERT_BATCH_SIZE, help="Rows per upsert batch")
+    parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE, help="Rows committed per transaction (the resume granularity)")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread", help="Pool type used for extraction")
+    parser.add_argument("--incremental", action="store_true", help="Stop each channel at its last stored video (catch-up mode)")
+    parser.add_argument("--channel", action="append", default=[], help="Ingest this channel URL instead of the registry (repeatable)")
+    args = parser.parse_args()
+    init_db()
+
+    channels = [normalize_channel_url(c) for c in args.channel] or load_channel_urls()
+    if not channels:
+        sys.exit("No channels registered. Add some with POST /channels or scripts/migrate_channels.py.")
     print("Starting Ingestion...")
-    for channel in CHANNELS:
-        ingest_channel(channel, limit=50) # Reduced limit to 50 for quick testing
+    results = ingest_channels(channels, limit=args.limit, workers=args.workers, timeout=args.timeout,
+                              batch_size=args.batch_size, executor=args.executor, incremental=args.incremental,
+                              chunk_size=args.chunk_size)
+    print_ingest_summary(results)
+    if TRANSCRIPTS_ENABLED:
+        # The API's transcript workers (or scripts/fetch_transcripts.py) download the captions
+        print(f"Queued {enqueue_missing_transcripts()} transcript jobs")
     print("Ingestion Complete.")
-
@@ -0,0 +1,36 @@
+import os
+import sys
+import time
+
+# Add parent directory to path to import database module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app_backend.database import SessionLocal, DATABASE_URL, init_db
+from app_backend.search import upgrade_search_index
+from app_backend.channels import ensure_channel_rollup
+from app_backend.transcripts import ensure_transcript_index
+
+def main():
+    """
+    Creates or upgrades the schema (tables, added columns, indexes, full-text indexes,
+    channel rollup). Run as a deploy step so serverless instances can start with
+    DB_INIT_ON_STARTUP=false and never touch the schema on a cold start.
+    """
+    print(f"Migrating {DATABASE_URL}")
+    start = time.time()
+    init_db()
+    session = SessionLocal()
+    try:
+        upgrade_search_index(session)
+        ensure_channel_rollup(session)
+        ensure_transcript_index(session)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"Error migrating database: {e}")
+        raise
+    finally:
+        session.close()
+    print(f"Schema up to date in {time.time() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import argparse
+
+# Add parent directory to path to import database module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app_backend.database import SessionLocal, DATABASE_URL, init_db
+from app_backend.channels import register_channels, resolve_pending_channels, tracked_channels, CHANNEL_RESOLVE_WORKERS
+
+# The channels that used to be hard-coded in main.py and scripts/ingest.py
+DEFAULT_CHANNELS = [
+    "https://www.youtube.com/@markets",
+    "https://www.youtube.com/@ANINewsIndia",
+    "https://www.youtube.com/@CNN",
+    "https://www.youtube.com/@SkyNews",
+    "https://www.youtube.com/@AlJazeeraEnglish",
+]
+
+def read_url_file(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Register channels in the channel registry and resolve their IDs once")
+    parser.add_argument("urls", nargs="*", help="Channel URLs or @handles to add")
+    parser.add_argument("--file", help="File with one channel URL per line")
+    parser.add_argument("--skip-defaults", action="store_true", help="Do not add the formerly hard-coded channels")
+    parser.add_argument("--no-resolve", action="store_true", help="Only register; resolve later (ingest, /subscribe)")
+    parser.add_argument("--workers", type=int, default=CHANNEL_RESOLVE_WORKERS, help="Concurrent channel lookups")
+    args = parser.parse_args()
+    init_db()
+
+    urls = ([] if args.skip_defaults else DEFAULT_CHANNELS) + args.urls
+    if args.file:
+        urls += read_url_file(args.file)
+
+    print(f"Registering {len(urls)} channels in {DATABASE_URL}")
+    session = SessionLocal()
+    try:
+        register_channels(session, urls)
+        session.commit()
+        if not args.no_resolve:
+            resolved, failed = resolve_pending_channels(session, workers=args.workers)
+            print(f"Resolved {resolved} channels, {failed} failed (retried on the next run)")
+        for channel in tracked_channels(session):
+            status = channel.channel_id or f"unresolved ({channel.resolve_error or 'pending'})"
+            print(f"  {channel.url}  {status}  {channel.title or ''}")
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
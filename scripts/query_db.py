@@ -5,13 +5,13 @@ from dotenv import load_dotenv
 
 # Add parent directory to path to import database module
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from app_backend.database import SessionLocal, Video
+from app_backend.database import ReadSessionLocal, Video, init_db
 
 def query_recent_videos(limit=5):
     """
     Queries the database for the most recent videos.
     """
-    session = SessionLocal()
+    session = ReadSessionLocal()
     try:
         print(f"\n--- Fetching last {limit} videos from Postgres ---")
         
@@ -33,4 +33,5 @@ def query_recent_videos(limit=5):
         session.close()
 
 if __name__ == "__main__":
+    init_db()
     query_recent_videos()
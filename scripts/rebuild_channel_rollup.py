@@ -0,0 +1,30 @@
+import os
+import sys
+import time
+
+# Add parent directory to path to import database module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app_backend.database import SessionLocal, init_db
+from app_backend.channels import rebuild_channel_rollup
+
+def main():
+    """
+    Recomputes the channels / channel_upload_buckets rollup tables from the videos table.
+    Normally only needed after editing videos by hand; scripts/migrate.py and API
+    startup build the rollup once after an upgrade.
+    """
+    init_db()
+    session = SessionLocal()
+    try:
+        start = time.time()
+        total = rebuild_channel_rollup(session)
+        print(f"Rebuilt rollup for {total} channels in {time.time() - start:.1f}s")
+    except Exception as e:
+        session.rollback()
+        print(f"Error rebuilding channel rollup: {e}")
+        raise
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import os
+import sys
+import time
+
+# Add parent directory to path to import database module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app_backend.database import SessionLocal, init_db
+from app_backend.search import rebuild_search_index
+
+def main():
+    """
+    Rebuilds the full-text search index (FTS5 on SQLite, tsvector/GIN on Postgres)
+    from the videos table. Run once for databases created before the index existed.
+    """
+    init_db()
+    session = SessionLocal()
+    try:
+        start = time.time()
+        total = rebuild_search_index(session)
+        print(f"Indexed {total} videos in {time.time() - start:.1f}s")
+    except Exception as e:
+        session.rollback()
+        print(f"Error rebuilding search index: {e}")
+        raise
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import os
+import sys
+import time
+
+# Add parent directory to path to import database module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app_backend.database import SessionLocal, init_db
+from app_backend.semantic import SEMANTIC_INDEX_DIR, rebuild_semantic_index
+
+def main():
+    """
+    Refits the semantic search projection on the current catalogue and re-encodes every
+    video. Run after large imports so new vocabulary is represented.
+    """
+    init_db()
+    session = SessionLocal()
+    try:
+        start = time.time()
+        total = rebuild_semantic_index(session)
+        print(f"Indexed {total} videos into {SEMANTIC_INDEX_DIR} in {time.time() - start:.1f}s")
+    except Exception as e:
+        print(f"Error rebuilding semantic index: {e}")
+        raise
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    main()
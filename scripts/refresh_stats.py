@@ -0,0 +1,43 @@
+import os
+import sys
+import argparse
+import random
+import time
+
+# Add parent directory to path to import database module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app_backend.database import SessionLocal, Video, DATABASE_URL, init_db
+from app_backend.stats_refresh import (
+    StatsRefresher, STATS_REFRESH_RATE, STATS_REFRESH_BURST, STATS_REFRESH_BATCH_SIZE,
+)
+
+def fake_extractor(video_id):
+    """Stands in for yt-dlp: the stored counts, grown a little."""
+    session = SessionLocal()
+    try:
+        row = session.query(Video.view_count, Video.like_count).filter(Video.video_id == video_id).first()
+    finally:
+        session.close()
+    if row is None:
+        return None
+    views = int((row.view_count or 0) * random.uniform(1.0, 1.2)) + random.randint(0, 50)
+    return {"video_id": video_id, "view_count": views, "like_count": int(views * random.uniform(0.01, 0.05))}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh view/like counts of videos that are due (one pass)")
+    parser.add_argument("--limit", type=int, default=None, help="Refresh at most this many videos")
+    parser.add_argument("--rate", type=float, default=STATS_REFRESH_RATE, help="Extractions per minute")
+    parser.add_argument("--burst", type=int, default=STATS_REFRESH_BURST, help="Extractions allowed back to back")
+    parser.add_argument("--batch-size", type=int, default=STATS_REFRESH_BATCH_SIZE, help="Videos claimed at a time")
+    parser.add_argument("--fake", action="store_true", help="Use a stub extractor instead of yt-dlp (testing)")
+    parser.add_argument("--backfill", action="store_true", help="First schedule videos that have never been scheduled")
+    args = parser.parse_args()
+    init_db()
+
+    refresher = StatsRefresher(extractor=fake_extractor if args.fake else None, rate_per_minute=args.rate,
+                               burst=args.burst, batch_size=args.batch_size, backfill=args.backfill)
+    print(f"Refreshing due videos in {DATABASE_URL} at up to {args.rate:g}/min")
+    start = time.time()
+    counts = refresher.run_once(limit=args.limit)
+    print(f"Done in {time.time() - start:.1f}s: {counts or 'nothing due'}")
+    print(refresher.stats())
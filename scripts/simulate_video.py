@@ -6,18 +6,17 @@ import time
 # Add parent directory to path to import database module
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app_backend.database import get_db_collection
+from app_backend.database import SessionLocal, init_db
+from app_backend.storage import upsert_videos
 
 def simulate_new_video():
-    collection = get_db_collection()
-    
     timestamp = datetime.now().strftime("%H:%M:%S")
     
     new_video = {
         "video_id": "DEMO_" + datetime.now().strftime("%Y%m%d%H%M%S"),
         "title": f"🔴 LIVE BREAKING NEWS: Market Update at {timestamp}",
         "url": "https://www.youtube.com/watch?v=DEMO12345",
-        "upload_date": datetime.utcnow().isoformat(),
+        "upload_date": datetime.utcnow(),
         "view_count": 1450,
         "like_count": 230,
         "description": "This is a simulated video entry to demonstrate real-time API capabilities for the project submission.",
@@ -28,12 +27,18 @@ def simulate_new_video():
     print("Simulating ingestion of new video...")
     time.sleep(1)
     
+    session = SessionLocal()
     try:
-        collection.insert_one(new_video)
+        upsert_videos(session, [new_video])
+        session.commit()
         print(f"✅ SUCCESSFULLY INGESTED: {new_video['title']}")
         print("The API should now reflect this new data.")
     except Exception as e:
+        session.rollback()
         print(f"❌ Error inserting video: {e}")
+    finally:
+        session.close()
 
 if __name__ == "__main__":
+    init_db()
     simulate_new_video()
@@ -5,6 +5,13 @@ import os
 # Adapt path for Cloud Functions structure (everything is usually in root or local packages)
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# On a serverless runtime, no worker pools or background threads per cold start; a
+# long-running instance (uvicorn with BACKGROUND_SERVICES_ENABLED=true) drains the job
+# queue. Run as a long-lived process (Procfile), this module keeps them on.
+SERVERLESS_RUNTIME_VARS = ("VERCEL", "AWS_LAMBDA_FUNCTION_NAME", "FUNCTION_TARGET")
+if any(os.getenv(name) for name in SERVERLESS_RUNTIME_VARS):
+    os.environ.setdefault("BACKGROUND_SERVICES_ENABLED", "false")
+
 from app_backend.main import app as fastapi_app
 from mangum import Mangum
 
@@ -0,0 +1,60 @@
+"""
+Shared setup: every test session runs against a fresh file SQLite database (WAL, single
+writer, as in production) with the API's background services switched off.
+
+The modules are imported by their bare names (app_backend/ on sys.path), the way
+app_backend/main.py imports its siblings, and the app_backend.<name> names the scripts
+import are aliased to them, so there is one copy of each engine registry.
+"""
+import importlib
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_DIR = tempfile.mkdtemp(prefix="youtube-monitor-tests-")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DB_DIR, 'test.db')}"
+os.environ["STATS_REFRESH_ENABLED"] = "false"
+os.environ["TRANSCRIPTS_ENABLED"] = "false"
+os.environ["SEMANTIC_INDEX_ENABLED"] = "false"
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "app_backend"))
+
+# Scripts import app_backend.<name>; point those at the same bare-name modules
+for _file in sorted(os.listdir(os.path.join(ROOT, "app_backend"))):
+    _name, _ext = os.path.splitext(_file)
+    if _ext == ".py" and _name != "main":
+        sys.modules[f"app_backend.{_name}"] = importlib.import_module(_name)
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    from database import init_db, SessionLocal, DATABASE_URL
+    from search import upgrade_search_index
+    init_db()
+    # As API startup and scripts/migrate.py do
+    session = SessionLocal()
+    try:
+        upgrade_search_index(session)
+        session.commit()
+    finally:
+        session.close()
+    return DATABASE_URL
+
+@pytest.fixture
+def store_videos():
+    """Upserts videos (dicts of Video fields) through the normal write path and commits."""
+    from database import SessionLocal
+    from storage import upsert_videos
+
+    def store(videos):
+        session = SessionLocal()
+        try:
+            report = upsert_videos(session, videos)
+            session.commit()
+            return report
+        finally:
+            session.close()
+    return store
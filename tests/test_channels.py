@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from sqlalchemy import delete
+
+import channels
+from database import SessionLocal, DataVersion
+
+def forget_rollup(session):
+    session.execute(delete(DataVersion).where(DataVersion.name == channels.ROLLUP_MARKER))
+    session.commit()
+    channels._ready.discard(str(session.get_bind().url))
+
+def test_rolled_back_rebuild_is_not_marked_ready(store_videos):
+    store_videos([{"video_id": "chan0000001", "title": "Rollup", "channel_title": "Rollup channel",
+                   "upload_date": datetime(2020, 1, 1)}])
+    session = SessionLocal()
+    try:
+        forget_rollup(session)
+        channels.ensure_channel_rollup(session)
+        session.rollback()
+        assert not channels.rollup_ready(session)
+
+        channels.ensure_channel_rollup(session)
+        session.commit()
+        assert channels.rollup_ready(session)
+        assert channels.count_channel_videos(session, "Rollup channel") == 1
+    finally:
+        session.close()
+
+def test_writes_do_not_build_the_rollup(store_videos):
+    session = SessionLocal()
+    try:
+        forget_rollup(session)
+    finally:
+        session.close()
+    store_videos([{"video_id": "chan0000002", "title": "Write", "channel_title": "Write channel",
+                   "upload_date": datetime(2020, 1, 1)}])
+    session = SessionLocal()
+    try:
+        assert not channels.rollup_ready(session)
+        # Reads fall back to the videos table until startup or migrate.py builds it
+        assert channels.count_channel_videos(session, "Write channel") == 1
+    finally:
+        session.close()
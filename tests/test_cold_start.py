@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(code, **extra_env):
+    env = dict(os.environ)
+    for name in ("BACKGROUND_SERVICES_ENABLED", "VERCEL", "AWS_LAMBDA_FUNCTION_NAME", "FUNCTION_TARGET"):
+        env.pop(name, None)
+    env.update(extra_env)
+    result = subprocess.run([sys.executable, "-c", textwrap.dedent(code)], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.split()
+
+def test_importing_the_write_path_does_not_load_numpy():
+    assert run("""
+        import sys
+        sys.path.insert(0, "app_backend")
+        import main
+        print("numpy" in sys.modules)
+    """) == ["False"]
+
+BACKGROUND_FLAG = """
+    import serverless_entrypoint
+    from app_backend import main
+    print(main.BACKGROUND_SERVICES_ENABLED)
+"""
+
+def test_serverless_runtime_disables_background_services():
+    pytest.importorskip("mangum")
+    assert run(BACKGROUND_FLAG, VERCEL="1") == ["False"]
+    assert run(BACKGROUND_FLAG, AWS_LAMBDA_FUNCTION_NAME="api") == ["False"]
+
+def test_long_running_entrypoint_keeps_background_services():
+    # The Procfile serves serverless_entrypoint:app from a long-lived uvicorn process
+    pytest.importorskip("mangum")
+    assert run(BACKGROUND_FLAG) == ["True"]
+
+def test_serverless_cold_start_starts_no_background_threads():
+    pytest.importorskip("mangum")
+    assert run("""
+        import threading
+        from fastapi.testclient import TestClient
+        import serverless_entrypoint
+        with TestClient(serverless_entrypoint.app) as client:
+            client.get("/")
+            print(sorted(t.name for t in threading.enumerate() if t.daemon
+                         and t.name.startswith(("webhook", "transcript", "stats-refresh", "semantic"))))
+    """, VERCEL="1") == ["[]"]
@@ -0,0 +1,59 @@
+from sqlalchemy import text
+
+import search
+from database import SessionLocal, ReadSessionLocal, Video, compress_text, decompress_text
+
+LONG = "Central banks and the outlook for interest rates in the coming year. " * 20
+
+def stored_type(column, video_id):
+    session = ReadSessionLocal()
+    try:
+        return session.execute(text(f"SELECT typeof({column}) FROM videos WHERE video_id = :id"), {"id": video_id}).scalar()
+    finally:
+        session.close()
+
+def test_compress_round_trip():
+    packed = compress_text(LONG, codec="zlib")
+    assert isinstance(packed, bytes) and packed[:1] == b"\x01"
+    assert len(packed) < len(LONG)
+    assert decompress_text(packed) == LONG
+    # Short values stay readable text
+    assert compress_text("short") == "short"
+    assert decompress_text("short") == "short"
+    assert compress_text(None) is None and decompress_text(None) is None
+
+def test_large_columns_are_compressed_and_read_back(store_videos):
+    store_videos([{"video_id": "ctext000001", "title": "Compressed"}])
+    session = SessionLocal()
+    try:
+        session.get(Video, "ctext000001").ai_summary = LONG
+        session.commit()
+    finally:
+        session.close()
+
+    assert stored_type("ai_summary", "ctext000001") == "blob"
+    session = ReadSessionLocal()
+    try:
+        assert session.get(Video, "ctext000001").ai_summary == LONG
+    finally:
+        session.close()
+
+def test_descriptions_are_compressed_and_searchable(store_videos, monkeypatch):
+    store_videos([{"video_id": "ctext000002", "title": "Weekly roundup", "description": LONG + " zyzzogeton"}])
+    assert stored_type("description", "ctext000002") == "blob"
+
+    session = ReadSessionLocal()
+    try:
+        assert [row.video_id for row in search.search_videos(session, "zyzzogeton")] == ["ctext000002"]
+    finally:
+        session.close()
+
+    # As on a database whose full-text index was never built: titles still match
+    monkeypatch.setattr(search, "search_index_available", lambda session: False)
+    session = ReadSessionLocal()
+    try:
+        assert [row.video_id for row in search.search_videos(session, "roundup")] == ["ctext000002"]
+        assert search.count_videos(session, "roundup") == 1
+        assert search.search_videos(session, "zyzzogeton") == []
+    finally:
+        session.close()
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from sqlalchemy import event, func
+
+import main
+from database import Video, get_engine, get_async_engine, dispose_async_engines
+
+PARALLEL = 4
+PROBE_SECONDS = 0.03
+
+class OverlapProbe:
+    """SQLite function that sleeps inside the query and records how many run at once."""
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, value):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(PROBE_SECONDS)
+        with self._lock:
+            self.running -= 1
+        return 1
+
+    def register(self, dbapi_connection, connection_record):
+        dbapi_connection.create_function("overlap_probe", 1, self)
+
+@pytest.fixture
+def probe(monkeypatch, store_videos):
+    store_videos([
+        {"video_id": f"conc{i:07d}", "title": f"Concurrent {i}", "upload_date": datetime(2020, 1, 1) + timedelta(minutes=i)}
+        for i in range(10)
+    ])
+    probe = OverlapProbe()
+    recent_videos_query = main.recent_videos_query
+    monkeypatch.setattr(main, "recent_videos_query",
+                        lambda *a, **k: recent_videos_query(*a, **k).where(func.overlap_probe(Video.video_id) == 1))
+    # Fresh connections, so every one gets the function
+    reader = get_engine()
+    reader.dispose()
+    event.listen(reader, "connect", probe.register)
+    yield probe
+    event.remove(reader, "connect", probe.register)
+    reader.dispose()
+
+async def parallel_requests(probe):
+    engine = get_async_engine()
+    if engine is not None:
+        event.listen(engine.sync_engine, "connect", probe.register)
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(
+                client.get("/videos/recent", params={"limit": 5, "fields": "video_id,title"},
+                           headers={"X-API-Key": main.API_KEY})
+                for _ in range(PARALLEL)
+            ))
+            elapsed = time.perf_counter() - start
+    finally:
+        # Async pools belong to this event loop
+        await dispose_async_engines()
+    assert [r.status_code for r in responses] == [200] * PARALLEL
+    return elapsed
+
+@pytest.mark.parametrize("path", ["async", "threads"])
+def test_parallel_requests_overlap_in_the_database(probe, monkeypatch, path):
+    if path == "threads":
+        monkeypatch.setattr(main, "get_async_session_factory", lambda *a, **k: None)
+    elif get_async_engine() is None:
+        pytest.skip("no async driver installed")
+
+    elapsed = asyncio.run(parallel_requests(probe))
+
+    # 1 would mean the requests took turns; each one spends at least 6 * PROBE_SECONDS in the query
+    assert probe.max_running > 1
+    assert elapsed < PARALLEL * 6 * PROBE_SECONDS
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+@pytest.fixture(scope="module")
+def client():
+    import main
+    with TestClient(main.app) as client:
+        client.headers["X-API-Key"] = main.API_KEY
+        yield client
+
+def test_unchanged_poll_returns_304(client, store_videos):
+    store_videos([{"video_id": "etag0000001", "title": "First", "upload_date": datetime(2026, 1, 1)}])
+    response = client.get("/videos/recent", params={"limit": 5})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    again = client.get("/videos/recent", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+
+def test_video_write_invalidates_etag(client, store_videos):
+    etag = client.get("/videos/recent", params={"limit": 5}).headers["ETag"]
+    store_videos([{"video_id": "etag0000002", "title": "Second", "upload_date": datetime(2026, 1, 2)}])
+
+    response = client.get("/videos/recent", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert "etag0000002" in [v["video_id"] for v in response.json()]
+
+def test_etag_depends_on_page_and_fields(client):
+    full = client.get("/videos/recent", params={"limit": 5}).headers["ETag"]
+    projected = client.get("/videos/recent", params={"limit": 5, "fields": "video_id,title"}).headers["ETag"]
+    assert full != projected
+    assert client.get("/videos/recent", params={"limit": 5, "fields": "video_id,title"},
+                      headers={"If-None-Match": full}).status_code == 200
+
+def test_unchanged_rewrite_keeps_etag(client, store_videos):
+    etag = client.get("/videos/recent", params={"limit": 5}).headers["ETag"]
+    store_videos([{"video_id": "etag0000001", "title": "First", "upload_date": datetime(2026, 1, 1)}])
+    assert client.get("/videos/recent", params={"limit": 5}, headers={"If-None-Match": etag}).status_code == 304
+
+def test_count_refresh_only_invalidates_etags_with_counts(client, store_videos):
+    counted = client.get("/videos/recent", params={"limit": 5}).headers["ETag"]
+    uncounted = client.get("/videos/recent", params={"limit": 5, "fields": "video_id,title"}).headers["ETag"]
+    store_videos([{"video_id": "etag0000001", "view_count": 1234}])
+
+    assert client.get("/videos/recent", params={"limit": 5, "fields": "video_id,title"},
+                      headers={"If-None-Match": uncounted}).status_code == 304
+    response = client.get("/videos/recent", params={"limit": 5}, headers={"If-None-Match": counted})
+    assert response.status_code == 200
+    assert {v["video_id"]: v["view_count"] for v in response.json()}["etag0000001"] == 1234
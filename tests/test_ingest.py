@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+import database
+from scripts import ingest
+
+class FakeListing:
+    """Stands in for ChannelListing: `count` flat entries, newest first."""
+
+    def __init__(self, channel_url, limit=1000):
+        self.channel_url = channel_url
+        self.limit = limit
+        self.channel_title = "Fake channel"
+
+    def __iter__(self):
+        prefix = self.channel_url.rsplit("@", 1)[-1][:4]
+        for i in range(self.limit):
+            yield {"id": f"{prefix}{i:07d}", "title": f"Video {i}", "upload_date": "20250101"}
+
+@pytest.fixture(autouse=True)
+def fake_listing(monkeypatch):
+    monkeypatch.setattr(ingest, "ChannelListing", FakeListing)
+
+def run_with_deadline(seconds=15, **kwargs):
+    outcome = {}
+    thread = threading.Thread(target=lambda: outcome.update(ingest.ingest_channels(**kwargs)), daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), "ingest_channels did not return"
+    return outcome
+
+def test_summary_reports_rows_written():
+    results = run_with_deadline(channels=["https://www.youtube.com/@ingA"], limit=7, workers=1, chunk_size=3)
+    result = results["https://www.youtube.com/@ingA"]
+    assert result["status"] == "ok"
+    assert result["extracted"] == 7
+    assert result["written"] == 7
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_workers_do_not_hang_when_the_writer_dies(monkeypatch):
+    def crash(*args, **kwargs):
+        # Not an Exception, so it escapes the per-chunk handling and ends the writer thread
+        raise SystemExit
+
+    monkeypatch.setattr(ingest, "store_chunk", crash)
+    monkeypatch.setattr(ingest, "WRITE_QUEUE_PUT_TIMEOUT", 0.05)
+    results = run_with_deadline(channels=["https://www.youtube.com/@ingB"], limit=50, workers=1, chunk_size=1, timeout=60)
+    result = results["https://www.youtube.com/@ingB"]
+    assert result["status"] == "failed"
+    assert result["written"] == 0
+
+def test_ingest_shares_the_test_engine_registry():
+    # One SessionLocal, so writes go through the same single-writer engine as the API modules
+    assert ingest.SessionLocal is database.SessionLocal
@@ -0,0 +1,89 @@
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from database import SessionLocal, Job
+from jobs import WorkerPool, enqueue_jobs
+
+def new_kind():
+    # Each test gets its own job kind, so tests never see each other's jobs
+    return f"test-{uuid.uuid4().hex[:8]}"
+
+def job_rows(kind):
+    session = SessionLocal()
+    try:
+        return {job.video_id: job for job in session.execute(select(Job).where(Job.kind == kind)).scalars()}
+    finally:
+        session.close()
+
+def add_processing_job(kind, video_id, started_at):
+    session = SessionLocal()
+    try:
+        session.add(Job(kind=kind, video_id=video_id, status="processing", attempts=1,
+                        enqueued_at=started_at, available_at=started_at, started_at=started_at))
+        session.commit()
+    finally:
+        session.close()
+
+def test_enqueue_collapses_pending_duplicates():
+    kind = new_kind()
+    assert enqueue_jobs(kind, ["a", "b", "a", None]) == 2
+    assert enqueue_jobs(kind, ["a", "c"]) == 1
+    assert sorted(job_rows(kind)) == ["a", "b", "c"]
+
+def test_claim_hands_a_job_to_one_pool_only():
+    kind = new_kind()
+    enqueue_jobs(kind, ["only"])
+    first, second = WorkerPool(kind, lambda v: None), WorkerPool(kind, lambda v: None)
+
+    job = first._claim()
+    assert job["video_id"] == "only" and job["attempt"] == 1
+    assert second._claim() is None
+    row = job_rows(kind)["only"]
+    assert row.status == "processing" and row.started_at is not None
+
+def test_failed_job_is_retried_after_backoff_then_fails():
+    kind = new_kind()
+    enqueue_jobs(kind, ["flaky"])
+
+    def handler(video_id):
+        raise RuntimeError("extraction failed")
+
+    pool = WorkerPool(kind, handler, max_attempts=2, base_delay=60)
+    pool._process(pool._claim())
+    row = job_rows(kind)["flaky"]
+    assert row.status == "pending" and row.last_error == "extraction failed"
+    assert row.available_at > datetime.utcnow() + timedelta(seconds=30)
+    assert pool._claim() is None  # not due yet
+
+    session = SessionLocal()
+    try:
+        session.execute(Job.__table__.update().where(Job.kind == kind).values(available_at=datetime.utcnow()))
+        session.commit()
+    finally:
+        session.close()
+    pool._process(pool._claim())
+    assert job_rows(kind)["flaky"].status == "failed"
+
+def test_recovery_requeues_only_expired_leases():
+    kind = new_kind()
+    now = datetime.utcnow()
+    add_processing_job(kind, "crashed", now - timedelta(hours=2))
+    add_processing_job(kind, "running-elsewhere", now - timedelta(seconds=10))
+
+    pool = WorkerPool(kind, lambda v: None, lease_seconds=3600)
+    assert pool._recover_stale_jobs() == 1
+    rows = job_rows(kind)
+    assert rows["crashed"].status == "pending"
+    assert rows["running-elsewhere"].status == "processing"
+
+def test_pool_processes_queued_jobs():
+    kind = new_kind()
+    seen = []
+    enqueue_jobs(kind, ["x", "y"])
+    pool = WorkerPool(kind, seen.append, workers=1)
+    while (job := pool._claim()) is not None:
+        pool._process(job)
+    assert sorted(seen) == ["x", "y"]
+    assert {row.status for row in job_rows(kind).values()} == {"done"}
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+import search
+from database import SessionLocal, ReadSessionLocal
+
+def test_index_is_filled_on_creation_and_ready_only_after_commit(store_videos):
+    store_videos([{"video_id": "fts00000001", "title": "Backfill zebrafinch", "upload_date": datetime(2020, 1, 1)}])
+    session = SessionLocal()
+    try:
+        # As on a database that was never migrated
+        session.execute(text("DROP TABLE videos_fts"))
+        session.commit()
+        search._ready_engines.clear()
+
+        assert search.upgrade_search_index(session)
+        session.rollback()
+        assert not search.search_index_available(session)
+
+        assert search.upgrade_search_index(session)
+        session.commit()
+        assert str(session.get_bind().url) in search._ready_engines
+    finally:
+        session.close()
+
+    session = ReadSessionLocal()
+    try:
+        assert [row.video_id for row in search.search_videos(session, "zebrafinch")] == ["fts00000001"]
+    finally:
+        session.close()
@@ -0,0 +1,27 @@
+import json
+import os
+
+import semantic
+
+def test_default_index_dir_is_absolute(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert semantic.default_index_dir("sqlite:///youtube.db") == os.path.join(str(tmp_path), "youtube.db.semantic")
+    elsewhere = semantic.default_index_dir("postgresql://localhost/youtube")
+    assert elsewhere == os.path.join(semantic.APP_ROOT, "semantic_index")
+    monkeypatch.chdir(os.path.dirname(str(tmp_path)))
+    assert semantic.default_index_dir("postgresql://localhost/youtube") == elsewhere
+
+def test_unloadable_index_is_rebuilt(tmp_path, monkeypatch, store_videos):
+    path = str(tmp_path / "index")
+    os.makedirs(path)
+    with open(os.path.join(path, "meta.json"), "w") as fh:
+        json.dump({"dim": semantic.SEMANTIC_DIM + 1, "count": 0, "fitted_count": 0, "generation": "x"}, fh)
+    monkeypatch.setattr(semantic, "SEMANTIC_INDEX_ENABLED", True)
+    monkeypatch.setattr(semantic, "SEMANTIC_INDEX_DIR", path)
+    store_videos([{"video_id": "semidx00001", "title": "Interest rate outlook", "channel_title": "Macro"}])
+
+    semantic.ensure_semantic_index()
+
+    index = semantic.get_semantic_index()
+    assert index.dim == semantic.SEMANTIC_DIM
+    assert "semidx00001" in index._rows
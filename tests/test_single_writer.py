@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+import uuid
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from database import SessionLocal, ReadSessionLocal, get_writer_engine, get_engine, DataVersion, \
+    get_async_session_factory, dispose_async_engines
+
+def test_writes_go_through_one_connection():
+    writer = get_writer_engine()
+    assert writer is not get_engine()
+    assert writer.pool.size() == 1
+
+    session = SessionLocal()
+    try:
+        assert session.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+    finally:
+        session.close()
+
+def test_second_writer_waits_for_the_first_to_commit():
+    name = f"writer-test-{uuid.uuid4().hex[:8]}"
+    first_holds_lock = threading.Event()
+    release_first = threading.Event()
+    second_done = threading.Event()
+    errors = []
+
+    def first():
+        session = SessionLocal()
+        try:
+            session.add(DataVersion(name=name, version=1))
+            session.flush()
+            first_holds_lock.set()
+            release_first.wait(5)
+            session.commit()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            session.close()
+
+    def second():
+        first_holds_lock.wait(5)
+        session = SessionLocal()
+        try:
+            session.execute(DataVersion.__table__.update().where(DataVersion.name == name).values(version=2))
+            session.commit()
+            second_done.set()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=first), threading.Thread(target=second)]
+    for t in threads:
+        t.start()
+    first_holds_lock.wait(5)
+    # The second writer queues for the connection instead of failing with "database is locked"
+    assert not second_done.wait(0.3)
+
+    # Readers are not blocked by the open write transaction
+    reader = ReadSessionLocal()
+    try:
+        assert reader.execute(text("SELECT COUNT(*) FROM data_versions WHERE name = :n"), {"n": name}).scalar() == 0
+    finally:
+        reader.close()
+
+    release_first.set()
+    for t in threads:
+        t.join(5)
+    assert not errors
+    assert second_done.is_set()
+
+    reader = ReadSessionLocal()
+    try:
+        assert reader.get(DataVersion, name).version == 2
+    finally:
+        reader.close()
+
+def test_concurrent_writers_never_fail():
+    name = f"counter-{uuid.uuid4().hex[:8]}"
+    session = SessionLocal()
+    session.add(DataVersion(name=name, version=0))
+    session.commit()
+    session.close()
+    errors = []
+
+    def bump():
+        for _ in range(25):
+            session = SessionLocal()
+            try:
+                session.execute(DataVersion.__table__.update().where(DataVersion.name == name)
+                                .values(version=DataVersion.version + 1))
+                session.commit()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                session.close()
+            time.sleep(0)
+
+    threads = [threading.Thread(target=bump) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(30)
+    assert not errors
+    session = ReadSessionLocal()
+    try:
+        assert session.get(DataVersion, name).version == 200
+    finally:
+        session.close()
+
+def test_async_sessions_cannot_write():
+    factory = get_async_session_factory()
+    if factory is None:
+        pytest.skip("no async driver installed")
+
+    async def write():
+        try:
+            async with factory() as session:
+                await session.execute(text("INSERT INTO data_versions (name, version) VALUES ('async-write', 1)"))
+                await session.commit()
+        finally:
+            await dispose_async_engines()
+
+    with pytest.raises(OperationalError, match="readonly"):
+        asyncio.run(write())
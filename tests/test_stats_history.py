@@ -0,0 +1,46 @@
+from sqlalchemy import select
+
+from database import SessionLocal, DataVersion, StatsHistoryWatermark, VideoStatsSample
+import stats_history
+
+DAY = stats_history.DAY
+NOW = 1_800_000_000 // DAY * DAY
+
+def test_compaction_keeps_watermarks_out_of_data_versions():
+    session = SessionLocal()
+    try:
+        # A legacy watermark left in data_versions is picked up and moved
+        session.add(DataVersion(name=stats_history.DAILY_WATERMARK, version=0))
+        old = NOW - 90 * DAY
+        session.add_all(VideoStatsSample(video_id="hist0000001", ts=old + i * 600, views=100 + i) for i in range(12))
+        session.commit()
+
+        removed = stats_history.compact_stats_history(session, now=NOW)
+
+        assert removed == 11
+        assert [s.views for s in session.execute(select(VideoStatsSample).where(
+            VideoStatsSample.video_id == "hist0000001")).scalars()] == [111]
+        levels = {w.level: w.bucket for w in session.execute(select(StatsHistoryWatermark)).scalars()}
+        assert levels[stats_history.HOURLY_WATERMARK] > 0
+        assert levels[stats_history.DAILY_WATERMARK] > 0
+        assert session.get(DataVersion, stats_history.DAILY_WATERMARK) is None
+        assert session.get(DataVersion, stats_history.HOURLY_WATERMARK) is None
+    finally:
+        session.close()
+
+def test_compaction_runs_while_refreshes_are_always_due(monkeypatch):
+    from stats_refresh import StatsRefresher
+
+    refresher = StatsRefresher(extractor=lambda video_id: None, workers=1, poll_interval=0.01)
+    compactions, refreshes = [], []
+    monkeypatch.setattr(refresher, "_claim", lambda limit: ["stats000001"])
+    monkeypatch.setattr(refresher, "_compact_history", lambda: compactions.append(1))
+
+    def refresh(video_id):
+        refreshes.append(video_id)
+        if len(refreshes) >= 3:
+            refresher._stop.set()
+    monkeypatch.setattr(refresher, "_refresh", refresh)
+
+    refresher._run()
+    assert refreshes and compactions
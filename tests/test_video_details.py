@@ -0,0 +1,57 @@
+import threading
+import time
+from datetime import datetime
+
+from database import ReadSessionLocal, Video
+
+def stored_title(video_id):
+    session = ReadSessionLocal()
+    try:
+        return session.get(Video, video_id).title
+    finally:
+        session.close()
+
+def test_redelivered_notification_stores_the_edit(monkeypatch):
+    import main
+    import youtube
+
+    titles = iter(["Original title", "Edited title"])
+    monkeypatch.setattr(youtube, "extract_video_details", lambda video_id: {
+        "video_id": video_id, "title": next(titles), "upload_date": datetime(2026, 1, 3),
+    })
+    now = [1000.0]
+    monkeypatch.setattr(youtube.video_details_cache, "_clock", lambda: now[0])
+    main.process_video_notification("edit0000001")
+    # The hub re-delivers the notification after the title was edited, past the notification window
+    now[0] += youtube.VIDEO_NOTIFICATION_MAX_AGE + 1
+    main.process_video_notification("edit0000001")
+
+    assert stored_title("edit0000001") == "Edited title"
+    assert youtube.video_details_cache.get("edit0000001")["title"] == "Edited title"
+
+def test_concurrent_and_repeated_notifications_share_one_extraction(monkeypatch):
+    import main
+    import youtube
+
+    calls = []
+
+    def extract(video_id):
+        calls.append(video_id)
+        time.sleep(0.2)
+        return {"video_id": video_id, "title": "Shared", "upload_date": datetime(2026, 1, 4)}
+
+    monkeypatch.setattr(youtube, "extract_video_details", extract)
+    before = youtube.video_details_cache.stats()
+    threads = [threading.Thread(target=main.process_video_notification, args=("share000001",)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # A re-delivery right after is served from the cache
+    main.process_video_notification("share000001")
+
+    assert calls == ["share000001"]
+    assert stored_title("share000001") == "Shared"
+    after = youtube.video_details_cache.stats()
+    assert after["coalesced"] - before["coalesced"] == 2
+    assert after["hits"] - before["hits"] == 1